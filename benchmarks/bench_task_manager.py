@@ -0,0 +1,54 @@
+import argparse
+import sys
+import time
+
+from pybraw.task_manager import Task, TaskManager
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=1_000_000,
+                        help='number of no-op tasks to enqueue and drain')
+    parser.add_argument('--max-running-tasks', type=int, default=3,
+                        help='maximum number of tasks running at once')
+    parser.add_argument('--priorities', type=int, default=1,
+                        help='number of distinct priority levels to spread the tasks over')
+    return parser
+
+
+class NoOpTaskManager(TaskManager):
+    """A task manager whose tasks finish as soon as they are started."""
+    def _on_task_started(self, task):
+        task.resolve(None)
+
+    def _on_task_ended(self, task):
+        self._cur_running_tasks -= 1
+        self._try_start_task()
+
+
+def main(args):
+    opts = argument_parser().parse_args(args)
+
+    task_manager = NoOpTaskManager(opts.max_running_tasks)
+
+    start_time = time.perf_counter()
+    tasks = []
+    for i in range(opts.tasks):
+        task = Task(task_manager)
+        task_manager.enqueue(task, priority=i % opts.priorities)
+        tasks.append(task)
+    enqueue_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for task in task_manager.as_completed():
+        task.consume()
+    drain_time = time.perf_counter() - start_time
+
+    print(f'Enqueued {opts.tasks} tasks in {enqueue_time:.3f} s '
+          f'({opts.tasks / enqueue_time:.0f} tasks/s)')
+    print(f'Drained {opts.tasks} tasks in {drain_time:.3f} s '
+          f'({opts.tasks / drain_time:.0f} tasks/s)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -72,8 +72,7 @@ class BufferManagerFlow1:
             self.frame_state_size_bytes = frame_state_size_bytes
         verify(self.manual_decoder.PopulateFrameStateBuffer(frame, None, None, self.frame_state, frame_state_size_bytes))
 
-    def create_read_job(self, clip_ex, frame_index) -> _pybraw.IBlackmagicRawJob:
-        bit_stream_size_bytes = verify(clip_ex.GetBitStreamSizeBytes(frame_index))
+    def create_read_job(self, clip_ex, frame_index, bit_stream_size_bytes) -> _pybraw.IBlackmagicRawJob:
         if bit_stream_size_bytes > self.bit_stream_size_bytes:
             if self.bit_stream is not None:
                 verify(self.resource_manager.ReleaseResource(None, None, self.bit_stream, _pybraw.blackmagicRawResourceTypeBufferCPU))
@@ -164,6 +163,8 @@ def process_clip_manual(clip: _pybraw.IBlackmagicRawClip, resource_manager, manu
     clip_ex = verify(clip.as_IBlackmagicRawClipEx())
     clip_processing_attributes = verify(clip.as_IBlackmagicRawClipProcessingAttributes())
     frame_count = verify(clip.GetFrameCount())
+    # Look up the bit stream sizes of all frames at once, rather than one at a time while reading.
+    bit_stream_sizes = verify(clip_ex.GetBitStreamSizesBytes(0, frame_count))
     clip_post_3d_lut = verify(clip_processing_attributes.GetPost3DLUT())
     if clip_post_3d_lut is not None:
         post_3d_lut_buffer_cpu = verify(clip_post_3d_lut.GetResourceCPU())
@@ -176,7 +177,7 @@ def process_clip_manual(clip: _pybraw.IBlackmagicRawClip, resource_manager, manu
     for frame_index in range(frame_count):
         job_counter.start_job()
         buffer_manager = buffer_manager_pool[frame_index % len(buffer_manager_pool)]
-        read_job = buffer_manager.create_read_job(clip_ex, frame_index)
+        read_job = buffer_manager.create_read_job(clip_ex, frame_index, int(bit_stream_sizes[frame_index]))
         user_data = UserData(buffer_manager, frame_index)
         verify(read_job.SetUserData(user_data))
         verify(read_job.Submit())
@@ -5,6 +5,12 @@
 #include <pybind11/numpy.h>
 
 #include <atomic>
+#include <cmath>
+#include <condition_variable>
+#include <map>
+#include <mutex>
+
+#include <dlfcn.h>
 
 namespace py = pybind11;
 using namespace pybind11::literals;
@@ -293,18 +299,614 @@ public:
 };
 
 
-template<typename T>
-py::array_t<T> _resource_to_numpy(std::vector<size_t> shape, uint32_t sizeBytes, void* resource, py::handle base) {
-    std::vector<size_t> stride;
-    size_t prod = sizeof(T);
-    for(auto it = shape.rbegin(); it != shape.rend(); ++it) {
-        stride.insert(stride.begin(), prod);
-        prod *= *it;
+// Native implementation of the manual decoder flow 1 (CPU) job chain.
+//
+// Each slot owns a set of preallocated CPU buffers. A frame submitted to a slot is read, decoded,
+// and processed entirely from within the SDK's callback threads, and Python is only entered once
+// the processed image is ready (or an error occurs).
+//
+// The class is hidden like the pybind11 types it holds, so that builds which don't default to
+// hidden visibility don't warn about its py::object member.
+class __attribute__((visibility("hidden"))) ManualDecoderFlow1Pipeline : public IBlackmagicRawCallback {
+private:
+    struct Buffer {
+        void* data = nullptr;
+        uint32_t sizeBytes = 0;
+    };
+
+    struct Slot {
+        uint64_t frameIndex = 0;
+        BlackmagicRawResolutionScale resolutionScale = blackmagicRawResolutionScaleFull;
+        BlackmagicRawResourceFormat resourceFormat = blackmagicRawResourceFormatRGBAU8;
+        Buffer bitStream;
+        Buffer frameState;
+        Buffer decoded;
+        Buffer processed;
+        void* userData = nullptr;
+        std::atomic_bool busy = {false};
+    };
+
+    std::atomic_ulong m_refCount = {0};
+    std::atomic_bool m_cancelled = {false};
+    IBlackmagicRawManualDecoderFlow1* m_manualDecoder;
+    IBlackmagicRawResourceManager* m_resourceManager;
+    IBlackmagicRawClipEx* m_clipEx;
+    void* m_post3DLUT;
+    std::vector<Slot> m_slots;
+    py::object m_onComplete;
+
+    HRESULT ReserveBuffer(Buffer& buffer, uint32_t sizeBytes) {
+        if(sizeBytes <= buffer.sizeBytes) {
+            return S_OK;
+        }
+        ReleaseBuffer(buffer);
+        HRESULT result = m_resourceManager->CreateResource(nullptr, nullptr, sizeBytes, blackmagicRawResourceTypeBufferCPU, blackmagicRawResourceUsageReadCPUWriteCPU, &buffer.data);
+        if(SUCCEEDED(result)) {
+            buffer.sizeBytes = sizeBytes;
+        } else {
+            buffer.data = nullptr;
+        }
+        return result;
+    }
+
+    void ReleaseBuffer(Buffer& buffer) {
+        if(buffer.data != nullptr) {
+            m_resourceManager->ReleaseResource(nullptr, nullptr, buffer.data, blackmagicRawResourceTypeBufferCPU);
+        }
+        buffer.data = nullptr;
+        buffer.sizeBytes = 0;
+    }
+
+    Slot* GetSlot(IBlackmagicRawJob* job) {
+        void* userData = nullptr;
+        job->GetUserData(&userData);
+        job->SetUserData(nullptr);
+        return static_cast<Slot*>(userData);
+    }
+
+    HRESULT SubmitJob(IBlackmagicRawJob* job, Slot* slot) {
+        HRESULT result = job->SetUserData(slot);
+        if(SUCCEEDED(result)) {
+            result = job->Submit();
+        }
+        job->Release();
+        return result;
+    }
+
+    // Hand the finished frame over to Python. This is the only place where the GIL is acquired.
+    void Complete(Slot* slot, HRESULT result, IBlackmagicRawProcessedImage* processedImage) {
+        if(SUCCEEDED(result) && m_cancelled) {
+            result = E_ABORT;
+        }
+        py::gil_scoped_acquire gil;
+        py::object userData = UserDataToPython(slot->userData, true);
+        slot->userData = nullptr;
+        py::object image = py::none();
+        if(SUCCEEDED(result) && processedImage != nullptr) {
+            processedImage->AddRef();
+            image = py::cast(processedImage, py::return_value_policy::take_ownership);
+        }
+        slot->busy = false;
+        try {
+            m_onComplete(userData, result, image);
+        } catch(py::error_already_set& e) {
+            e.discard_as_unraisable("ManualDecoderFlow1Pipeline.onComplete");
+        }
+    }
+
+protected:
+    virtual ~ManualDecoderFlow1Pipeline() {
+        assert(m_refCount == 0);
+        for(Slot& slot : m_slots) {
+            ReleaseBuffer(slot.bitStream);
+            ReleaseBuffer(slot.frameState);
+            ReleaseBuffer(slot.decoded);
+            ReleaseBuffer(slot.processed);
+        }
+        m_clipEx->Release();
+        m_resourceManager->Release();
+        m_manualDecoder->Release();
+        py::gil_scoped_acquire gil;
+        for(Slot& slot : m_slots) {
+            UserDataToPython(slot.userData, true);
+        }
+        m_onComplete = py::object();
+    }
+
+public:
+    ManualDecoderFlow1Pipeline(IBlackmagicRawManualDecoderFlow1* manualDecoder, IBlackmagicRawResourceManager* resourceManager, IBlackmagicRawClipEx* clipEx, Resource post3DLUT, uint32_t slotCount, py::function onComplete)
+        : m_manualDecoder(manualDecoder), m_resourceManager(resourceManager), m_clipEx(clipEx), m_post3DLUT(post3DLUT.data), m_slots(slotCount), m_onComplete(onComplete)
+    {
+        AddRef();
+        m_manualDecoder->AddRef();
+        m_resourceManager->AddRef();
+        m_clipEx->AddRef();
+    }
+
+    virtual HRESULT STDMETHODCALLTYPE QueryInterface(REFIID, LPVOID*) { return E_NOTIMPL; }
+
+    virtual ULONG STDMETHODCALLTYPE AddRef(void) {
+        return m_refCount.fetch_add(1) + 1;
+    }
+
+    virtual ULONG STDMETHODCALLTYPE Release(void) {
+        ULONG oldRefCount = m_refCount.fetch_sub(1);
+        assert(oldRefCount > 0);
+        if(oldRefCount == 1) {
+            delete this;
+        }
+        return oldRefCount - 1;
+    }
+
+    uint32_t GetSlotCount() {
+        return (uint32_t)m_slots.size();
+    }
+
+    void Cancel() {
+        m_cancelled = true;
+    }
+
+    HRESULT Submit(uint32_t slotIndex, uint64_t frameIndex, BlackmagicRawResolutionScale resolutionScale, BlackmagicRawResourceFormat resourceFormat, py::object userData) {
+        if(slotIndex >= m_slots.size()) {
+            return E_INVALIDARG;
+        }
+        Slot* slot = &m_slots[slotIndex];
+        if(slot->busy.exchange(true)) {
+            // The slot is still being used by another frame.
+            return E_ACCESSDENIED;
+        }
+        slot->frameIndex = frameIndex;
+        slot->resolutionScale = resolutionScale;
+        slot->resourceFormat = resourceFormat;
+        slot->userData = UserDataCreate(userData);
+        HRESULT result;
+        {
+            py::gil_scoped_release release;
+            uint32_t bitStreamSizeBytes = 0;
+            IBlackmagicRawJob* job = nullptr;
+            result = m_clipEx->GetBitStreamSizeBytes(frameIndex, &bitStreamSizeBytes);
+            if(SUCCEEDED(result)) {
+                result = ReserveBuffer(slot->bitStream, bitStreamSizeBytes);
+            }
+            if(SUCCEEDED(result)) {
+                result = m_clipEx->CreateJobReadFrame(frameIndex, slot->bitStream.data, bitStreamSizeBytes, &job);
+            }
+            if(SUCCEEDED(result)) {
+                result = SubmitJob(job, slot);
+            }
+        }
+        if(FAILED(result)) {
+            UserDataToPython(slot->userData, true);
+            slot->userData = nullptr;
+            slot->busy = false;
+        }
+        return result;
+    }
+
+    void ReadComplete(IBlackmagicRawJob* job, HRESULT result, IBlackmagicRawFrame* frame) override {
+        Slot* slot = GetSlot(job);
+        if(SUCCEEDED(result) && m_cancelled) {
+            result = E_ABORT;
+        }
+        uint32_t frameStateSizeBytes = 0;
+        uint32_t decodedSizeBytes = 0;
+        IBlackmagicRawJob* decodeJob = nullptr;
+        if(SUCCEEDED(result)) {
+            result = frame->SetResolutionScale(slot->resolutionScale);
+        }
+        if(SUCCEEDED(result)) {
+            result = frame->SetResourceFormat(slot->resourceFormat);
+        }
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->GetFrameStateSizeBytes(&frameStateSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = ReserveBuffer(slot->frameState, frameStateSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->PopulateFrameStateBuffer(frame, nullptr, nullptr, slot->frameState.data, frameStateSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->GetDecodedSizeBytes(slot->frameState.data, &decodedSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = ReserveBuffer(slot->decoded, decodedSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->CreateJobDecode(slot->frameState.data, slot->bitStream.data, slot->decoded.data, &decodeJob);
+        }
+        if(SUCCEEDED(result)) {
+            result = SubmitJob(decodeJob, slot);
+        }
+        if(FAILED(result)) {
+            Complete(slot, result, nullptr);
+        }
+    }
+
+    void DecodeComplete(IBlackmagicRawJob* job, HRESULT result) override {
+        Slot* slot = GetSlot(job);
+        if(SUCCEEDED(result) && m_cancelled) {
+            result = E_ABORT;
+        }
+        uint32_t processedSizeBytes = 0;
+        IBlackmagicRawJob* processJob = nullptr;
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->GetProcessedSizeBytes(slot->frameState.data, &processedSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = ReserveBuffer(slot->processed, processedSizeBytes);
+        }
+        if(SUCCEEDED(result)) {
+            result = m_manualDecoder->CreateJobProcess(slot->frameState.data, slot->decoded.data, slot->processed.data, m_post3DLUT, &processJob);
+        }
+        if(SUCCEEDED(result)) {
+            result = SubmitJob(processJob, slot);
+        }
+        if(FAILED(result)) {
+            Complete(slot, result, nullptr);
+        }
+    }
+
+    void ProcessComplete(IBlackmagicRawJob* job, HRESULT result, IBlackmagicRawProcessedImage* processedImage) override {
+        Slot* slot = GetSlot(job);
+        Complete(slot, result, processedImage);
+    }
+
+    void TrimProgress(IBlackmagicRawJob*, float) override {}
+    void TrimComplete(IBlackmagicRawJob*, HRESULT) override {}
+    void SidecarMetadataParseWarning(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void SidecarMetadataParseError(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void PreparePipelineComplete(void* userData, HRESULT) override {
+        py::gil_scoped_acquire gil;
+        UserDataToPython(userData, true);
+    }
+};
+
+
+// A codec callback which reads the bit streams of a range of frames into one caller-provided
+// buffer. All of the read jobs are created and submitted natively, without the GIL.
+class BitStreamBulkReader : public IBlackmagicRawCallback {
+private:
+    struct Batch {
+        uint64_t pending = 0;
+        HRESULT result = S_OK;
+    };
+
+    std::atomic_ulong m_refCount = {0};
+    std::mutex m_mutex;
+    std::condition_variable m_done;
+
+protected:
+    virtual ~BitStreamBulkReader() {
+        assert(m_refCount == 0);
+    }
+
+public:
+    BitStreamBulkReader() {
+        AddRef();
+    }
+
+    virtual HRESULT STDMETHODCALLTYPE QueryInterface(REFIID, LPVOID*) { return E_NOTIMPL; }
+
+    virtual ULONG STDMETHODCALLTYPE AddRef(void) {
+        return m_refCount.fetch_add(1) + 1;
+    }
+
+    virtual ULONG STDMETHODCALLTYPE Release(void) {
+        ULONG oldRefCount = m_refCount.fetch_sub(1);
+        assert(oldRefCount > 0);
+        if(oldRefCount == 1) {
+            delete this;
+        }
+        return oldRefCount - 1;
+    }
+
+    std::tuple<HRESULT, py::array_t<uint64_t>> ReadFrames(IBlackmagicRawClipEx* clipEx, uint64_t frameIndex, uint64_t frameCount, py::buffer buffer) {
+        py::buffer_info info = buffer.request(true);
+        py::ssize_t expectedStride = info.itemsize;
+        for(py::ssize_t dim = info.ndim - 1; dim >= 0; --dim) {
+            if(info.shape[dim] > 1 && info.strides[dim] != expectedStride) {
+                throw py::buffer_error("buffer must be C-contiguous");
+            }
+            expectedStride *= info.shape[dim];
+        }
+        uint8_t* data = static_cast<uint8_t*>(info.ptr);
+        uint64_t bufferSizeBytes = static_cast<uint64_t>(info.size) * info.itemsize;
+
+        py::array_t<uint64_t> offsets(static_cast<py::ssize_t>(frameCount + 1));
+        uint64_t* offsetsData = offsets.mutable_data();
+        HRESULT result = S_OK;
+        {
+            py::gil_scoped_release release;
+            offsetsData[0] = 0;
+            for(uint64_t i = 0; i < frameCount && SUCCEEDED(result); ++i) {
+                uint32_t bitStreamSizeBytes = 0;
+                result = clipEx->GetBitStreamSizeBytes(frameIndex + i, &bitStreamSizeBytes);
+                offsetsData[i + 1] = offsetsData[i] + bitStreamSizeBytes;
+            }
+            if(SUCCEEDED(result) && offsetsData[frameCount] > bufferSizeBytes) {
+                result = E_INVALIDARG;
+            }
+
+            Batch batch;
+            for(uint64_t i = 0; i < frameCount && SUCCEEDED(result); ++i) {
+                uint32_t bitStreamSizeBytes = static_cast<uint32_t>(offsetsData[i + 1] - offsetsData[i]);
+                IBlackmagicRawJob* job = nullptr;
+                result = clipEx->CreateJobReadFrame(frameIndex + i, data + offsetsData[i], bitStreamSizeBytes, &job);
+                if(FAILED(result)) {
+                    break;
+                }
+                result = job->SetUserData(&batch);
+                if(SUCCEEDED(result)) {
+                    std::lock_guard<std::mutex> lock(m_mutex);
+                    ++batch.pending;
+                }
+                if(SUCCEEDED(result)) {
+                    result = job->Submit();
+                    if(FAILED(result)) {
+                        std::lock_guard<std::mutex> lock(m_mutex);
+                        --batch.pending;
+                    }
+                }
+                job->Release();
+            }
+
+            // The jobs write into the buffer, so we must wait for all of them even if one failed.
+            std::unique_lock<std::mutex> lock(m_mutex);
+            m_done.wait(lock, [&batch] { return batch.pending == 0; });
+            if(SUCCEEDED(result)) {
+                result = batch.result;
+            }
+        }
+        return std::make_tuple(result, offsets);
+    }
+
+    void ReadComplete(IBlackmagicRawJob* job, HRESULT result, IBlackmagicRawFrame*) override {
+        void* userData = nullptr;
+        job->GetUserData(&userData);
+        Batch* batch = static_cast<Batch*>(userData);
+        std::lock_guard<std::mutex> lock(m_mutex);
+        if(FAILED(result) && SUCCEEDED(batch->result)) {
+            batch->result = result;
+        }
+        if(--batch->pending == 0) {
+            m_done.notify_all();
+        }
+    }
+
+    void DecodeComplete(IBlackmagicRawJob*, HRESULT) override {}
+    void ProcessComplete(IBlackmagicRawJob*, HRESULT, IBlackmagicRawProcessedImage*) override {}
+    void TrimProgress(IBlackmagicRawJob*, float) override {}
+    void TrimComplete(IBlackmagicRawJob*, HRESULT) override {}
+    void SidecarMetadataParseWarning(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void SidecarMetadataParseError(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void PreparePipelineComplete(void* userData, HRESULT) override {
+        py::gil_scoped_acquire gil;
+        UserDataToPython(userData, true);
+    }
+};
+
+
+// The memory layout of a processed image, derived from its resource format.
+struct ProcessedImageLayout {
+    BlackmagicRawResourceType type;
+    void* data;
+    std::vector<py::ssize_t> shape;
+    std::vector<py::ssize_t> strides;
+    py::ssize_t itemSize;
+    // A Python struct format character, as used by the buffer protocol.
+    std::string format;
+    // A DLPack data type code (0 for signed int, 1 for unsigned int, 2 for float).
+    uint8_t typeCode;
+};
+
+
+ProcessedImageLayout _processed_image_layout(IBlackmagicRawProcessedImage& self) {
+    ProcessedImageLayout layout = {};
+    HRESULT result;
+    result = self.GetResourceType(&layout.type);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to query resource type");
+    }
+    uint32_t sizeBytes = 0;
+    result = self.GetResourceSizeBytes(&sizeBytes);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to query resource size");
+    }
+    result = self.GetResource(&layout.data);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to get resource pointer");
+    }
+    BlackmagicRawResourceFormat format = 0;
+    result = self.GetResourceFormat(&format);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to query resource format");
+    }
+    uint32_t width = 0;
+    result = self.GetWidth(&width);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to query image width");
+    }
+    uint32_t height = 0;
+    result = self.GetHeight(&height);
+    if(result != S_OK) {
+        throw py::buffer_error("failed to query image height");
+    }
+    switch(format) {
+        case blackmagicRawResourceFormatRGBAU8:
+        case blackmagicRawResourceFormatBGRAU8:
+            layout.shape = {height, width, 4};
+            layout.itemSize = sizeof(uint8_t);
+            layout.format = py::format_descriptor<uint8_t>::format();
+            layout.typeCode = 1;
+            break;
+        case blackmagicRawResourceFormatRGBU16:
+            layout.shape = {height, width, 3};
+            layout.itemSize = sizeof(uint16_t);
+            layout.format = py::format_descriptor<uint16_t>::format();
+            layout.typeCode = 1;
+            break;
+        case blackmagicRawResourceFormatRGBAU16:
+        case blackmagicRawResourceFormatBGRAU16:
+            layout.shape = {height, width, 4};
+            layout.itemSize = sizeof(uint16_t);
+            layout.format = py::format_descriptor<uint16_t>::format();
+            layout.typeCode = 1;
+            break;
+        case blackmagicRawResourceFormatRGBU16Planar:
+            layout.shape = {3, height, width};
+            layout.itemSize = sizeof(uint16_t);
+            layout.format = py::format_descriptor<uint16_t>::format();
+            layout.typeCode = 1;
+            break;
+        case blackmagicRawResourceFormatRGBF32:
+            layout.shape = {height, width, 3};
+            layout.itemSize = sizeof(float_t);
+            layout.format = py::format_descriptor<float_t>::format();
+            layout.typeCode = 2;
+            break;
+        case blackmagicRawResourceFormatRGBF32Planar:
+            layout.shape = {3, height, width};
+            layout.itemSize = sizeof(float_t);
+            layout.format = py::format_descriptor<float_t>::format();
+            layout.typeCode = 2;
+            break;
+        case blackmagicRawResourceFormatBGRAF32:
+            layout.shape = {height, width, 4};
+            layout.itemSize = sizeof(float_t);
+            layout.format = py::format_descriptor<float_t>::format();
+            layout.typeCode = 2;
+            break;
+        default:
+            throw py::buffer_error("unsupported resource format");
+    }
+    py::ssize_t prod = layout.itemSize;
+    layout.strides.resize(layout.shape.size());
+    for(size_t dim = layout.shape.size(); dim-- > 0;) {
+        layout.strides[dim] = prod;
+        prod *= layout.shape[dim];
     }
     if(prod != sizeBytes) {
         throw py::buffer_error("mismatched resource size");
     }
-    return py::array_t<T>(shape, stride, (T*)resource, base);
+    return layout;
+}
+
+
+// The parts of the DLPack ABI (https://github.com/dmlc/dlpack, version 0.8) which are needed to
+// export processed images.
+enum DLDeviceType : int32_t {
+    kDLCPU = 1,
+    kDLCUDA = 2,
+};
+
+struct DLDevice {
+    int32_t device_type;
+    int32_t device_id;
+};
+
+struct DLDataType {
+    uint8_t code;
+    uint8_t bits;
+    uint16_t lanes;
+};
+
+struct DLTensor {
+    void* data;
+    DLDevice device;
+    int32_t ndim;
+    DLDataType dtype;
+    int64_t* shape;
+    int64_t* strides;
+    uint64_t byte_offset;
+};
+
+struct DLManagedTensor {
+    DLTensor dl_tensor;
+    void* manager_ctx;
+    void (*deleter)(DLManagedTensor* self);
+};
+
+
+// A DLPack tensor which keeps the processed image that it views alive.
+struct ProcessedImageDLTensor {
+    DLManagedTensor managed;
+    int64_t shape[3];
+    int64_t strides[3];
+    IBlackmagicRawProcessedImage* image;
+};
+
+
+DLDevice _processed_image_device(const ProcessedImageLayout& layout) {
+    switch(layout.type) {
+        case blackmagicRawResourceTypeBufferCPU:
+            return {kDLCPU, 0};
+        case blackmagicRawResourceTypeBufferCUDA: {
+            // The SDK has already loaded the CUDA driver API, so we can look up which device the
+            // memory belongs to without linking against it.
+            void* libcuda = dlopen("libcuda.so.1", RTLD_LAZY | RTLD_NOLOAD);
+            if(libcuda == nullptr) {
+                throw py::buffer_error("the CUDA driver API is not loaded");
+            }
+            typedef int (*PointerGetAttributeFn)(void*, int, uintptr_t);
+            auto pointerGetAttribute = (PointerGetAttributeFn)dlsym(libcuda, "cuPointerGetAttribute");
+            // CU_POINTER_ATTRIBUTE_DEVICE_ORDINAL
+            const int deviceOrdinalAttribute = 9;
+            int deviceOrdinal = 0;
+            int status = pointerGetAttribute == nullptr ? -1
+                : pointerGetAttribute(&deviceOrdinal, deviceOrdinalAttribute, (uintptr_t)layout.data);
+            dlclose(libcuda);
+            if(status != 0) {
+                throw py::buffer_error("failed to query the CUDA device of the resource");
+            }
+            return {kDLCUDA, deviceOrdinal};
+        }
+    }
+    throw py::buffer_error("only CPU and CUDA resources can be exported with DLPack");
+}
+
+
+py::capsule _processed_image_to_dlpack(IBlackmagicRawProcessedImage& self) {
+    ProcessedImageLayout layout = _processed_image_layout(self);
+    DLDevice device = _processed_image_device(layout);
+
+    ProcessedImageDLTensor* tensor = new ProcessedImageDLTensor();
+    for(size_t dim = 0; dim < layout.shape.size(); ++dim) {
+        tensor->shape[dim] = layout.shape[dim];
+        // DLPack strides are in elements rather than bytes.
+        tensor->strides[dim] = layout.strides[dim] / layout.itemSize;
+    }
+    DLTensor& dlTensor = tensor->managed.dl_tensor;
+    dlTensor.data = layout.data;
+    dlTensor.device = device;
+    dlTensor.ndim = (int32_t)layout.shape.size();
+    dlTensor.dtype = {layout.typeCode, (uint8_t)(layout.itemSize * 8), 1};
+    dlTensor.shape = tensor->shape;
+    dlTensor.strides = tensor->strides;
+    dlTensor.byte_offset = 0;
+    // The tensor holds a reference to the processed image until the consumer deletes it.
+    self.AddRef();
+    tensor->image = &self;
+    tensor->managed.manager_ctx = tensor;
+    tensor->managed.deleter = [](DLManagedTensor* managed) {
+        ProcessedImageDLTensor* tensor = (ProcessedImageDLTensor*)managed->manager_ctx;
+        tensor->image->Release();
+        delete tensor;
+    };
+
+    // A consumer renames the capsule to "used_dltensor" when it takes ownership of the tensor.
+    // Otherwise the tensor was never consumed, and has to be deleted with the capsule.
+    PyObject* capsule = PyCapsule_New(&tensor->managed, "dltensor", [](PyObject* capsule) {
+        if(PyCapsule_IsValid(capsule, "dltensor")) {
+            DLManagedTensor* managed = (DLManagedTensor*)PyCapsule_GetPointer(capsule, "dltensor");
+            managed->deleter(managed);
+        }
+    });
+    if(capsule == nullptr) {
+        tensor->managed.deleter(&tensor->managed);
+        throw py::error_already_set();
+    }
+    return py::reinterpret_steal<py::capsule>(capsule);
 }
 
 
@@ -438,9 +1040,412 @@ Variant VariantCreateSafeArray(py::array value) {
 }
 
 
+py::object convert_variant_to_py(const Variant& variant) {
+    switch(variant.vt) {
+        case blackmagicRawVariantTypeS16:
+            return py::cast(variant.iVal);
+        case blackmagicRawVariantTypeU16:
+            return py::cast(variant.uiVal);
+        case blackmagicRawVariantTypeS32:
+            return py::cast(variant.intVal);
+        case blackmagicRawVariantTypeU32:
+            return py::cast(variant.uintVal);
+        case blackmagicRawVariantTypeFloat32:
+            return py::cast(variant.fltVal);
+        case blackmagicRawVariantTypeString:
+            return py::cast(variant.bstrVal);
+        case blackmagicRawVariantTypeSafeArray:
+            return convert_safe_array_to_numpy(variant.parray, py::handle());
+        default:
+            throw py::value_error("unsupported variantType for Variant");
+    }
+}
+
+
+// Walk a metadata iterator to its end, collecting every entry into a dict. Entries with value
+// types which can't be converted to Python are skipped.
+std::tuple<HRESULT, py::dict> convert_metadata_to_dict(HRESULT result, IBlackmagicRawMetadataIterator* iterator) {
+    py::dict metadata;
+    if(FAILED(result)) {
+        return std::make_tuple(result, metadata);
+    }
+    while(true) {
+        const char* key = nullptr;
+        if(iterator->GetKey(&key) != S_OK) {
+            // There are no more entries.
+            break;
+        }
+        Variant data;
+        VariantInit(&data);
+        result = iterator->GetData(&data);
+        if(FAILED(result)) {
+            break;
+        }
+        try {
+            metadata[py::str(key)] = convert_variant_to_py(data);
+        } catch(py::value_error&) {
+        } catch(py::buffer_error&) {
+        } catch(...) {
+            VariantClear(&data);
+            iterator->Release();
+            throw;
+        }
+        VariantClear(&data);
+        result = iterator->Next();
+        if(FAILED(result)) {
+            break;
+        }
+    }
+    iterator->Release();
+    return std::make_tuple(result, metadata);
+}
+
+
+// A metadata value of one frame, copied out of its Variant so that it can be collected without the
+// GIL.
+struct FrameMetadataValue {
+    BlackmagicRawVariantType type;
+    double number;
+    std::string text;
+    std::vector<double> array;
+};
+
+
+// The metadata of one frame. Frames which could not be read keep `read` unset.
+struct FrameMetadataRecord {
+    bool read = false;
+    std::string timecode;
+    std::vector<std::pair<std::string, FrameMetadataValue>> entries;
+};
+
+
+bool _copy_frame_metadata_value(const Variant& variant, FrameMetadataValue& value) {
+    value.type = variant.vt;
+    switch(variant.vt) {
+        case blackmagicRawVariantTypeS16:
+            value.number = variant.iVal;
+            return true;
+        case blackmagicRawVariantTypeU16:
+            value.number = variant.uiVal;
+            return true;
+        case blackmagicRawVariantTypeS32:
+            value.number = variant.intVal;
+            return true;
+        case blackmagicRawVariantTypeU32:
+            value.number = variant.uintVal;
+            return true;
+        case blackmagicRawVariantTypeFloat32:
+            value.number = variant.fltVal;
+            return true;
+        case blackmagicRawVariantTypeString:
+            value.text = variant.bstrVal == nullptr ? "" : variant.bstrVal;
+            return true;
+        case blackmagicRawVariantTypeSafeArray: {
+            SafeArray* safeArray = variant.parray;
+            if(safeArray == nullptr || safeArray->cDims != 1) {
+                return false;
+            }
+            void* ptr = nullptr;
+            SafeArrayAccessData(safeArray, &ptr);
+            uint32_t lower = safeArray->bounds.lLbound;
+            uint32_t count = safeArray->bounds.cElements;
+            bool supported = true;
+            value.array.resize(count);
+            for(uint32_t i = 0; i < count && supported; ++i) {
+                switch(safeArray->variantType) {
+                    case blackmagicRawVariantTypeU8: value.array[i] = ((uint8_t*)ptr)[lower + i]; break;
+                    case blackmagicRawVariantTypeS16: value.array[i] = ((int16_t*)ptr)[lower + i]; break;
+                    case blackmagicRawVariantTypeU16: value.array[i] = ((uint16_t*)ptr)[lower + i]; break;
+                    case blackmagicRawVariantTypeS32: value.array[i] = ((int32_t*)ptr)[lower + i]; break;
+                    case blackmagicRawVariantTypeU32: value.array[i] = ((uint32_t*)ptr)[lower + i]; break;
+                    case blackmagicRawVariantTypeFloat32: value.array[i] = ((float_t*)ptr)[lower + i]; break;
+                    default: supported = false;
+                }
+            }
+            SafeArrayUnaccessData(safeArray);
+            return supported;
+        }
+        default:
+            return false;
+    }
+}
+
+
+py::object _frame_metadata_value_to_py(const FrameMetadataValue& value) {
+    switch(value.type) {
+        case blackmagicRawVariantTypeFloat32:
+            return py::float_(value.number);
+        case blackmagicRawVariantTypeString:
+            return py::str(value.text);
+        case blackmagicRawVariantTypeSafeArray:
+            return py::array_t<double>(value.array.size(), value.array.data());
+        default:
+            return py::int_((int64_t)value.number);
+    }
+}
+
+
+// Build a column of a metadata table from the values of one key in every frame. Missing values
+// are NaN in numeric columns, and None in object columns.
+py::array _frame_metadata_column(const std::vector<const FrameMetadataValue*>& values) {
+    py::ssize_t n = values.size();
+    const FrameMetadataValue* first = nullptr;
+    bool sameType = true;
+    bool complete = true;
+    for(const FrameMetadataValue* value : values) {
+        if(value == nullptr) {
+            complete = false;
+        } else if(first == nullptr) {
+            first = value;
+        } else if(value->type != first->type) {
+            sameType = false;
+        }
+    }
+    if(sameType && first != nullptr) {
+        switch(first->type) {
+            case blackmagicRawVariantTypeS16:
+            case blackmagicRawVariantTypeU16:
+            case blackmagicRawVariantTypeS32:
+            case blackmagicRawVariantTypeU32:
+                if(complete) {
+                    py::array_t<int64_t> column(n);
+                    int64_t* data = column.mutable_data();
+                    for(py::ssize_t i = 0; i < n; ++i) {
+                        data[i] = (int64_t)values[i]->number;
+                    }
+                    return column;
+                }
+                // Fall through to a floating point column, which can represent missing values.
+            case blackmagicRawVariantTypeFloat32: {
+                py::array_t<double> column(n);
+                double* data = column.mutable_data();
+                for(py::ssize_t i = 0; i < n; ++i) {
+                    data[i] = values[i] == nullptr ? NAN : values[i]->number;
+                }
+                return column;
+            }
+            case blackmagicRawVariantTypeSafeArray: {
+                bool sameLength = complete;
+                for(py::ssize_t i = 0; i < n && sameLength; ++i) {
+                    sameLength = values[i]->array.size() == first->array.size();
+                }
+                if(!sameLength) {
+                    break;
+                }
+                py::ssize_t length = first->array.size();
+                py::array_t<double> column({n, length});
+                double* data = column.mutable_data();
+                for(py::ssize_t i = 0; i < n; ++i) {
+                    std::copy(values[i]->array.begin(), values[i]->array.end(), data + i * length);
+                }
+                return column;
+            }
+            default:
+                break;
+        }
+    }
+    py::array column(py::dtype("O"), std::vector<py::ssize_t>{n});
+    for(py::ssize_t i = 0; i < n; ++i) {
+        py::object item = values[i] == nullptr ? py::none() : _frame_metadata_value_to_py(*values[i]);
+        // Object arrays own references to their items.
+        PyObject** slot = (PyObject**)column.mutable_data(i);
+        Py_XDECREF(*slot);
+        *slot = item.release().ptr();
+    }
+    return column;
+}
+
+
+// A codec callback which reads many frames, without decoding them, to collect their metadata.
+// Read jobs are created and submitted natively without the GIL, with several of them in flight at
+// once. A frame which fails to read doesn't stop the scan, it is marked as invalid in the table.
+class FrameMetadataScanner : public IBlackmagicRawCallback {
+private:
+    struct ScanState {
+        uint64_t inFlight = 0;
+    };
+
+    std::atomic_ulong m_refCount = {0};
+    std::mutex m_mutex;
+    std::condition_variable m_jobDone;
+    ScanState* m_scan = nullptr;
+
+protected:
+    virtual ~FrameMetadataScanner() {
+        assert(m_refCount == 0);
+    }
+
+public:
+    FrameMetadataScanner() {
+        AddRef();
+    }
+
+    virtual HRESULT STDMETHODCALLTYPE QueryInterface(REFIID, LPVOID*) { return E_NOTIMPL; }
+
+    virtual ULONG STDMETHODCALLTYPE AddRef(void) {
+        return m_refCount.fetch_add(1) + 1;
+    }
+
+    virtual ULONG STDMETHODCALLTYPE Release(void) {
+        ULONG oldRefCount = m_refCount.fetch_sub(1);
+        assert(oldRefCount > 0);
+        if(oldRefCount == 1) {
+            delete this;
+        }
+        return oldRefCount - 1;
+    }
+
+    std::tuple<HRESULT, py::dict> Scan(IBlackmagicRawClip* clip, std::vector<uint64_t> frameIndices, uint32_t maxJobsInFlight) {
+        if(maxJobsInFlight == 0) {
+            throw py::value_error("maxJobsInFlight must be at least 1");
+        }
+        ScanState scan;
+        std::vector<FrameMetadataRecord> records(frameIndices.size());
+        HRESULT result = S_OK;
+        {
+            py::gil_scoped_release release;
+            {
+                std::lock_guard<std::mutex> lock(m_mutex);
+                if(m_scan != nullptr) {
+                    result = E_FAIL;
+                } else {
+                    m_scan = &scan;
+                }
+            }
+            for(size_t i = 0; i < frameIndices.size() && SUCCEEDED(result); ++i) {
+                {
+                    std::unique_lock<std::mutex> lock(m_mutex);
+                    m_jobDone.wait(lock, [&scan, maxJobsInFlight] { return scan.inFlight < maxJobsInFlight; });
+                }
+                IBlackmagicRawJob* job = nullptr;
+                result = clip->CreateJobReadFrame(frameIndices[i], &job);
+                if(FAILED(result)) {
+                    break;
+                }
+                result = job->SetUserData(&records[i]);
+                if(SUCCEEDED(result)) {
+                    {
+                        std::lock_guard<std::mutex> lock(m_mutex);
+                        ++scan.inFlight;
+                    }
+                    result = job->Submit();
+                    if(FAILED(result)) {
+                        std::lock_guard<std::mutex> lock(m_mutex);
+                        --scan.inFlight;
+                    }
+                }
+                job->Release();
+            }
+            std::unique_lock<std::mutex> lock(m_mutex);
+            m_jobDone.wait(lock, [&scan] { return scan.inFlight == 0; });
+            if(m_scan == &scan) {
+                m_scan = nullptr;
+            }
+        }
+
+        py::dict columns;
+        if(FAILED(result)) {
+            return std::make_tuple(result, columns);
+        }
+        py::ssize_t n = records.size();
+        py::array_t<uint64_t> frameIndexColumn(n, frameIndices.data());
+        columns["frame_index"] = frameIndexColumn;
+        py::array_t<bool> validColumn(n);
+        bool* valid = validColumn.mutable_data();
+        for(py::ssize_t i = 0; i < n; ++i) {
+            valid[i] = records[i].read;
+        }
+        columns["valid"] = validColumn;
+        py::array timecodeColumn(py::dtype("O"), std::vector<py::ssize_t>{n});
+        for(py::ssize_t i = 0; i < n; ++i) {
+            py::object timecode = records[i].read ? py::object(py::str(records[i].timecode)) : py::none();
+            PyObject** slot = (PyObject**)timecodeColumn.mutable_data(i);
+            Py_XDECREF(*slot);
+            *slot = timecode.release().ptr();
+        }
+        columns["timecode"] = timecodeColumn;
+
+        // Keys are listed in the order that they are first seen.
+        std::vector<std::string> keys;
+        std::map<std::string, std::vector<const FrameMetadataValue*>> values;
+        for(py::ssize_t i = 0; i < n; ++i) {
+            for(const auto& entry : records[i].entries) {
+                auto it = values.find(entry.first);
+                if(it == values.end()) {
+                    keys.push_back(entry.first);
+                    it = values.emplace(entry.first, std::vector<const FrameMetadataValue*>(n, nullptr)).first;
+                }
+                it->second[i] = &entry.second;
+            }
+        }
+        for(const std::string& key : keys) {
+            if(columns.contains(key)) {
+                continue;
+            }
+            columns[py::str(key)] = _frame_metadata_column(values[key]);
+        }
+        return std::make_tuple(result, columns);
+    }
+
+    void ReadComplete(IBlackmagicRawJob* job, HRESULT result, IBlackmagicRawFrame* frame) override {
+        void* userData = nullptr;
+        job->GetUserData(&userData);
+        FrameMetadataRecord* record = static_cast<FrameMetadataRecord*>(userData);
+        if(SUCCEEDED(result) && frame != nullptr) {
+            const char* timecode = nullptr;
+            if(frame->GetTimecode(&timecode) == S_OK && timecode != nullptr) {
+                record->timecode = timecode;
+            }
+            IBlackmagicRawMetadataIterator* iterator = nullptr;
+            result = frame->GetMetadataIterator(&iterator);
+            if(SUCCEEDED(result)) {
+                const char* key = nullptr;
+                while(iterator->GetKey(&key) == S_OK) {
+                    Variant data;
+                    VariantInit(&data);
+                    if(iterator->GetData(&data) == S_OK) {
+                        FrameMetadataValue value;
+                        if(_copy_frame_metadata_value(data, value)) {
+                            record->entries.emplace_back(key, std::move(value));
+                        }
+                    }
+                    VariantClear(&data);
+                    if(FAILED(iterator->Next())) {
+                        break;
+                    }
+                }
+                iterator->Release();
+            }
+            record->read = SUCCEEDED(result);
+            if(!record->read) {
+                // Metadata from a partly read frame would look complete, so it is dropped.
+                record->timecode.clear();
+                record->entries.clear();
+            }
+        }
+        std::lock_guard<std::mutex> lock(m_mutex);
+        if(m_scan != nullptr) {
+            --m_scan->inFlight;
+        }
+        m_jobDone.notify_all();
+    }
+
+    void DecodeComplete(IBlackmagicRawJob*, HRESULT) override {}
+    void ProcessComplete(IBlackmagicRawJob*, HRESULT, IBlackmagicRawProcessedImage*) override {}
+    void TrimProgress(IBlackmagicRawJob*, float) override {}
+    void TrimComplete(IBlackmagicRawJob*, HRESULT) override {}
+    void SidecarMetadataParseWarning(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void SidecarMetadataParseError(IBlackmagicRawClip*, const char*, uint32_t, const char*) override {}
+    void PreparePipelineComplete(void* userData, HRESULT) override {
+        py::gil_scoped_acquire gil;
+        UserDataToPython(userData, true);
+    }
+};
+
+
 PYBIND11_MODULE(_pybraw, m) {
     m.doc() = "Python bindings for Blackmagic RAW SDK";
-    m.def("CreateBlackmagicRawFactoryInstance", &CreateBlackmagicRawFactoryInstance);
+    m.def("CreateBlackmagicRawFactoryInstance", &CreateBlackmagicRawFactoryInstance, py::call_guard<py::gil_scoped_release>());
 
 //    m.def("VariantInit", &VariantInit);
 //    m.def("VariantClear", &VariantClear);
@@ -650,24 +1655,7 @@ PYBIND11_MODULE(_pybraw, m) {
 //        .def_readwrite("bstrVal", &Variant::bstrVal)
 //        .def_readwrite("parray", &Variant::parray)
         .def("to_py", [](Variant& self) -> py::object {
-            switch(self.vt) {
-                case blackmagicRawVariantTypeS16:
-                    return py::cast(self.iVal);
-                case blackmagicRawVariantTypeU16:
-                    return py::cast(self.uiVal);
-                case blackmagicRawVariantTypeS32:
-                    return py::cast(self.intVal);
-                case blackmagicRawVariantTypeU32:
-                    return py::cast(self.uintVal);
-                case blackmagicRawVariantTypeFloat32:
-                    return py::cast(self.fltVal);
-                case blackmagicRawVariantTypeString:
-                    return py::cast(self.bstrVal);
-                case blackmagicRawVariantTypeSafeArray:
-                    return convert_safe_array_to_numpy(self.parray, py::handle());
-                default:
-                    throw py::value_error("unsupported variantType for Variant");
-            }
+            return convert_variant_to_py(self);
         }, "Return a copy of this Variant as a Python object.")
     ;
 
@@ -711,6 +1699,64 @@ PYBIND11_MODULE(_pybraw, m) {
         .def(py::init<>())
     ;
 
+    py::class_<ManualDecoderFlow1Pipeline,IBlackmagicRawCallback,std::unique_ptr<ManualDecoderFlow1Pipeline,Releaser>>(m, "ManualDecoderFlow1Pipeline")
+        .def(py::init<IBlackmagicRawManualDecoderFlow1*,IBlackmagicRawResourceManager*,IBlackmagicRawClipEx*,Resource,uint32_t,py::function>(),
+            "Create a native read -> decode -> process pipeline for manual decoder flow 1."
+            "\n\n"
+            "The pipeline must be registered as the codec's callback. `onComplete` will be called "
+            "once per submitted frame with the arguments `(userData, result, processedImage)`.",
+            "manualDecoder"_a, "resourceManager"_a, "clipEx"_a, "post3DLUT"_a, "slotCount"_a, "onComplete"_a
+        )
+        .def("GetSlotCount",
+            &ManualDecoderFlow1Pipeline::GetSlotCount,
+            "Get the number of frames which can be in flight at once."
+        )
+        .def("Submit",
+            &ManualDecoderFlow1Pipeline::Submit,
+            "Read, decode, and process a frame using the buffers of the given slot.",
+            "slotIndex"_a, "frameIndex"_a, "resolutionScale"_a, "resourceFormat"_a, "userData"_a
+        )
+        .def("Cancel",
+            &ManualDecoderFlow1Pipeline::Cancel,
+            "Stop submitting jobs. Frames which are in flight will complete with E_ABORT."
+        )
+    ;
+
+    py::class_<BitStreamBulkReader,IBlackmagicRawCallback,std::unique_ptr<BitStreamBulkReader,Releaser>>(m, "BitStreamBulkReader")
+        .def(py::init<>(),
+            "Create a reader for the bit streams of many frames at once."
+            "\n\n"
+            "The reader must be registered as the codec's callback while it is reading."
+        )
+        .def("ReadFrames",
+            &BitStreamBulkReader::ReadFrames,
+            "Read the bit streams of a range of frames back to back into a writable, contiguous "
+            "buffer, and wait for the reads to finish. The GIL is released while reading. Returns "
+            "an array of `frameCount + 1` byte offsets, where the bit stream of frame "
+            "`frameIndex + i` is stored between `offsets[i]` and `offsets[i + 1]`.",
+            "clipEx"_a, "frameIndex"_a, "frameCount"_a, "buffer"_a
+        )
+    ;
+
+    py::class_<FrameMetadataScanner,IBlackmagicRawCallback,std::unique_ptr<FrameMetadataScanner,Releaser>>(m, "FrameMetadataScanner")
+        .def(py::init<>(),
+            "Create a scanner for the metadata of many frames."
+            "\n\n"
+            "The scanner must be registered as the codec's callback while it is scanning."
+        )
+        .def("Scan",
+            &FrameMetadataScanner::Scan,
+            "Read frames without decoding them, and collect their metadata into columns. Up to "
+            "`maxJobsInFlight` read jobs run at once, and the GIL is released while reading. Returns "
+            "a dict of Numpy arrays with one row per frame, including `frame_index`, `valid` and "
+            "`timecode` columns. Frames which fail to read have `valid` set to False and no "
+            "metadata. Integer values are int64 columns, or float64 columns with NaN where frames "
+            "lack the value. Arrays of the same length in every frame are 2D float64 columns. Other "
+            "values are object columns, with None where frames lack the value.",
+            "clip"_a, "frameIndices"_a, "maxJobsInFlight"_a = 16
+        )
+    ;
+
     py::class_<IBlackmagicRawClipEx,IUnknown,std::unique_ptr<IBlackmagicRawClipEx,Releaser>>(m, "IBlackmagicRawClipEx")
         .def("GetMaxBitStreamSizeBytes",
             [](IBlackmagicRawClipEx& self) {
@@ -718,6 +1764,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetMaxBitStreamSizeBytes(&maxBitStreamSizeBytes);
                 return std::make_tuple(result, maxBitStreamSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Inspect all frames and return the maximum bit stream size encountered."
         )
         .def("GetBitStreamSizeBytes",
@@ -726,15 +1773,33 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetBitStreamSizeBytes(frameIndex, &bitStreamSizeBytes);
                 return std::make_tuple(result, bitStreamSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Return the bit stream size for the provided frame.",
             "frameIndex"_a
         )
+        .def("GetBitStreamSizesBytes",
+            [](IBlackmagicRawClipEx& self, uint64_t frameIndex, uint64_t frameCount) {
+                py::array_t<uint32_t> bitStreamSizesBytes(static_cast<py::ssize_t>(frameCount));
+                uint32_t* sizes = bitStreamSizesBytes.mutable_data();
+                HRESULT result = S_OK;
+                {
+                    py::gil_scoped_release release;
+                    for(uint64_t i = 0; i < frameCount && SUCCEEDED(result); ++i) {
+                        result = self.GetBitStreamSizeBytes(frameIndex + i, &sizes[i]);
+                    }
+                }
+                return std::make_tuple(result, bitStreamSizesBytes);
+            },
+            "Return the bit stream sizes for a range of frames as a uint32 array.",
+            "frameIndex"_a, "frameCount"_a
+        )
         .def("CreateJobReadFrame",
             [](IBlackmagicRawClipEx& self, uint64_t frameIndex, Resource bitStream, uint32_t bitStreamSizeBytes) {
                 IBlackmagicRawJob* job = nullptr;
                 HRESULT result = self.CreateJobReadFrame(frameIndex, bitStream.data, bitStreamSizeBytes, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job that will read the frame's bit stream into memory.",
             "frameIndex"_a, "bitStream"_a, "bitStreamSizeBytes"_a
         )
@@ -745,6 +1810,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.QueryTimecodeInfo(&baseFrameIndex, &isDropFrameTimecode);
                 return std::make_tuple(result, baseFrameIndex, isDropFrameTimecode);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the timecode info for the clip."
         )
     ;
@@ -788,6 +1854,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetAudioSampleCount(&sampleCount);
                 return std::make_tuple(result, sampleCount);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Get the audio sample count."
         )
         .def("GetAudioSamples",
@@ -801,6 +1868,7 @@ PYBIND11_MODULE(_pybraw, m) {
                     // The buffer must be writable.
                     result = E_INVALIDARG;
                 } else {
+                    py::gil_scoped_release release;
                     result = self.GetAudioSamples(sampleFrameIndex, info.ptr, bufferSizeBytes, maxSampleCount, &samplesRead, &bytesRead);
                 }
                 return std::make_tuple(result, samplesRead, bytesRead);
@@ -808,6 +1876,78 @@ PYBIND11_MODULE(_pybraw, m) {
             "Get audio samples from the clip.",
             "sampleFrameIndex"_a, "buffer"_a, "maxSampleCount"_a
         )
+        .def("ReadAudioSamples",
+            [](IBlackmagicRawClipAudio& self, int64_t sampleFrameIndex, py::array out, uint32_t chunkSampleCount) {
+                uint32_t bitDepth = 0;
+                HRESULT result = self.GetAudioBitDepth(&bitDepth);
+                uint32_t channelCount = 0;
+                if(SUCCEEDED(result)) {
+                    result = self.GetAudioChannelCount(&channelCount);
+                }
+                if(FAILED(result)) {
+                    return std::make_tuple(result, (uint64_t)0);
+                }
+                if(bitDepth != 16 && bitDepth != 24 && bitDepth != 32) {
+                    throw py::value_error("unsupported audio bit depth");
+                }
+                py::ssize_t itemSize = bitDepth == 16 ? 2 : 4;
+                if(out.ndim() != 2 || out.shape(1) != channelCount) {
+                    throw py::value_error("out must have the shape (samples, channels)");
+                }
+                if(out.dtype().kind() != 'i' || out.itemsize() != itemSize) {
+                    throw py::value_error(bitDepth == 16 ? "out must be an int16 array" : "out must be an int32 array");
+                }
+                if(!out.writeable() || !(out.flags() & py::array::c_style)) {
+                    throw py::value_error("out must be a writable, C-contiguous array");
+                }
+                if(chunkSampleCount == 0) {
+                    throw py::value_error("chunkSampleCount must be at least 1");
+                }
+
+                uint8_t* data = static_cast<uint8_t*>(out.mutable_data());
+                uint64_t sampleCount = out.shape(0);
+                uint32_t packedBytesPerSample = bitDepth / 8 * channelCount;
+                uint64_t totalSamplesRead = 0;
+                {
+                    py::gil_scoped_release release;
+                    // 24-bit samples are packed, so they are read into a staging buffer and then
+                    // sign-extended into the 32-bit output.
+                    std::vector<uint8_t> staging;
+                    if(bitDepth == 24) {
+                        staging.resize((size_t)chunkSampleCount * packedBytesPerSample);
+                    }
+                    while(totalSamplesRead < sampleCount) {
+                        uint32_t maxSampleCount = (uint32_t)std::min<uint64_t>(chunkSampleCount, sampleCount - totalSamplesRead);
+                        uint8_t* dest = data + totalSamplesRead * channelCount * itemSize;
+                        void* buffer = bitDepth == 24 ? staging.data() : dest;
+                        uint32_t samplesRead = 0;
+                        uint32_t bytesRead = 0;
+                        result = self.GetAudioSamples(sampleFrameIndex + totalSamplesRead, buffer,
+                                                      maxSampleCount * packedBytesPerSample, maxSampleCount,
+                                                      &samplesRead, &bytesRead);
+                        if(FAILED(result) || samplesRead == 0) {
+                            break;
+                        }
+                        if(bitDepth == 24) {
+                            int32_t* dest32 = reinterpret_cast<int32_t*>(dest);
+                            for(uint32_t i = 0; i < samplesRead * channelCount; ++i) {
+                                const uint8_t* p = &staging[i * 3];
+                                uint32_t value = (uint32_t)p[0] << 8 | (uint32_t)p[1] << 16 | (uint32_t)p[2] << 24;
+                                dest32[i] = (int32_t)value >> 8;
+                            }
+                        }
+                        totalSamplesRead += samplesRead;
+                    }
+                }
+                return std::make_tuple(result, totalSamplesRead);
+            },
+            "Read audio samples into a (samples, channels) array, without holding the GIL. The array "
+            "must be int16 for 16-bit audio, or int32 for 24-bit and 32-bit audio. 24-bit samples are "
+            "sign-extended. The samples are read in chunks of `chunkSampleCount` samples. Returns the "
+            "number of samples read, which is less than the length of the array if the end of the "
+            "clip was reached.",
+            "sampleFrameIndex"_a, py::arg("out").noconvert(), "chunkSampleCount"_a = 65536
+        )
     ;
 
     py::class_<IBlackmagicRawClipResolutions,IUnknown,std::unique_ptr<IBlackmagicRawClipResolutions,Releaser>>(m, "IBlackmagicRawClipResolutions")
@@ -872,6 +2012,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetResourceGPU(context, commandQueue, &type, &resource.data);
                 return std::make_tuple(result, type, resource);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Get the GPU resource the LUT is stored in.",
             "context"_a, "commandQueue"_a
         )
@@ -881,6 +2022,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetResourceCPU(&resource.data);
                 return std::make_tuple(result, resource);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Get the CPU resource the LUT is stored in."
         )
         .def("GetResourceSizeBytes",
@@ -915,6 +2057,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetPost3DLUT(&lut);
                 return std::make_tuple(result, lut);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Get the active 3D LUT."
         )
     ;
@@ -962,6 +2105,16 @@ PYBIND11_MODULE(_pybraw, m) {
             },
             "Create a metadata iterator for this frame."
         )
+        .def("metadata_dict",
+            [](IBlackmagicRawFrame& self) {
+                IBlackmagicRawMetadataIterator* iterator = nullptr;
+                HRESULT result = self.GetMetadataIterator(&iterator);
+                return convert_metadata_to_dict(result, iterator);
+            },
+            "Get all of the metadata of this frame as a dict, with array values as Numpy arrays. "
+            "The metadata iterator is walked natively, so this is much faster than iterating over it "
+            "from Python."
+        )
         .def("GetMetadata",
             [](IBlackmagicRawFrame& self, const char* key) {
                 Variant value;
@@ -1017,12 +2170,13 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobDecodeAndProcessFrame(clipProcessingAttributes, frameProcessingAttributes, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job that will decode and process our image.",
             "clipProcessingAttributes"_a = nullptr, "frameProcessingAttributes"_a = nullptr
         )
     ;
 
-    py::class_<IBlackmagicRawProcessedImage,IUnknown,std::unique_ptr<IBlackmagicRawProcessedImage,Releaser>>(m, "IBlackmagicRawProcessedImage")
+    py::class_<IBlackmagicRawProcessedImage,IUnknown,std::unique_ptr<IBlackmagicRawProcessedImage,Releaser>>(m, "IBlackmagicRawProcessedImage", py::buffer_protocol())
         .def("GetWidth",
             [](IBlackmagicRawProcessedImage& self) {
                 uint32_t width = 0;
@@ -1049,40 +2203,10 @@ PYBIND11_MODULE(_pybraw, m) {
         )
         .def("to_py",
             [](IBlackmagicRawProcessedImage& self) -> py::array {
-                HRESULT result;
-                BlackmagicRawResourceType type = 0;
-                result = self.GetResourceType(&type);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to query resource type");
-                }
-                if(type != blackmagicRawResourceTypeBufferCPU) {
+                ProcessedImageLayout layout = _processed_image_layout(self);
+                if(layout.type != blackmagicRawResourceTypeBufferCPU) {
                     throw py::buffer_error("not a CPU resource");
                 }
-                uint32_t sizeBytes = 0;
-                result = self.GetResourceSizeBytes(&sizeBytes);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to query resource size");
-                }
-                void* resource = nullptr;
-                result = self.GetResource(&resource);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to get resource pointer");
-                }
-                BlackmagicRawResourceFormat format = 0;
-                result = self.GetResourceFormat(&format);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to query resource format");
-                }
-                uint32_t width = 0;
-                result = self.GetWidth(&width);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to query image width");
-                }
-                uint32_t height = 0;
-                result = self.GetHeight(&height);
-                if(result != S_OK) {
-                    throw py::buffer_error("failed to query image height");
-                }
                 // The use of a capsule makes this safe. We increment the reference count for the
                 // processed frame and make it the base for the array. This will keep the processed
                 // frame alive for at least as long as the array viewing its data.
@@ -1091,28 +2215,36 @@ PYBIND11_MODULE(_pybraw, m) {
                     IBlackmagicRawProcessedImage* self = (IBlackmagicRawProcessedImage*)ptr;
                     self->Release();
                 });
-                switch(format) {
-                    case blackmagicRawResourceFormatRGBAU8:
-                    case blackmagicRawResourceFormatBGRAU8:
-                        return _resource_to_numpy<uint8_t>(std::vector<size_t>{height, width, 4}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatRGBU16:
-                        return _resource_to_numpy<uint16_t>(std::vector<size_t>{height, width, 3}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatRGBAU16:
-                    case blackmagicRawResourceFormatBGRAU16:
-                        return _resource_to_numpy<uint16_t>(std::vector<size_t>{height, width, 4}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatRGBU16Planar:
-                        return _resource_to_numpy<uint16_t>(std::vector<size_t>{3, height, width}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatRGBF32:
-                        return _resource_to_numpy<float_t>(std::vector<size_t>{height, width, 3}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatRGBF32Planar:
-                        return _resource_to_numpy<float_t>(std::vector<size_t>{3, height, width}, sizeBytes, resource, caps);
-                    case blackmagicRawResourceFormatBGRAF32:
-                        return _resource_to_numpy<float_t>(std::vector<size_t>{height, width, 4}, sizeBytes, resource, caps);
-                }
-                throw py::buffer_error("unsupported resource format");
+                return py::array(py::dtype(layout.format), layout.shape, layout.strides, layout.data, caps);
             },
             "Get the image as a Numpy array."
         )
+        .def_buffer([](IBlackmagicRawProcessedImage& self) -> py::buffer_info {
+            ProcessedImageLayout layout = _processed_image_layout(self);
+            if(layout.type != blackmagicRawResourceTypeBufferCPU) {
+                throw py::buffer_error("not a CPU resource");
+            }
+            // Buffer consumers hold a reference to this object, which keeps the image alive.
+            return py::buffer_info(layout.data, layout.itemSize, layout.format, (py::ssize_t)layout.shape.size(),
+                                   layout.shape, layout.strides);
+        })
+        .def("__dlpack__",
+            [](IBlackmagicRawProcessedImage& self, py::object stream) {
+                // The image is complete by the time it is handed to Python, so there is no work
+                // for the consumer's stream to wait on.
+                return _processed_image_to_dlpack(self);
+            },
+            "Export the image as a DLPack capsule without copying it. The image is kept alive "
+            "until the consumer releases the capsule's tensor. CPU and CUDA resources are supported.",
+            "stream"_a = py::none()
+        )
+        .def("__dlpack_device__",
+            [](IBlackmagicRawProcessedImage& self) {
+                DLDevice device = _processed_image_device(_processed_image_layout(self));
+                return std::make_tuple(device.device_type, device.device_id);
+            },
+            "Get the DLPack device type and device ID of the image's resource."
+        )
         .def("GetResourceType",
             [](IBlackmagicRawProcessedImage& self) {
                 BlackmagicRawResourceType type = 0;
@@ -1175,10 +2307,12 @@ PYBIND11_MODULE(_pybraw, m) {
     py::class_<IBlackmagicRawJob,IUnknown,std::unique_ptr<IBlackmagicRawJob,py::nodelete>>(m, "IBlackmagicRawJob")
         .def("Submit",
             &IBlackmagicRawJob::Submit,
+            py::call_guard<py::gil_scoped_release>(),
             "Submit the job to the decoder, placing it in the decoder's internal queue."
         )
         .def("Abort",
             &IBlackmagicRawJob::Abort,
+            py::call_guard<py::gil_scoped_release>(),
             "Abort the job."
         )
         .def("SetUserData",
@@ -1271,6 +2405,16 @@ PYBIND11_MODULE(_pybraw, m) {
             },
             "Create a metadata iterator for this clip."
         )
+        .def("metadata_dict",
+            [](IBlackmagicRawClip& self) {
+                IBlackmagicRawMetadataIterator* iterator = nullptr;
+                HRESULT result = self.GetMetadataIterator(&iterator);
+                return convert_metadata_to_dict(result, iterator);
+            },
+            "Get all of the metadata of this clip as a dict, with array values as Numpy arrays. "
+            "The metadata iterator is walked natively, so this is much faster than iterating over it "
+            "from Python."
+        )
         .def("GetMetadata",
             [](IBlackmagicRawClip& self, const char* key) {
                 Variant value;
@@ -1329,10 +2473,12 @@ PYBIND11_MODULE(_pybraw, m) {
         )
         .def("SaveSidecarFile",
             &IBlackmagicRawClip::SaveSidecarFile,
+            py::call_guard<py::gil_scoped_release>(),
             "Save all set metadata and processing attributes to the .sidecar file on disk."
         )
         .def("ReloadSidecarFile",
             &IBlackmagicRawClip::ReloadSidecarFile,
+            py::call_guard<py::gil_scoped_release>(),
             "Reload the .sidecar file, replacing unsaved metadata and processing attributes."
         )
         .def("CreateJobReadFrame",
@@ -1341,6 +2487,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobReadFrame(frameIndex, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job that will read the frame's bit stream into memory.",
             "frameIndex"_a
         )
@@ -1350,6 +2497,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobTrim(fileName, frameIndex, frameCount, clipProcessingAttributes, frameProcessingAttributes, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job that will export part of the clip into a new .braw file.",
             "fileName"_a, "frameIndex"_a, "frameCount"_a,
             "clipProcessingAttributes"_a = nullptr, "frameProcessingAttributes"_a = nullptr
@@ -1363,6 +2511,7 @@ PYBIND11_MODULE(_pybraw, m) {
     py::class_<IBlackmagicRawConfiguration,IUnknown,std::unique_ptr<IBlackmagicRawConfiguration,Releaser>>(m, "IBlackmagicRawConfiguration")
         .def("SetPipeline",
             &IBlackmagicRawConfiguration::SetPipeline,
+            py::call_guard<py::gil_scoped_release>(),
             "Set the pipeline to use for decoding.",
             "pipeline"_a, "pipelineContext"_a, "pipelineCommandQueue"_a
         )
@@ -1382,11 +2531,13 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.IsPipelineSupported(pipeline, &pipelineSupported);
                 return std::make_tuple(result, pipelineSupported);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Determine if a pipeline is supported by this machine.",
             "pipeline"_a
         )
         .def("SetCPUThreads",
             &IBlackmagicRawConfiguration::SetCPUThreads,
+            py::call_guard<py::gil_scoped_release>(),
             "Set the number of CPU threads to use while decoding.",
             "threadCount"_a
         )
@@ -1421,6 +2572,7 @@ PYBIND11_MODULE(_pybraw, m) {
         )
         .def("SetFromDevice",
             &IBlackmagicRawConfiguration::SetFromDevice,
+            py::call_guard<py::gil_scoped_release>(),
             "Set the instruction set, pipeline, context, and command queue from the device.",
             "pipelineDevice"_a
         )
@@ -1582,6 +2734,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.PopulateFrameStateBuffer(frame, clipProcessingAttributes, frameProcessingAttributes, frameState.data, frameStateSizeBytes);
                 return result;
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Convert the internal state of an IBlackmagicRawFrame to a frame state buffer.",
             "frame"_a, "clipProcessingAttributes"_a, "frameProcessingAttributes"_a, "frameState"_a, "frameStateSizeBytes"_a
         )
@@ -1591,6 +2744,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetFrameStateSizeBytes(&frameStateSizeBytes);
                 return std::make_tuple(result, frameStateSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the frame state buffer in bytes."
         )
         .def("GetDecodedSizeBytes",
@@ -1599,6 +2753,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetDecodedSizeBytes(frameStateBufferCPU.data, &decodedSizeBytes);
                 return std::make_tuple(result, decodedSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the decoded buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1608,6 +2763,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetProcessedSizeBytes(frameStateBufferCPU.data, &processedSizeBytes);
                 return std::make_tuple(result, processedSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the processed buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1617,6 +2773,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetPost3DLUTSizeBytes(frameStateBufferCPU.data, &post3DLUTSizeBytes);
                 return std::make_tuple(result, post3DLUTSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the post 3D LUT buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1626,6 +2783,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobDecode(frameStateBufferCPU.data, bitStreamBufferCPU.data, decodedBufferCPU.data, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job to decode a frame.",
             "frameStateBufferCPU"_a, "bitStreamBufferCPU"_a, "decodedBufferCPU"_a
         )
@@ -1635,6 +2793,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobProcess(frameStateBufferCPU.data, decodedBufferCPU.data, processedBufferCPU.data, post3DLUTBufferCPU.data, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job to process a frame.",
             "frameStateBufferCPU"_a, "decodedBufferCPU"_a, "processedBufferCPU"_a, "post3DLUTBufferCPU"_a
         )
@@ -1646,6 +2805,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.PopulateFrameStateBuffer(frame, clipProcessingAttributes, frameProcessingAttributes, frameState.data, frameStateSizeBytes);
                 return result;
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Convert the internal state of an IBlackmagicRawFrame to a frame state buffer.",
             "frame"_a, "clipProcessingAttributes"_a, "frameProcessingAttributes"_a, "frameState"_a, "frameStateSizeBytes"_a
         )
@@ -1655,6 +2815,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetFrameStateSizeBytes(&frameStateSizeBytes);
                 return std::make_tuple(result, frameStateSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the frame state buffer in bytes."
         )
         .def("GetDecodedSizeBytes",
@@ -1663,6 +2824,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetDecodedSizeBytes(frameStateBufferCPU.data, &decodedSizeBytes);
                 return std::make_tuple(result, decodedSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the decoded buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1672,6 +2834,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetWorkingSizeBytes(frameStateBufferCPU.data, &workingSizeBytes);
                 return std::make_tuple(result, workingSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the working buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1681,6 +2844,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetProcessedSizeBytes(frameStateBufferCPU.data, &processedSizeBytes);
                 return std::make_tuple(result, processedSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the processed buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1690,6 +2854,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.GetPost3DLUTSizeBytes(frameStateBufferCPU.data, &post3DLUTSizeBytes);
                 return std::make_tuple(result, post3DLUTSizeBytes);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Query the size of the post 3D LUT buffer in bytes.",
             "frameStateBufferCPU"_a
         )
@@ -1699,6 +2864,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobDecode(frameStateBufferCPU.data, bitStreamBufferCPU.data, decodedBufferCPU.data, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job to decode a frame.",
             "frameStateBufferCPU"_a, "bitStreamBufferCPU"_a, "decodedBufferCPU"_a
         )
@@ -1708,6 +2874,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateJobProcess(context, commandQueue, frameStateBufferCPU.data, decodedBufferGPU.data, workingBufferGpu.data, processedBufferGPU.data, post3DLUTBufferGPU.data, &job);
                 return std::make_tuple(result, job);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a job to process a frame.",
             "context"_a, "commandQueue"_a, "frameStateBufferCPU"_a, "decodedBufferGPU"_a,
             "workingBufferGPU"_a, "processedBufferGPU"_a, "post3DLUTBufferGPU"_a
@@ -1742,6 +2909,7 @@ PYBIND11_MODULE(_pybraw, m) {
                     // The buffer must be of floats.
                     result = E_INVALIDARG;
                 } else {
+                    py::gil_scoped_release release;
                     result = self.EvaluateToneCurve(cameraType, gen, contrast, saturation, midpoint, highlights, shadows, blackLevel, whiteLevel, videoBlackLevel, static_cast<float*>(info.ptr), info.size);
                 }
                 return result;
@@ -1758,6 +2926,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.OpenClip(fileName, &clip);
                 return std::make_tuple(result, clip);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Open a clip.",
             "fileName"_a
         )
@@ -1768,14 +2937,18 @@ PYBIND11_MODULE(_pybraw, m) {
         )
         .def("PreparePipeline",
             [](IBlackmagicRaw& self, BlackmagicRawPipeline pipeline, void* pipelineContext, void* pipelineCommandQueue, py::object userData) {
-                return self.PreparePipeline(pipeline, pipelineContext, pipelineCommandQueue, UserDataCreate(userData));
+                void* userDataPtr = UserDataCreate(userData);
+                py::gil_scoped_release release;
+                return self.PreparePipeline(pipeline, pipelineContext, pipelineCommandQueue, userDataPtr);
             },
             "Asynchronously prepare the pipeline for decoding.",
             "pipeline"_a, "pipelineContext"_a, "pipelineCommandQueue"_a, "userData"_a
         )
         .def("PreparePipelineForDevice",
             [](IBlackmagicRaw& self, IBlackmagicRawPipelineDevice* pipelineDevice, py::object userData) {
-                return self.PreparePipelineForDevice(pipelineDevice, UserDataCreate(userData));
+                void* userDataPtr = UserDataCreate(userData);
+                py::gil_scoped_release release;
+                return self.PreparePipelineForDevice(pipelineDevice, userDataPtr);
             },
             "Asynchronously prepare the pipeline for decoding.",
             "pipelineDevice"_a, "userData"_a
@@ -1840,6 +3013,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.SetImage(processedImage, &openGLTextureName, &openGLTextureTarget);
                 return std::make_tuple(result, openGLTextureName, openGLTextureTarget);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Copy the processed image into an OpenGL texture.",
             "processedImage"_a
         )
@@ -1848,6 +3022,7 @@ PYBIND11_MODULE(_pybraw, m) {
     py::class_<IBlackmagicRawPipelineDevice,IUnknown,std::unique_ptr<IBlackmagicRawPipelineDevice,Releaser>>(m, "IBlackmagicRawPipelineDevice")
         .def("SetBestInstructionSet",
             &IBlackmagicRawPipelineDevice::SetBestInstructionSet,
+            py::call_guard<py::gil_scoped_release>(),
             "Set the CPU instruction set of the device according to the best system capabilities."
         )
         .def("SetInstructionSet",
@@ -1942,6 +3117,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateDevice(&pipelineDevice);
                 return std::make_tuple(result, pipelineDevice);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create the pipeline device (container for context and command queue)."
         )
     ;
@@ -1953,6 +3129,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreateCodec(&codec);
                 return std::make_tuple(result, codec);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a codec from the factory."
         )
         .def("CreatePipelineIterator",
@@ -1961,6 +3138,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreatePipelineIterator(interop, &pipelineIterator);
                 return std::make_tuple(result, pipelineIterator);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a pipeline iterator from the factory.",
             "interop"_a
         )
@@ -1970,6 +3148,7 @@ PYBIND11_MODULE(_pybraw, m) {
                 HRESULT result = self.CreatePipelineDeviceIterator(pipeline, interop, &deviceIterator);
                 return std::make_tuple(result, deviceIterator);
             },
+            py::call_guard<py::gil_scoped_release>(),
             "Create a pipeline device iterator from the factory.",
             "pipeline"_a, "interop"_a
         )
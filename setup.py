@@ -9,7 +9,7 @@ ext_modules = [
         'pybraw._pybraw',
         sources=['ext/pybraw_ext.cpp'],
         include_dirs=['vendor/linux/include'],
-        libraries=['BlackmagicRawAPI'],
+        libraries=['BlackmagicRawAPI', 'dl'],
     ),
 ]
 
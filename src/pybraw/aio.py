@@ -0,0 +1,167 @@
+import asyncio
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from pybraw.task_manager import Task
+
+
+def _consume_quietly(task: Task):
+    try:
+        task.consume()
+    except Exception:
+        pass
+
+
+def _consume_when_done(task: Task):
+    """Make sure that an abandoned task is consumed so that it doesn't hold on to its buffers."""
+    task.on_done(lambda t, is_success: _consume_quietly(t))
+
+
+def _notify_loop(loop: asyncio.AbstractEventLoop, callback, *args):
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        # The event loop has been closed, so nobody is waiting any more.
+        pass
+
+
+async def wait_task(task: Task):
+    """Wait for a task to finish without blocking the event loop, then consume it.
+
+    If the waiting coroutine is cancelled, the task will be consumed in the background when it
+    finishes.
+
+    Returns:
+        The result of the task.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def on_done(task, is_success):
+        _notify_loop(loop, lambda: done.done() or done.set_result(None))
+
+    task.on_done(on_done)
+    try:
+        await done
+    except asyncio.CancelledError:
+        _consume_when_done(task)
+        raise
+    # The task is done, so this won't block.
+    return task.consume()
+
+
+class AsyncFrameReader:
+    """An asyncio front-end for reading frames.
+
+    SDK callbacks are forwarded to the event loop with `loop.call_soon_threadsafe`, so waiting for
+    a frame never blocks the event loop. At most `max_running_tasks` frames can be enqueued and
+    not yet returned at once. Further reads wait for one of those frames to be returned before
+    being enqueued, which applies backpressure to the caller.
+
+    Example:
+        async with AsyncFrameReader(reader, PixelFormat.RGB_F32_Planar) as async_reader:
+            image = await async_reader.read_frame(0)
+            async for frame_index, image in async_reader.iter_frames(range(10)):
+                ...
+
+    Args:
+        reader: The frame reader, for example a `pybraw.torch.reader.FrameImageReader`.
+        pixel_format: The pixel format of the output images.
+        max_running_tasks: The maximum number of frames which can be in flight at once.
+        **run_flow_kwargs: Other keyword arguments which will be passed to `reader.run_flow`.
+    """
+    def __init__(self, reader, pixel_format, max_running_tasks: int = 3, **run_flow_kwargs):
+        if max_running_tasks < 1:
+            raise ValueError('max_running_tasks must be at least 1')
+        self.reader = reader
+        self.pixel_format = pixel_format
+        self.max_running_tasks = max_running_tasks
+        self._run_flow_kwargs = run_flow_kwargs
+        self._flow = None
+        self._task_manager = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        if self._flow is not None:
+            raise RuntimeError('The reader is already running')
+        loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_running_tasks)
+        self._flow = self.reader.run_flow(self.pixel_format, max_running_tasks=self.max_running_tasks,
+                                          **self._run_flow_kwargs)
+        self._task_manager = await loop.run_in_executor(None, self._flow.__enter__)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        loop = asyncio.get_running_loop()
+        flow = self._flow
+        self._flow = None
+        self._task_manager = None
+        # Shutting down the flow waits for the SDK to finish outstanding jobs.
+        return await loop.run_in_executor(None, flow.__exit__, exc_type, exc_value, traceback)
+
+    def _enqueue(self, frame_index, kwargs):
+        if self._task_manager is None:
+            raise RuntimeError('The reader is not running, use it with `async with`')
+        return self._task_manager.enqueue_task(frame_index, **kwargs)
+
+    async def read_frame(self, frame_index: int, **kwargs):
+        """Read a single frame.
+
+        Args:
+            frame_index: The index of the frame to read.
+            **kwargs: Keyword arguments which will be passed to `enqueue_task`.
+
+        Returns:
+            The frame image.
+        """
+        async with self._slots:
+            task = self._enqueue(frame_index, kwargs)
+            return await wait_task(task)
+
+    async def iter_frames(self, frame_indices: Iterable[int], **kwargs) -> AsyncIterator[Tuple[int, object]]:
+        """Read frames, yielding them in the order that they finish.
+
+        Args:
+            frame_indices: The indices of the frames to read.
+            **kwargs: Keyword arguments which will be passed to `enqueue_task`.
+
+        Returns:
+            An asynchronous iterator of `(frame_index, image)` pairs.
+        """
+        loop = asyncio.get_running_loop()
+        completed = asyncio.Queue()
+        pending = set()
+
+        def on_done(task, is_success):
+            _notify_loop(loop, completed.put_nowait, task)
+
+        frame_indices = iter(frame_indices)
+        exhausted = False
+        try:
+            while True:
+                # Keep the pipeline full, but only while there are free slots.
+                while not exhausted and (len(pending) == 0 or not self._slots.locked()):
+                    frame_index = next(frame_indices, None)
+                    if frame_index is None:
+                        exhausted = True
+                        break
+                    await self._slots.acquire()
+                    try:
+                        task = self._enqueue(frame_index, kwargs)
+                    except BaseException:
+                        self._slots.release()
+                        raise
+                    pending.add(task)
+                    task.on_done(on_done)
+                if len(pending) == 0:
+                    break
+                task = await completed.get()
+                pending.discard(task)
+                try:
+                    image = task.consume()
+                finally:
+                    self._slots.release()
+                yield task.frame_index, image
+        finally:
+            for task in pending:
+                self._slots.release()
+                _consume_when_done(task)
@@ -0,0 +1,342 @@
+import os
+import wave
+from math import ceil
+from queue import Queue
+from threading import Event, Thread
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+
+from pybraw import _pybraw, verify
+
+
+# Samples are read from the SDK in chunks of this many sample frames.
+DEFAULT_CHUNK_SAMPLE_COUNT = 1 << 16
+
+
+class AudioReader:
+    """A reader for the audio of a clip.
+
+    Samples are returned as `(samples, channels)` NumPy arrays. 16-bit audio is returned as
+    `int16`, and 24-bit and 32-bit audio as `int32`. 24-bit samples are sign-extended, so they keep
+    their original values rather than being scaled up to the 32-bit range.
+
+    Args:
+        clip: The clip to read audio from.
+    """
+    def __init__(self, clip: _pybraw.IBlackmagicRawClip):
+        # Holding on to the clip keeps it open for as long as the reader is in use.
+        self.clip = clip
+        self.audio = verify(clip.as_IBlackmagicRawClipAudio())
+        if verify(self.audio.GetAudioFormat()) != _pybraw.blackmagicRawAudioFormatPCMLittleEndian:
+            raise NotImplementedError('Only PCM audio is supported')
+        self.bit_depth = verify(self.audio.GetAudioBitDepth())
+        self.channel_count = verify(self.audio.GetAudioChannelCount())
+        self.sample_rate = verify(self.audio.GetAudioSampleRate())
+        self.sample_count = verify(self.audio.GetAudioSampleCount())
+        if self.bit_depth == 16:
+            self.dtype = np.dtype(np.int16)
+        elif self.bit_depth in {24, 32}:
+            self.dtype = np.dtype(np.int32)
+        else:
+            raise NotImplementedError(f'Unsupported audio bit depth: {self.bit_depth}')
+
+    @classmethod
+    def from_file(cls, clip_path) -> 'AudioReader':
+        """Open a clip and create a reader for its audio."""
+        factory = _pybraw.CreateBlackmagicRawFactoryInstance()
+        codec = verify(factory.CreateCodec())
+        reader = cls(verify(codec.OpenClip(os.fspath(clip_path))))
+        # The codec must outlive the clip.
+        reader._codec = codec
+        return reader
+
+    def duration(self) -> float:
+        """The length of the audio in seconds."""
+        return self.sample_count / self.sample_rate
+
+    def empty(self, count: int) -> np.ndarray:
+        """Allocate an array which can hold `count` sample frames."""
+        return np.empty((count, self.channel_count), dtype=self.dtype)
+
+    def read_audio(
+        self,
+        start: int = 0,
+        count: Optional[int] = None,
+        out: Optional[np.ndarray] = None,
+        chunk_sample_count: int = DEFAULT_CHUNK_SAMPLE_COUNT,
+    ) -> np.ndarray:
+        """Read a range of sample frames.
+
+        The samples are read inside the extension module, in large chunks and without holding the
+        GIL, so reading the whole clip at once is cheap.
+
+        Args:
+            start: The index of the first sample frame to read.
+            count: The number of sample frames to read. If not specified, the audio is read to the
+                end of the clip, or until `out` is full.
+            out: A C-contiguous array to read into, such as one from `empty`. If not specified, a
+                new array is allocated.
+            chunk_sample_count: The number of sample frames to read from the SDK at a time.
+
+        Returns:
+            An array of shape `(samples, channels)`. It is shorter than `count` if the end of the
+            clip was reached. If `out` was given, the result is a view of it.
+        """
+        if not 0 <= start <= self.sample_count:
+            raise IndexError('Audio sample index out of range')
+        if count is None:
+            count = self.sample_count - start
+            if out is not None:
+                count = min(len(out), count)
+        if out is None:
+            out = self.empty(min(count, self.sample_count - start))
+        elif len(out) < count:
+            raise ValueError('out is too small to hold the samples')
+        else:
+            out = out[:count]
+        samples_read = verify(self.audio.ReadAudioSamples(start, out, chunk_sample_count))
+        return out[:samples_read]
+
+    def frame_windows(self, window_size: Optional[int] = None) -> 'FrameAudioWindows':
+        """Create a lookup of the audio which belongs to each video frame of the clip.
+
+        See `FrameAudioWindows`.
+        """
+        return FrameAudioWindows(self, verify(self.clip.GetFrameRate()), verify(self.clip.GetFrameCount()),
+                                 window_size)
+
+    def stream(self, block_size: int, start: int = 0, count: Optional[int] = None) -> 'AudioStream':
+        """Iterate over the audio in blocks, reading ahead on a background thread.
+
+        See `AudioStream`.
+        """
+        return AudioStream(self, block_size, start, count)
+
+
+class AudioStream:
+    """An iterator over fixed-size blocks of audio, which reads the next block in the background.
+
+    Blocks are read into two reusable buffers. While the caller works on one block, a background
+    thread reads the next block into the other buffer. The reads don't hold the GIL, so the caller
+    can write blocks to disk at the same time. Every block has `block_size` sample frames, except
+    possibly the last one.
+
+    A block is a view of one of the buffers, so it is only valid until the next block is
+    requested. Copy it if it needs to be kept for longer.
+
+    Args:
+        audio_reader: The reader to read audio from.
+        block_size: The number of sample frames in each block.
+        start: The index of the first sample frame to read.
+        count: The total number of sample frames to read. If not specified, the audio is read to
+            the end of the clip.
+    """
+    def __init__(self, audio_reader: AudioReader, block_size: int, start: int = 0, count: Optional[int] = None):
+        if block_size < 1:
+            raise ValueError('block_size must be at least 1')
+        if count is None:
+            count = audio_reader.sample_count - start
+        self.audio_reader = audio_reader
+        self.block_size = block_size
+        self._end = min(start + count, audio_reader.sample_count)
+        self._free = Queue()
+        self._filled = Queue()
+        for _ in range(2):
+            self._free.put(audio_reader.empty(block_size))
+        # The buffer holding the block which was last returned to the caller.
+        self._current = None
+        self._stop = Event()
+        self._done = False
+        self._thread = Thread(target=self._read_blocks, args=(start,), daemon=True)
+        self._thread.start()
+
+    def _read_blocks(self, position: int):
+        try:
+            while position < self._end and not self._stop.is_set():
+                buffer = self._free.get()
+                if buffer is None:
+                    break
+                block = self.audio_reader.read_audio(position, min(self.block_size, self._end - position), out=buffer)
+                if len(block) == 0:
+                    break
+                position += len(block)
+                self._filled.put((buffer, block))
+        except Exception as e:
+            self._filled.put((None, e))
+            return
+        self._filled.put(None)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self
+
+    def __next__(self) -> np.ndarray:
+        if self._done:
+            raise StopIteration
+        if self._current is not None:
+            # The caller is finished with the previous block, so its buffer can be reused.
+            self._free.put(self._current)
+            self._current = None
+        item = self._filled.get()
+        if item is None:
+            self.close()
+            raise StopIteration
+        buffer, block = item
+        if buffer is None:
+            self.close()
+            raise block
+        self._current = buffer
+        return block
+
+    def close(self):
+        """Stop reading ahead."""
+        self._done = True
+        self._stop.set()
+        # Wake the background thread up if it is waiting for a free buffer.
+        self._free.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FrameAudioWindows:
+    """The audio which plays during each video frame of a clip.
+
+    The first sample of every frame's window is worked out once, from the frame rate and the audio
+    sample rate. The audio is taken to start at the same time as the first frame. All windows have
+    the same length, so the windows of many frames can be stacked. When a frame lasts for a
+    fractional number of samples, windows are rounded up and overlap by a sample.
+
+    Timecodes are deliberately not used. The audio and video of a clip are recorded together from
+    the first frame, and the SDK has no separate audio start time. The timecode of each frame is
+    just its start timecode plus its frame index, so it adds nothing over the frame index. Turning
+    drop-frame timecodes back into times would also place windows wrongly, because drop-frame
+    timecodes skip labels rather than time.
+
+    Args:
+        audio_reader: The reader to read audio from.
+        frame_rate: The video frame rate of the clip.
+        frame_count: The number of video frames in the clip.
+        window_size: The number of sample frames in each window. Defaults to the length of one
+            video frame, rounded up.
+    """
+    def __init__(self, audio_reader: AudioReader, frame_rate: float, frame_count: int,
+                 window_size: Optional[int] = None):
+        samples_per_frame = audio_reader.sample_rate / frame_rate
+        if window_size is None:
+            window_size = ceil(samples_per_frame)
+        if window_size < 1:
+            raise ValueError('window_size must be at least 1')
+        self.audio_reader = audio_reader
+        self.window_size = window_size
+        # The index of the first sample frame of each video frame.
+        self.offsets = np.round(np.arange(frame_count) * samples_per_frame).astype(np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read(self, frame_indices: Sequence[int], max_span: int = DEFAULT_CHUNK_SAMPLE_COUNT) -> np.ndarray:
+        """Read the audio windows of several video frames.
+
+        Windows which are close together are taken from a single read, which spans from the first
+        to the last window of the group. Samples past the end of the audio are zero.
+
+        Args:
+            frame_indices: The indices of the video frames.
+            max_span: The maximum number of sample frames in a single read. Windows which don't
+                fit within this many sample frames of each other are read separately, so that
+                windows which are far apart don't read all of the audio between them.
+
+        Returns:
+            An array of shape `(frames, window_size, channels)`, in the order of `frame_indices`.
+        """
+        frame_indices = np.asarray(frame_indices, dtype=np.int64)
+        channel_count = self.audio_reader.channel_count
+        out = np.zeros((len(frame_indices), self.window_size, channel_count), dtype=self.audio_reader.dtype)
+        if len(frame_indices) == 0:
+            return out
+        if frame_indices.min() < 0 or frame_indices.max() >= len(self.offsets):
+            raise IndexError('Frame index out of range')
+        starts = self.offsets[frame_indices]
+        order = np.argsort(starts, kind='stable')
+        sorted_starts = starts[order]
+        group_begin = 0
+        while group_begin < len(order):
+            span_start = int(sorted_starts[group_begin])
+            # Take every window which ends within `max_span` of the start of the first one. A
+            # group always has room for at least one window.
+            last_start = span_start + max(max_span - self.window_size, 0)
+            group_end = int(np.searchsorted(sorted_starts, last_start, side='right'))
+            group_starts = sorted_starts[group_begin:group_end]
+            span = np.zeros((int(group_starts[-1]) + self.window_size - span_start, channel_count),
+                            dtype=self.audio_reader.dtype)
+            if span_start < self.audio_reader.sample_count:
+                self.audio_reader.read_audio(span_start, len(span), out=span)
+            sample_indices = (group_starts - span_start)[:, None] + np.arange(self.window_size)
+            out[order[group_begin:group_end]] = span[sample_indices]
+            group_begin = group_end
+        return out
+
+
+class WaveWriter:
+    """A writer for uncompressed PCM WAVE files, which takes audio in blocks.
+
+    Args:
+        path: The path of the file to write.
+        sample_rate: The number of sample frames per second.
+        channel_count: The number of audio channels.
+        bit_depth: The number of bits per sample (16, 24, or 32).
+        sample_count: The total number of sample frames, if it is known up front. Otherwise the
+            header is updated when the writer is closed.
+    """
+    def __init__(self, path, sample_rate: int, channel_count: int, bit_depth: int, sample_count: int = 0):
+        if bit_depth not in {16, 24, 32}:
+            raise ValueError(f'Unsupported bit depth: {bit_depth}')
+        self.bit_depth = bit_depth
+        self.channel_count = channel_count
+        self._wave = wave.open(os.fspath(path), 'wb')
+        self._wave.setnchannels(channel_count)
+        self._wave.setsampwidth(bit_depth // 8)
+        self._wave.setframerate(sample_rate)
+        self._wave.setnframes(sample_count)
+
+    def write(self, block: np.ndarray):
+        """Write a `(samples, channels)` block of samples, as returned by `AudioReader`."""
+        if block.ndim != 2 or block.shape[1] != self.channel_count:
+            raise ValueError('block must have the shape (samples, channels)')
+        if self.bit_depth == 16:
+            data = np.ascontiguousarray(block, dtype=np.int16)
+        elif self.bit_depth == 24:
+            # Keep the low three bytes of each little-endian 32-bit sample.
+            data = np.ascontiguousarray(block, dtype='<i4').view(np.uint8).reshape(-1, 4)[:, :3]
+            data = np.ascontiguousarray(data)
+        else:
+            data = np.ascontiguousarray(block, dtype=np.int32)
+        self._wave.writeframesraw(data.data)
+
+    def close(self):
+        self._wave.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_wav(audio_reader: AudioReader, path, block_duration: float = 1.0):
+    """Write the audio of a clip to a WAVE file.
+
+    The audio is streamed in blocks of `block_duration` seconds, and each block is read from the
+    clip while the previous one is being written.
+    """
+    block_size = max(round(block_duration * audio_reader.sample_rate), 1)
+    with WaveWriter(path, audio_reader.sample_rate, audio_reader.channel_count, audio_reader.bit_depth,
+                    audio_reader.sample_count) as writer:
+        with audio_reader.stream(block_size) as blocks:
+            for block in blocks:
+                writer.write(block)
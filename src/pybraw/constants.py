@@ -45,7 +45,7 @@ class PixelFormat(IntEnum):
     RGBA_U8_Packed = _pybraw.blackmagicRawResourceFormatRGBAU8
     BGRA_U8_Packed = _pybraw.blackmagicRawResourceFormatBGRAU8
     RGB_U16_Packed = _pybraw.blackmagicRawResourceFormatRGBU16
-    RGBA_U16_Packed = _pybraw.blackmagicRawResourceFormatRGBU16
+    RGBA_U16_Packed = _pybraw.blackmagicRawResourceFormatRGBAU16
     BGRA_U16_Packed = _pybraw.blackmagicRawResourceFormatBGRAU16
     RGB_U16_Planar = _pybraw.blackmagicRawResourceFormatRGBU16Planar
     RGB_F32_Packed = _pybraw.blackmagicRawResourceFormatRGBF32
@@ -92,3 +92,13 @@ class ResolutionScale(IntEnum):
             return False
         assert parts[1] == 'Flipped'
         return True
+
+    @classmethod
+    def from_factor(cls, factor, flipped=False):
+        lookup = {1: 'Full', 2: 'Half', 4: 'Quarter', 8: 'Eighth'}
+        if factor not in lookup:
+            raise ValueError(f'Unsupported resolution scale factor: {factor}')
+        name = lookup[factor]
+        if flipped:
+            name += '_Flipped'
+        return cls[name]
@@ -0,0 +1,56 @@
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from pybraw import _pybraw, verify
+
+
+def scan_frame_metadata(
+    codec: _pybraw.IBlackmagicRaw,
+    clip: _pybraw.IBlackmagicRawClip,
+    frame_indices: Optional[Sequence[int]] = None,
+    max_jobs_in_flight: int = 16,
+) -> Dict[str, np.ndarray]:
+    """Collect the metadata of many frames into a table with one column per metadata key.
+
+    Frames are read without being decoded. The read jobs are submitted and completed inside the
+    extension module, with several of them in flight at once and without holding the GIL. The
+    codec's callback is replaced while scanning, so the codec must not be used for anything else
+    at the same time.
+
+    Args:
+        codec: The codec which opened the clip.
+        clip: The clip to scan.
+        frame_indices: The frames to scan. If not specified, every frame of the clip is scanned.
+        max_jobs_in_flight: The maximum number of frames which are being read at once.
+
+    Returns:
+        A dict of NumPy arrays with one row per frame. The `frame_index`, `valid` and `timecode`
+        columns are always present. A frame which fails to read doesn't stop the scan. Instead,
+        its row has `valid` set to `False` and no metadata. Integer values are `int64` columns, or
+        `float64` columns with NaN where a frame lacks the value. Arrays which have the same
+        length in every frame (such as `sensor_rate`) are 2D `float64` columns. Other values are
+        object columns, with `None` where a frame lacks the value.
+    """
+    if frame_indices is None:
+        frame_indices = range(verify(clip.GetFrameCount()))
+    frame_indices = [int(frame_index) for frame_index in frame_indices]
+    scanner = _pybraw.FrameMetadataScanner()
+    verify(codec.SetCallback(scanner))
+    try:
+        return verify(scanner.Scan(clip, frame_indices, max_jobs_in_flight))
+    finally:
+        verify(codec.SetCallback(None))
+
+
+def read_frame_metadata(clip_path, frame_indices: Optional[Sequence[int]] = None,
+                        max_jobs_in_flight: int = 16) -> Dict[str, np.ndarray]:
+    """Open a clip and collect the metadata of its frames.
+
+    See `scan_frame_metadata`.
+    """
+    factory = _pybraw.CreateBlackmagicRawFactoryInstance()
+    codec = verify(factory.CreateCodec())
+    clip = verify(codec.OpenClip(os.fspath(clip_path)))
+    return scan_frame_metadata(codec, clip, frame_indices, max_jobs_in_flight)
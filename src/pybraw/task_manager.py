@@ -1,6 +1,9 @@
+import heapq
+import time
 from abc import ABC, abstractmethod
+from collections import deque
 from concurrent.futures import Future
-from threading import Condition, RLock
+from threading import Condition, Lock, RLock
 
 
 class TaskConsumedError(Exception):
@@ -9,37 +12,73 @@ class TaskConsumedError(Exception):
 
 
 class Task:
-    def __init__(self, task_manager):
+    # Internal tasks are consumed by the task manager itself, so they are not returned by
+    # `TaskManager.as_completed` or consumed by `TaskManager.consume_remaining`.
+    internal = False
+
+    def __init__(self, task_manager, priority=0, deadline=None):
+        """Create a task.
+
+        Args:
+            task_manager: The task manager which will run the task.
+            priority: Queued tasks with a higher priority are started first.
+            deadline: A `time.monotonic()` timestamp. If the task is still queued at this time, it
+                will be cancelled instead of started.
+        """
         self.task_manager = task_manager
+        self.priority = priority
+        self.deadline = deadline
         self._future = Future()
         self._callbacks = []
+        self._callbacks_lock = Lock()
+
+    def _run_callbacks(self, is_success):
+        # Callbacks are registered from other threads, so take a snapshot of them while holding
+        # the lock which `on_done` uses.
+        with self._callbacks_lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback(self, is_success)
 
     def reject(self, exception: BaseException):
         """Set the result of the task to an exception, making the task unsuccessful.
         """
         if self.is_consumed():
             raise TaskConsumedError
-        self._future.set_exception(exception)
-        for callback in self._callbacks:
-            callback(self, False)
+        with self._callbacks_lock:
+            self._future.set_exception(exception)
+        self._run_callbacks(False)
 
     def resolve(self, result):
         """Set the result of the task, making the task successful.
         """
         if self.is_consumed():
             raise TaskConsumedError
-        self._future.set_result(result)
-        for callback in self._callbacks:
-            callback(self, True)
+        with self._callbacks_lock:
+            self._future.set_result(result)
+        self._run_callbacks(True)
 
     def cancel(self):
         """Cancel the task, making the task unsuccessful.
+
+        Cancelling a task which is already done has no effect. To cancel a task which may still
+        be queued, use `TaskManager.cancel_queued` instead.
         """
         if self.is_consumed():
             raise TaskConsumedError
-        self._future.cancel()
-        for callback in self._callbacks:
-            callback(self, False)
+        with self._callbacks_lock:
+            if self._future.done():
+                return
+            self._future.cancel()
+        self._run_callbacks(False)
+
+    def is_expired(self, now=None) -> bool:
+        """Check whether the deadline of this task has passed."""
+        if self.deadline is None:
+            return False
+        if now is None:
+            now = time.monotonic()
+        return now >= self.deadline
 
     def is_consumed(self):
         """Check whether this task has been consumed.
@@ -86,31 +125,77 @@ class Task:
         """
         if self.is_consumed():
             raise TaskConsumedError
-        if self.is_done():
-            exception = self._future.exception()
-            if exception is None:
-                callback(self, True)
-            else:
-                callback(self, False)
-        self._callbacks.append(callback)
+        with self._callbacks_lock:
+            is_done = self._future.done()
+            if not is_done:
+                self._callbacks.append(callback)
+        if is_done:
+            callback(self, not self._future.cancelled() and self._future.exception() is None)
+
+
+class TaskQueue:
+    """A queue of tasks which are served highest priority first, then first in first out.
+
+    Each priority level has its own deque, and a heap holds the priority levels which currently
+    have queued tasks. Pushing and popping are O(1) for tasks at an existing priority level.
+    """
+    def __init__(self):
+        self._queues = {}
+        # Negated priority levels, so that the highest priority is at the top of the heap.
+        self._priorities = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def push(self, task, priority=0):
+        queue = self._queues.get(priority)
+        if queue is None:
+            queue = deque()
+            self._queues[priority] = queue
+            heapq.heappush(self._priorities, -priority)
+        queue.append(task)
+        self._len += 1
+
+    def pop(self):
+        """Remove and return the next task, or `None` if the queue is empty."""
+        if self._len == 0:
+            return None
+        priority = -self._priorities[0]
+        queue = self._queues[priority]
+        task = queue.popleft()
+        self._len -= 1
+        if len(queue) == 0:
+            heapq.heappop(self._priorities)
+            del self._queues[priority]
+        return task
+
+    def take_all(self):
+        """Remove all tasks from the queue, returning them in the order they would be served."""
+        tasks = [task for priority in sorted(self._queues, reverse=True) for task in self._queues[priority]]
+        self._queues.clear()
+        self._priorities.clear()
+        self._len = 0
+        return tasks
 
 
 class TaskManager(ABC):
     class _CompletedTaskIterator:
         def __init__(self):
             self._condition = Condition()
-            self._running_tasks = []
-            self._completed_tasks = []
+            # Dicts are used as insertion-ordered sets so that tasks can be removed in O(1).
+            self._running_tasks = {}
+            self._completed_tasks = deque()
 
         def _on_task_complete(self, task, is_success):
             with self._condition:
-                self._running_tasks.remove(task)
+                del self._running_tasks[task]
                 self._completed_tasks.append(task)
                 self._condition.notify()
 
         def _register_task(self, task):
             with self._condition:
-                self._running_tasks.append(task)
+                self._running_tasks[task] = None
                 self._condition.notify()
             task.on_done(self._on_task_complete)
 
@@ -123,7 +208,7 @@ class TaskManager(ABC):
                     self._condition.wait()
                 if len(self._completed_tasks) == 0:
                     raise StopIteration
-                return self._completed_tasks.pop(0)
+                return self._completed_tasks.popleft()
 
     def __init__(self, max_running_tasks):
         if max_running_tasks < 1:
@@ -131,8 +216,9 @@ class TaskManager(ABC):
         self._lock = RLock()
         self._max_running_tasks = max_running_tasks
         self._cur_running_tasks = 0
-        self._queued_tasks = []
-        self._running_tasks = []
+        self._queued_tasks = TaskQueue()
+        # A dict is used as an insertion-ordered set so that tasks can be removed in O(1).
+        self._running_tasks = {}
         self._completed_task_iterator = self._CompletedTaskIterator()
 
     def as_completed(self):
@@ -156,35 +242,97 @@ class TaskManager(ABC):
     def _on_task_ended(self, task):
         pass
 
+    def _push_queued_task(self, task, priority):
+        """Add a task to the queue of tasks waiting to be started."""
+        self._queued_tasks.push(task, priority)
+
+    def _pop_queued_task(self):
+        """Remove the next task to start from the queue.
+
+        Returns:
+            The task, or `None` if no queued task can be started right now.
+        """
+        return self._queued_tasks.pop()
+
+    def _take_queued_tasks(self):
+        """Remove all tasks from the queue, returning them."""
+        return self._queued_tasks.take_all()
+
+    def _pop_startable_task(self):
+        # Tasks which were cancelled or expired while queued are dropped here, so removing a task
+        # from the queue doesn't require searching for it.
+        now = None
+        while True:
+            task = self._pop_queued_task()
+            if task is None:
+                return None
+            if task.is_done():
+                continue
+            if task.deadline is not None:
+                if now is None:
+                    now = time.monotonic()
+                if task.is_expired(now):
+                    task.cancel()
+                    continue
+            return task
+
     def _try_start_task(self):
         with self._lock:
-            if self._cur_running_tasks < self._max_running_tasks and len(self._queued_tasks) > 0:
+            if self._cur_running_tasks < self._max_running_tasks:
+                task = self._pop_startable_task()
+                if task is None:
+                    return
                 self._cur_running_tasks += 1
-                task = self._queued_tasks.pop(0)
-                self._completed_task_iterator._register_task(task)
-                self._running_tasks.append(task)
+                if not task.internal:
+                    self._completed_task_iterator._register_task(task)
+                self._running_tasks[task] = None
                 self._on_task_started(task)
 
-    def enqueue(self, task):
+    def enqueue(self, task, priority=None):
         """Add a new task to the processing queue.
+
+        Args:
+            task: The task to enqueue.
+            priority: Queued tasks with a higher priority are started first. Tasks with the same
+                priority are started in the order that they were enqueued. If not specified, the
+                priority of the task is used.
         """
         with self._lock:
-            self._queued_tasks.append(task)
+            if priority is not None:
+                task.priority = priority
+            self._push_queued_task(task, task.priority)
             self._try_start_task()
 
+    def cancel_queued(self, task) -> bool:
+        """Cancel a task if it has not been started yet.
+
+        The task stays in the queue until its turn comes, at which point it is dropped without
+        being started.
+
+        Returns:
+            `True` if the task was cancelled, or `False` if it has already been started.
+        """
+        with self._lock:
+            if task.is_consumed() or task in self._running_tasks or task.is_done():
+                return False
+            task.cancel()
+            return True
+
     def clear_queue(self):
         """Remove all pending tasks from the queue.
         """
         with self._lock:
-            for task in list(self._queued_tasks):
-                task.cancel()
-            self._queued_tasks.clear()
+            for task in self._take_queued_tasks():
+                if not task.is_done():
+                    task.cancel()
 
     def consume_remaining(self):
         """Consume all tasks that have been started but not yet consumed.
         """
         with self._lock:
             for task in list(self._running_tasks):
+                if task.internal:
+                    continue
                 try:
                     task.consume()
                 except:
@@ -192,5 +340,8 @@ class TaskManager(ABC):
 
     def _end_task(self, task):
         with self._lock:
-            self._running_tasks.remove(task)
+            if task not in self._running_tasks:
+                # The task was cancelled or expired before it was started.
+                return
+            del self._running_tasks[task]
             self._on_task_ended(task)
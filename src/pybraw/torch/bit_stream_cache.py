@@ -0,0 +1,55 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Hashable, Optional
+
+import torch
+
+from pybraw import _pybraw
+from pybraw.torch.frame_cache import _SizeBoundedCache, clip_file_identity
+
+
+@dataclass(frozen=True)
+class CachedBitStream:
+    # The frame returned by the read job, which is needed to populate frame state buffers.
+    frame: _pybraw.IBlackmagicRawFrame
+    bit_stream: torch.Tensor
+    # The frame is shared between decodes, so setting its resolution scale and resource format
+    # and populating a frame state buffer from it must happen under this lock.
+    lock: Lock = field(default_factory=Lock, compare=False)
+
+
+class BitStreamCache(_SizeBoundedCache):
+    """A least recently used cache of compressed frames, bounded by their size in bytes.
+
+    A frame whose bit stream is in the cache is decoded straight from memory, without reading from
+    the clip file again. This makes re-decoding a frame with different processing settings cheap,
+    even when the clip is on slow storage.
+
+    Entries are keyed by `(clip_key, frame_index)`, where `clip_key` identifies the clip file and
+    its sidecar (see `BitStreamCache.clip_key`).
+
+    Args:
+        max_bytes: The maximum total size of the cached bit streams.
+    """
+    @staticmethod
+    def clip_key(clip_path, clip: _pybraw.IBlackmagicRawClip) -> Hashable:
+        """Create the part of a cache key which identifies a clip."""
+        # Bit streams don't depend on the processing attributes, but the cached frames carry the
+        # frame processing attributes from the sidecar.
+        return clip_file_identity(clip_path)
+
+    @staticmethod
+    def _nbytes(value: CachedBitStream) -> int:
+        return value.bit_stream.numel()
+
+    def get(self, key) -> Optional[CachedBitStream]:
+        """Get a cached bit stream, or `None` if it is not in the cache."""
+        return super().get(key)
+
+    def put(self, key, cached_bit_stream: CachedBitStream):
+        """Add a bit stream to the cache, evicting least recently used bit streams to make room for
+        it.
+
+        Bit streams which are bigger than the whole cache are not added.
+        """
+        super().put(key, cached_bit_stream)
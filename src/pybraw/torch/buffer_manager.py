@@ -1,9 +1,14 @@
 from abc import ABC, abstractmethod
+from collections import deque
 from math import ceil
-from typing import Optional, Sequence
+from threading import Lock
+from typing import List, Optional, Sequence
 
+import numpy as np
 import torch
 from torch.nn.functional import interpolate
+from torch.multiprocessing.reductions import StorageWeakRef
+from torch.utils.dlpack import from_dlpack, to_dlpack
 
 from pybraw import verify, _pybraw, PixelFormat, ResolutionScale
 
@@ -51,10 +56,287 @@ def _storage_to_tensor(storage):
     raise NotImplementedError(f'Unsupported tensor type: {device}, {dtype}')
 
 
+def _reserve_storage(storage, size):
+    """Grow a storage so that it holds at least `size` elements.
+
+    Resizing a storage always reallocates its memory, so we avoid doing it when the storage is
+    already large enough.
+    """
+    if len(storage) < size:
+        storage.resize_(size)
+
+
+class OutputBufferRing:
+    """A fixed-capacity ring of reusable output buffers.
+
+    Post-processed images which view an output buffer lease that buffer from the ring. The buffer
+    is returned to the ring once nothing views its memory any more, including views derived from
+    the image (such as `image[0]` or `image.permute(...)`). In the steady state no new output
+    buffers need to be allocated. If every buffer is leased out when another one is needed, the
+    ring grows and `grow_count` is incremented.
+    """
+    def __init__(self, pixel_format: PixelFormat, device, capacity: int):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self._pixel_type = pixel_format.data_type()
+        self._device = torch.device(device)
+        self._lock = Lock()
+        self._free = deque(self._create_storage() for _ in range(capacity))
+        # Leased buffers, each with a weak reference to the storage of the image which views it.
+        self._leased = []
+        self._capacity = capacity
+        self.grow_count = 0
+
+    def _create_storage(self):
+        return _create_storage(self._pixel_type, self._device, 0)
+
+    def _reclaim(self):
+        """Return leased buffers whose images are no longer in use to the ring."""
+        still_leased = []
+        for image_storage_ref, storage in self._leased:
+            if image_storage_ref.expired():
+                self._free.append(storage)
+            else:
+                still_leased.append((image_storage_ref, storage))
+        self._leased = still_leased
+
+    @property
+    def capacity(self) -> int:
+        """The total number of buffers owned by the ring, including leased buffers."""
+        return self._capacity
+
+    @property
+    def available(self) -> int:
+        """The number of buffers which are not currently in use."""
+        with self._lock:
+            self._reclaim()
+            return len(self._free)
+
+    def acquire(self):
+        """Take a buffer from the ring, growing the ring if none are available."""
+        with self._lock:
+            if len(self._free) == 0:
+                self._reclaim()
+            if len(self._free) > 0:
+                return self._free.popleft()
+            self._capacity += 1
+            self.grow_count += 1
+        return self._create_storage()
+
+    def lease(self, image_tensor: torch.Tensor, storage) -> torch.Tensor:
+        """Lease `storage` to an image which views it.
+
+        Returns:
+            The image to hand out in place of `image_tensor`. It views the same memory, but through
+            a storage of its own which is shared by every view derived from it. `storage` returns
+            to the ring once that storage has been freed.
+        """
+        # A DLPack round trip wraps the memory in a new storage, which holds a reference to the
+        # original one until it is freed. `StorageWeakRef` is private to `torch.multiprocessing`,
+        # so this was checked against the PyTorch version pinned in environment.yml (1.9.1).
+        image_tensor = from_dlpack(to_dlpack(image_tensor))
+        with self._lock:
+            self._leased.append((StorageWeakRef(image_tensor.storage()), storage))
+        return image_tensor
+
+
+def _view_image(buffer_tensor: torch.Tensor, processed_image: _pybraw.IBlackmagicRawProcessedImage) -> torch.Tensor:
+    """Give a flat buffer tensor the shape of the processed image that it holds."""
+    width = verify(processed_image.GetWidth())
+    height = verify(processed_image.GetHeight())
+    pixel_format = PixelFormat(verify(processed_image.GetResourceFormat()))
+    n_channels = len(pixel_format.channels())
+    image_tensor = buffer_tensor[:n_channels * height * width]
+    if pixel_format.is_planar():
+        return image_tensor.view(n_channels, height, width)
+    return image_tensor.view(height, width, n_channels)
+
+
+def processed_image_to_tensor(processed_image: _pybraw.IBlackmagicRawProcessedImage) -> torch.Tensor:
+    """Create a tensor which views the memory of a processed image.
+
+    The tensor keeps the processed image alive, but the underlying resource may be reused by the
+    decoder once the job that produced it has been consumed.
+    """
+    pixel_format = PixelFormat(verify(processed_image.GetResourceFormat()))
+    if pixel_format.data_type() == 'U16':
+        # PyTorch has no unsigned 16-bit type, so we use the same signed reinterpretation as
+        # `_create_storage`. This goes through the buffer protocol, so it only works on the CPU.
+        return torch.from_numpy(np.asarray(processed_image).view(np.int16))
+    return from_dlpack(processed_image.__dlpack__())
+
+
+# The value of a fully saturated channel for each pixel data type.
+_CHANNEL_MAX = {'U8': 255, 'U16': 65535, 'F32': 1}
+
+
+def _channel_indices(pixel_format: PixelFormat, channels: Optional[str]) -> List[int]:
+    """Find the position of each requested output channel in a pixel format."""
+    in_channels = pixel_format.channels()
+    if channels is None:
+        return list(range(len(in_channels)))
+    for channel in channels:
+        if channel not in in_channels:
+            raise ValueError(f'Channel {channel!r} is not in pixel format {pixel_format.name}')
+    return [in_channels.index(channel) for channel in channels]
+
+
+def _convert_channels(
+    image_tensor: torch.Tensor,
+    pixel_format: PixelFormat,
+    channel_indices: Sequence[int],
+    planar: bool,
+    dtype: torch.dtype,
+    normalize: bool,
+) -> torch.Tensor:
+    """Select, reorder, and convert channels.
+
+    Each output channel is written straight from its (possibly strided) input channel, so changing
+    between packed and planar layouts doesn't need an intermediate copy. This takes a single pass
+    over the output, except for 16-bit images converted to another data type, which take a second
+    pass to wrap the values around and a third to normalize them.
+    """
+    if pixel_format.is_planar():
+        height, width = image_tensor.shape[1:]
+    else:
+        height, width = image_tensor.shape[:2]
+    n_channels = len(channel_indices)
+    shape = (n_channels, height, width) if planar else (height, width, n_channels)
+    out = torch.empty(shape, dtype=dtype, device=image_tensor.device)
+    pixel_type = pixel_format.data_type()
+    # 16-bit images are stored as signed values (see `_create_storage`), so they need to be
+    # wrapped back around when converted to any other type.
+    unsigned_fix = pixel_type == 'U16' and dtype != image_tensor.dtype
+    scale = 1 / _CHANNEL_MAX[pixel_type] if normalize and pixel_type != 'F32' else None
+    for out_index, in_index in enumerate(channel_indices):
+        src = image_tensor[in_index] if pixel_format.is_planar() else image_tensor[..., in_index]
+        dst = out[out_index] if planar else out[..., out_index]
+        if scale is not None and not unsigned_fix:
+            torch.mul(src, scale, out=dst)
+        else:
+            dst.copy_(src)
+    if unsigned_fix:
+        out.remainder_(65536)
+        if scale is not None:
+            out.mul_(scale)
+    return out
+
+
+def _from_working_float(image_tensor: torch.Tensor, pixel_format: PixelFormat, dtype: torch.dtype) -> torch.Tensor:
+    """Convert a resized floating point image back to an integer data type."""
+    if dtype.is_floating_point:
+        return image_tensor.to(dtype)
+    pixel_type = pixel_format.data_type()
+    image_tensor = image_tensor.round_().clamp_(0, _CHANNEL_MAX[pixel_type])
+    if pixel_type == 'U16' and dtype == torch.int16:
+        image_tensor = torch.where(image_tensor > 32767, image_tensor - 65536, image_tensor)
+    return image_tensor.to(dtype)
+
+
+def transform_image(
+    image_tensor: torch.Tensor,
+    pixel_format: PixelFormat,
+    resolution_scale: ResolutionScale,
+    out_device: Optional[torch.device] = None,
+    crop: Optional[Sequence[int]] = None,
+    out_size: Optional[Sequence[int]] = None,
+    channels: Optional[str] = None,
+    planar: Optional[bool] = None,
+    dtype: Optional[torch.dtype] = None,
+    normalize: bool = False,
+) -> torch.Tensor:
+    """Crop, convert, resize, and move a shaped processed image tensor.
+
+    The result may be a view of `image_tensor`. See `BufferManager.postprocess` for a description
+    of the other arguments.
+
+    Args:
+        image_tensor: The processed image, shaped as `(C, H, W)` for planar pixel formats or
+            `(H, W, C)` for packed pixel formats.
+        pixel_format: The pixel format of the processed image.
+    """
+    # Get the scale factor. For example, `8` means that the image has already been scaled to
+    # 1/8th of the original full frame size.
+    scale_factor = resolution_scale.factor()
+
+    if pixel_format.is_planar():
+        height_axis = 1
+        width_axis = 2
+    else:
+        height_axis = 0
+        width_axis = 1
+
+    # Crop the image.
+    if crop is not None:
+        x, y, w, h = crop
+        x = round(x / scale_factor)
+        y = round(y / scale_factor)
+        w = round(w / scale_factor)
+        h = round(h / scale_factor)
+        if resolution_scale.is_flipped():
+            # Flipped images are rotated by 180 degrees by the SDK, and the crop region is given in
+            # the coordinates of the unflipped frame.
+            x = image_tensor.shape[width_axis] - x - w
+            y = image_tensor.shape[height_axis] - y - h
+        image_tensor = image_tensor.narrow(width_axis, x, w).narrow(height_axis, y, h)
+
+    channel_indices = _channel_indices(pixel_format, channels)
+    if planar is None:
+        planar = pixel_format.is_planar()
+    if normalize:
+        if dtype is None:
+            dtype = torch.float32
+        elif not dtype.is_floating_point:
+            raise ValueError('Normalized images must have a floating point data type')
+    out_dtype = dtype if dtype is not None else image_tensor.dtype
+    if not out_dtype.is_floating_point and out_dtype != image_tensor.dtype:
+        if torch.iinfo(out_dtype).max < _CHANNEL_MAX[pixel_format.data_type()]:
+            raise ValueError(f'{out_dtype} can not hold every value of pixel format {pixel_format.name}')
+    needs_conversion = (
+        channel_indices != list(range(len(pixel_format.channels())))
+        or planar != pixel_format.is_planar()
+        or out_dtype != image_tensor.dtype
+        or normalize
+    )
+    needs_resize = out_size is not None and tuple(out_size) != (image_tensor.shape[width_axis],
+                                                                image_tensor.shape[height_axis])
+
+    if needs_resize:
+        # Interpolation works on floating point images, so integer images are converted to a
+        # floating point working type and converted back afterwards.
+        working_dtype = out_dtype if out_dtype.is_floating_point else torch.float32
+        if needs_conversion or working_dtype != image_tensor.dtype:
+            image_tensor = _convert_channels(image_tensor, pixel_format, channel_indices, planar, working_dtype,
+                                             normalize)
+            is_planar = planar
+        else:
+            is_planar = pixel_format.is_planar()
+        # Packed images are resized as channels-last views, so the result is packed without a copy.
+        batch = image_tensor[None] if is_planar else image_tensor.permute(2, 0, 1)[None]
+        out_width, out_height = out_size
+        image_tensor = interpolate(batch, (out_height, out_width), mode='bilinear', align_corners=False)[0]
+        if not planar:
+            image_tensor = image_tensor.permute(1, 2, 0)
+        if out_dtype != image_tensor.dtype:
+            image_tensor = _from_working_float(image_tensor, pixel_format, out_dtype)
+    elif needs_conversion:
+        image_tensor = _convert_channels(image_tensor, pixel_format, channel_indices, planar, out_dtype, normalize)
+
+    # Move the image tensor to the desired device.
+    if out_device is not None:
+        image_tensor = image_tensor.to(out_device)
+
+    return image_tensor
+
+
 class BufferManager(ABC):
-    def __init__(self, manual_decoder):
+    def __init__(self, manual_decoder, output_ring: Optional[OutputBufferRing] = None):
         self.manual_decoder = manual_decoder
+        self.output_ring = output_ring
         self.bit_stream = torch.ByteStorage(0)
+        self.bit_stream_size_bytes = 0
+        # A bit stream which was read earlier, to decode from instead of `bit_stream`.
+        self._bit_stream_override = None
         self.frame_state = torch.ByteStorage(0)
         self.decoded_buffer = torch.ByteStorage(0)
 
@@ -64,35 +346,83 @@ class BufferManager(ABC):
 
     @property
     def bit_stream_resource(self):
+        if self._bit_stream_override is not None:
+            return _pybraw.CreateResourceFromIntPointer(self._bit_stream_override.data_ptr())
         return _pybraw.CreateResourceFromIntPointer(self.bit_stream.data_ptr())
 
     @property
     def decoded_buffer_resource(self):
         return _pybraw.CreateResourceFromIntPointer(self.decoded_buffer.data_ptr())
 
-    def populate_frame_state_buffer(self, frame):
+    def populate_frame_state_buffer(self, frame, clip_processing_attributes=None):
         frame_state_size_bytes = verify(self.manual_decoder.GetFrameStateSizeBytes())
-        self.frame_state.resize_(frame_state_size_bytes)
-        verify(self.manual_decoder.PopulateFrameStateBuffer(frame, None, None, self.frame_state_resource, frame_state_size_bytes))
-
-    def create_read_job(self, clip_ex, frame_index) -> _pybraw.IBlackmagicRawJob:
-        bit_stream_size_bytes = verify(clip_ex.GetBitStreamSizeBytes(frame_index))
-        self.bit_stream.resize_(bit_stream_size_bytes)
+        _reserve_storage(self.frame_state, frame_state_size_bytes)
+        verify(self.manual_decoder.PopulateFrameStateBuffer(frame, clip_processing_attributes, None,
+                                                            self.frame_state_resource, frame_state_size_bytes))
+
+    def reserve_bit_stream(self, bit_stream_size_bytes: int):
+        """Make sure that the bit stream buffer can hold a bit stream of the given size."""
+        _reserve_storage(self.bit_stream, bit_stream_size_bytes)
+
+    def create_read_job(self, clip_ex, frame_index, bit_stream_size_bytes=None) -> _pybraw.IBlackmagicRawJob:
+        if bit_stream_size_bytes is None:
+            bit_stream_size_bytes = verify(clip_ex.GetBitStreamSizeBytes(frame_index))
+        _reserve_storage(self.bit_stream, bit_stream_size_bytes)
+        self._bit_stream_override = None
+        self.bit_stream_size_bytes = bit_stream_size_bytes
         read_job = verify(clip_ex.CreateJobReadFrame(frame_index, self.bit_stream_resource, bit_stream_size_bytes))
         return read_job
 
+    def use_bit_stream(self, bit_stream: torch.Tensor):
+        """Decode the next frame from a bit stream which has already been read.
+
+        This takes the place of a read job. The bit stream must be a contiguous CPU byte tensor,
+        and it must stay unchanged until the decode job has finished.
+        """
+        self._bit_stream_override = bit_stream
+        self.bit_stream_size_bytes = bit_stream.numel()
+
+    def copy_bit_stream(self) -> torch.Tensor:
+        """Copy the bit stream which was last read into a new byte tensor."""
+        return torch.ByteTensor(self.bit_stream)[:self.bit_stream_size_bytes].clone()
+
     @abstractmethod
     def create_decode_job(self) -> _pybraw.IBlackmagicRawJob:
         pass
 
     @abstractmethod
-    def create_process_job(self) -> _pybraw.IBlackmagicRawJob:
+    def create_process_job(self, out: Optional[torch.Tensor] = None) -> _pybraw.IBlackmagicRawJob:
+        """Create a job which processes the decoded frame.
+
+        Args:
+            out: A tensor to write the processed image directly into. It is only used if its
+                device, type, and size exactly match the processed image, otherwise the image is
+                written to the output buffer as usual.
+        """
         pass
 
+    def _output_target_resource(self, out: Optional[torch.Tensor], processed_buffer_size_bytes: int):
+        if out is None:
+            return None
+        output_buffer = self.get_output_buffer()
+        if out.device != output_buffer.device or out.dtype != output_buffer.dtype:
+            return None
+        if not out.is_contiguous() or out.numel() * out.element_size() != processed_buffer_size_bytes:
+            return None
+        return _pybraw.CreateResourceFromIntPointer(out.data_ptr())
+
     @abstractmethod
     def get_output_buffer(self):
         pass
 
+    @abstractmethod
+    def set_post_3d_lut(self, post_3d_lut):
+        """Change the post 3D LUT used by subsequent process jobs.
+
+        This allows a buffer manager to be shared by clips with different post 3D LUTs.
+        """
+        pass
+
     @abstractmethod
     def replace_output_buffer(self):
         pass
@@ -104,6 +434,10 @@ class BufferManager(ABC):
         out_device: Optional[torch.device] = None,
         crop: Optional[Sequence[int]] = None,
         out_size: Optional[Sequence[int]] = None,
+        channels: Optional[str] = None,
+        planar: Optional[bool] = None,
+        dtype: Optional[torch.dtype] = None,
+        normalize: bool = False,
     ) -> torch.Tensor:
         """Post-process the frame image.
 
@@ -116,81 +450,76 @@ class BufferManager(ABC):
             out_device: The result will be stored in this device's memory. If not specified, the
                 image will be kept on the same device.
             crop: An input region to crop (x, y, width, height). If not specified, the image will
-                not be cropped.
+                not be cropped. For flipped resolution scales the region is given in the
+                coordinates of the unflipped frame, so a crop selects the same part of the picture
+                whether or not it is flipped. The cropped image is still a view.
             out_size: The output image size (width, height). If not specified, the image will
                 not be resized beyond the scaling which already may have occurred due to the
-                resolution scale.
+                resolution scale. Images of any pixel format can be resized.
+            channels: The output channels in order, for example `'RGB'` to drop the alpha channel
+                of a `BGRA_U8_Packed` image and reverse the others. If not specified, the channels
+                of the pixel format are kept.
+            planar: Whether the output image is planar `(C, H, W)` or packed `(H, W, C)`. If not
+                specified, the layout of the pixel format is kept.
+            dtype: The data type of the output image. If not specified, the data type of the
+                pixel format is kept. 16-bit pixel formats are stored as `torch.int16`, so they are
+                converted to other types as unsigned values. Integer types which can't hold every
+                value of the pixel format, such as `torch.uint8` for 16-bit pixel formats, are
+                rejected.
+            normalize: Scale integer pixel values to the range [0, 1]. The output data type
+                defaults to `torch.float32` when normalizing.
+
+        Channel selection, layout changes, and type conversion are done together, in a single pass
+        over the output image.
 
         Returns:
             The post-processed frame image.
         """
-        # The output buffer contains the processed frame image.
         output_buffer = self.get_output_buffer()
-
-        # Confirm that the `processed_image` refers to the same resource as `output_buffer`.
-        ref_resource = verify(processed_image.GetResource())
-        if output_buffer.data_ptr() != int(ref_resource):
-            raise ValueError('Processed image does not match the buffer')
-
-        if resolution_scale.is_flipped():
-            raise NotImplementedError('Flipped images are currently not supported')
-
-        # Get the scale factor. For example, `8` means that the image has already been scaled to
-        # 1/8th of the original full frame size.
-        scale_factor = resolution_scale.factor()
-
-        # Get information about the size and layout of the processed image.
-        width = verify(processed_image.GetWidth())
-        height = verify(processed_image.GetHeight())
-        resource_format = verify(processed_image.GetResourceFormat())
-        pixel_format: PixelFormat = PixelFormat(resource_format)
-        n_channels = len(pixel_format.channels())
-        n_elements = n_channels * height * width
-
-        # Wrap the output buffer in a tensor.
-        image_tensor = _storage_to_tensor(output_buffer)
-        image_tensor = image_tensor[:n_elements]
-
-        # Give the tensor a shape.
-        if pixel_format.is_planar():
-            image_tensor = image_tensor.view(n_channels, height, width)
-            height_axis = 1
-            width_axis = 2
-        else:
-            image_tensor = image_tensor.view(height, width, n_channels)
-            height_axis = 0
-            width_axis = 1
-
-        # Crop the image.
-        if crop is not None:
-            x, y, w, h = crop
-            x = round(x / scale_factor)
-            y = round(y / scale_factor)
-            w = round(w / scale_factor)
-            h = round(h / scale_factor)
-            image_tensor = image_tensor.narrow(width_axis, x, w).narrow(height_axis, y, h)
-
-        # Resize the image.
-        if out_size is not None:
-            out_width, out_height = out_size
-            if not (out_width == image_tensor.shape[width_axis] and out_height == image_tensor.shape[height_axis]):
-                if not pixel_format.is_planar():
-                    raise NotImplementedError('Resizing is currently only supported for planar pixel formats')
-                image_tensor = interpolate(image_tensor[None, ...], (out_height, out_width),
-                                           mode='bilinear', align_corners=False)[0]
-
-        # Move the image tensor to the desired device.
-        if out_device is not None:
-            image_tensor = image_tensor.to(out_device)
+        image_tensor = self.view_output(processed_image, resolution_scale, out_device, crop, out_size,
+                                        channels, planar, dtype, normalize)
 
         # Ensure that the returned image tensor is independent of the buffer manager.
         # This prevents us from overwriting the data with subsequent reads when the buffer manager
         # is used again in the future.
         if image_tensor.storage().data_ptr() == output_buffer.data_ptr():
+            if self.output_ring is not None:
+                image_tensor = self.output_ring.lease(image_tensor, output_buffer)
             self.replace_output_buffer()
 
         return image_tensor
 
+    def view_output(
+        self,
+        processed_image: _pybraw.IBlackmagicRawProcessedImage,
+        resolution_scale: ResolutionScale,
+        out_device: Optional[torch.device] = None,
+        crop: Optional[Sequence[int]] = None,
+        out_size: Optional[Sequence[int]] = None,
+        channels: Optional[str] = None,
+        planar: Optional[bool] = None,
+        dtype: Optional[torch.dtype] = None,
+        normalize: bool = False,
+    ) -> torch.Tensor:
+        """Post-process the frame image without detaching it from the output buffer.
+
+        Unlike `postprocess`, the returned tensor may view the output buffer, so it is only valid
+        until the buffer manager is reused. See `postprocess` for a description of the arguments.
+        """
+        # The output buffer contains the processed frame image.
+        output_buffer = self.get_output_buffer()
+
+        # Confirm that the `processed_image` refers to the same resource as `output_buffer`.
+        ref_resource = verify(processed_image.GetResource())
+        if output_buffer.data_ptr() != int(ref_resource):
+            raise ValueError('Processed image does not match the buffer')
+
+        # Wrap the output buffer in a tensor.
+        image_tensor = _view_image(_storage_to_tensor(output_buffer), processed_image)
+        pixel_format = PixelFormat(verify(processed_image.GetResourceFormat()))
+        return transform_image(image_tensor, pixel_format, resolution_scale, out_device, crop, out_size,
+                               channels, planar, dtype, normalize)
+
 
 class BufferManagerFlow1(BufferManager):
     def __init__(
@@ -198,6 +527,7 @@ class BufferManagerFlow1(BufferManager):
         manual_decoder: _pybraw.IBlackmagicRawManualDecoderFlow1,
         post_3d_lut: Optional[torch.ByteStorage],
         pixel_format: PixelFormat,
+        output_ring: Optional[OutputBufferRing] = None,
     ):
         """Create a buffer manager for manual decoder flow 1 (CPU-only).
 
@@ -205,8 +535,10 @@ class BufferManagerFlow1(BufferManager):
             manual_decoder: The manual decoder flow.
             post_3d_lut: The post 3D LUT data, stored in CPU memory.
             pixel_format: The desired pixel format of the output image.
+            output_ring: A ring of reusable output buffers. If not specified, a new output buffer
+                will be allocated whenever a post-processed image is still using the old one.
         """
-        super().__init__(manual_decoder)
+        super().__init__(manual_decoder, output_ring)
         self._post_3d_lut = post_3d_lut
         self._pixel_format = pixel_format
         self.replace_output_buffer()
@@ -215,7 +547,13 @@ class BufferManagerFlow1(BufferManager):
         return self.processed_buffer
 
     def replace_output_buffer(self):
-        self.processed_buffer = _create_storage(self._pixel_format.data_type(), 'cpu', 0)
+        if self.output_ring is not None:
+            self.processed_buffer = self.output_ring.acquire()
+        else:
+            self.processed_buffer = _create_storage(self._pixel_format.data_type(), 'cpu', 0)
+
+    def set_post_3d_lut(self, post_3d_lut: Optional[torch.ByteStorage]):
+        self._post_3d_lut = post_3d_lut
 
     @property
     def post_3d_lut_resource(self):
@@ -229,14 +567,17 @@ class BufferManagerFlow1(BufferManager):
 
     def create_decode_job(self):
         decoded_buffer_size_bytes = verify(self.manual_decoder.GetDecodedSizeBytes(self.frame_state_resource))
-        self.decoded_buffer.resize_(decoded_buffer_size_bytes)
+        _reserve_storage(self.decoded_buffer, decoded_buffer_size_bytes)
         decode_job = verify(self.manual_decoder.CreateJobDecode(self.frame_state_resource, self.bit_stream_resource, self.decoded_buffer_resource))
         return decode_job
 
-    def create_process_job(self):
+    def create_process_job(self, out=None):
         processed_buffer_size_bytes = verify(self.manual_decoder.GetProcessedSizeBytes(self.frame_state_resource))
-        self.processed_buffer.resize_(ceil(processed_buffer_size_bytes / self.processed_buffer.element_size()))
-        process_job = verify(self.manual_decoder.CreateJobProcess(self.frame_state_resource, self.decoded_buffer_resource, self.processed_buffer_resource, self.post_3d_lut_resource))
+        processed_resource = self._output_target_resource(out, processed_buffer_size_bytes)
+        if processed_resource is None:
+            _reserve_storage(self.processed_buffer, ceil(processed_buffer_size_bytes / self.processed_buffer.element_size()))
+            processed_resource = self.processed_buffer_resource
+        process_job = verify(self.manual_decoder.CreateJobProcess(self.frame_state_resource, self.decoded_buffer_resource, processed_resource, self.post_3d_lut_resource))
         return process_job
 
 
@@ -249,6 +590,7 @@ class BufferManagerFlow2(BufferManager):
         context,
         command_queue,
         stream: torch.cuda.Stream,
+        output_ring: Optional[OutputBufferRing] = None,
     ):
         """Create a buffer manager for manual decoder flow 2 (GPU accelerated).
 
@@ -259,8 +601,11 @@ class BufferManagerFlow2(BufferManager):
             context: The CUDA context.
             command_queue: The GPU command queue.
             stream: The CUDA processing stream.
+            output_ring: A ring of reusable output buffers in CUDA memory. If not specified, a new
+                output buffer will be allocated whenever a post-processed image is still using the
+                old one.
         """
-        super().__init__(manual_decoder)
+        super().__init__(manual_decoder, output_ring)
         self.context = context
         self.command_queue = command_queue
         self._post_3d_lut_gpu = post_3d_lut_gpu
@@ -275,9 +620,15 @@ class BufferManagerFlow2(BufferManager):
         return self.processed_buffer
 
     def replace_output_buffer(self):
+        if self.output_ring is not None:
+            self.processed_buffer = self.output_ring.acquire()
+            return
         with torch.cuda.stream(self.stream):
             self.processed_buffer = _create_storage(self._pixel_format.data_type(), 'cuda', 0)
 
+    def set_post_3d_lut(self, post_3d_lut_gpu: Optional[torch.cuda.ByteStorage]):
+        self._post_3d_lut_gpu = post_3d_lut_gpu
+
     @property
     def post_3d_lut_gpu_resource(self):
         if self._post_3d_lut_gpu is None:
@@ -306,15 +657,18 @@ class BufferManagerFlow2(BufferManager):
         decode_job = verify(self.manual_decoder.CreateJobDecode(self.frame_state_resource, self.bit_stream_resource, self.decoded_buffer_resource))
         return decode_job
 
-    def create_process_job(self) -> _pybraw.IBlackmagicRawJob:
+    def create_process_job(self, out=None) -> _pybraw.IBlackmagicRawJob:
         with torch.cuda.stream(self.stream):
             self.decoded_buffer_gpu.copy_(self.decoded_buffer, non_blocking=True)
             working_buffer_size_bytes = verify(self.manual_decoder.GetWorkingSizeBytes(self.frame_state_resource))
-            self.working_buffer.resize_(working_buffer_size_bytes)
+            _reserve_storage(self.working_buffer, working_buffer_size_bytes)
             processed_buffer_size_bytes = verify(self.manual_decoder.GetProcessedSizeBytes(self.frame_state_resource))
-            self.processed_buffer.resize_(ceil(processed_buffer_size_bytes / self.processed_buffer.element_size()))
+            processed_resource = self._output_target_resource(out, processed_buffer_size_bytes)
+            if processed_resource is None:
+                _reserve_storage(self.processed_buffer, ceil(processed_buffer_size_bytes / self.processed_buffer.element_size()))
+                processed_resource = self.processed_buffer_resource
         process_job = verify(self.manual_decoder.CreateJobProcess(
             self.context, self.command_queue, self.frame_state_resource,
             self.decoded_buffer_gpu_resource, self.working_buffer_resource,
-            self.processed_buffer_resource, self.post_3d_lut_gpu_resource))
+            processed_resource, self.post_3d_lut_gpu_resource))
         return process_job
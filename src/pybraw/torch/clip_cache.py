@@ -0,0 +1,107 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+import torch
+
+from pybraw import _pybraw, verify
+from pybraw.torch.reader import CodecPipeline, load_post_3d_lut, read_bit_stream_sizes
+
+
+@dataclass(eq=False)
+class CachedClip:
+    clip: _pybraw.IBlackmagicRawClip
+    clip_ex: _pybraw.IBlackmagicRawClipEx
+    post_3d_lut_buffer: Optional[torch.ByteStorage]
+    mtime_ns: int
+    _bit_stream_sizes: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def bit_stream_sizes(self) -> np.ndarray:
+        """Get the size in bytes of the bit stream of every frame, indexed by frame index.
+
+        The sizes are read the first time they are needed, so opening a clip to decode only a few
+        of its frames doesn't pay for looking up all of them.
+        """
+        if self._bit_stream_sizes is None:
+            self._bit_stream_sizes = read_bit_stream_sizes(self.clip)
+        return self._bit_stream_sizes
+
+    def bit_stream_size(self, frame_index: int) -> int:
+        """Get the size in bytes of the bit stream of one frame."""
+        if self._bit_stream_sizes is not None:
+            return int(self._bit_stream_sizes[frame_index])
+        return verify(self.clip_ex.GetBitStreamSizeBytes(frame_index))
+
+
+class ClipCache:
+    """A least recently used cache of opened clips which share a single codec.
+
+    Clips are keyed by their path and modification time, so a clip which has changed on disk will
+    be opened again. An evicted clip is released once no reader is using it any more.
+    """
+    def __init__(self, capacity: int = 64, processing_device='cpu'):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.codec_pipeline = CodecPipeline(processing_device)
+        self._lock = Lock()
+        self._clips = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def processing_device(self) -> torch.device:
+        return self.codec_pipeline.processing_device
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clips)
+
+    def __contains__(self, clip_path):
+        with self._lock:
+            return os.fspath(clip_path) in self._clips
+
+    def get(self, clip_path) -> CachedClip:
+        """Get an opened clip, opening it if it is not already in the cache."""
+        clip_path = os.fspath(clip_path)
+        mtime_ns = os.stat(clip_path).st_mtime_ns
+        with self._lock:
+            cached_clip = self._clips.get(clip_path)
+            if cached_clip is not None and cached_clip.mtime_ns == mtime_ns:
+                self._clips.move_to_end(clip_path)
+                self.hits += 1
+                return cached_clip
+            self.misses += 1
+            # Drop the stale entry for a clip which has changed on disk.
+            self._clips.pop(clip_path, None)
+            cached_clip = self._open(clip_path, mtime_ns)
+            self._clips[clip_path] = cached_clip
+            while len(self._clips) > self.capacity:
+                self._clips.popitem(last=False)
+                self.evictions += 1
+            return cached_clip
+
+    def _open(self, clip_path, mtime_ns) -> CachedClip:
+        clip = verify(self.codec_pipeline.codec.OpenClip(clip_path))
+        return CachedClip(
+            clip=clip,
+            clip_ex=verify(clip.as_IBlackmagicRawClipEx()),
+            post_3d_lut_buffer=load_post_3d_lut(clip, self.processing_device),
+            mtime_ns=mtime_ns,
+        )
+
+    def clear(self):
+        """Remove all clips from the cache."""
+        with self._lock:
+            self._clips.clear()
+
+    def hit_rate(self) -> float:
+        """The fraction of `get` calls which found the clip in the cache."""
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
@@ -0,0 +1,269 @@
+import os
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from itertools import accumulate
+from typing import Callable, List, Optional, Sequence
+
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+from pybraw import _pybraw, verify, PixelFormat, ResolutionScale
+from pybraw.torch.clip_cache import ClipCache
+from pybraw.torch.disk_cache import DiskFrameCache
+from pybraw.torch.reader import FrameImageReader
+
+
+def count_frames(clip_paths: Sequence[str]) -> List[int]:
+    """Count the frames in each of the given clips.
+
+    The codec used for counting is released before this function returns, so it is safe to call
+    this in a process which will later be forked into data loader workers.
+    """
+    factory = _pybraw.CreateBlackmagicRawFactoryInstance()
+    codec = verify(factory.CreateCodec())
+    frame_counts = []
+    for clip_path in clip_paths:
+        clip = verify(codec.OpenClip(os.fspath(clip_path)))
+        frame_counts.append(verify(clip.GetFrameCount()))
+        del clip
+    del codec, factory
+    return frame_counts
+
+
+class _OpenClip:
+    def __init__(self, clip_path, processing_device, pixel_format, max_running_tasks, clip_cache=None,
+                 frame_cache=None):
+        self._exit_stack = ExitStack()
+        self.reader = FrameImageReader(clip_path, processing_device=processing_device, clip_cache=clip_cache)
+        self.task_manager = self._exit_stack.enter_context(
+            self.reader.run_flow(pixel_format, max_running_tasks=max_running_tasks, frame_cache=frame_cache))
+
+    def close(self):
+        self._exit_stack.close()
+
+
+# SDK objects can't be used, or safely released, in a process forked from the one which created
+# them. Clips inherited from a parent process are kept here so that they are never released.
+_abandoned_clips = []
+
+
+class _ClipPool:
+    """Clips opened by the current process, which are closed least recently used first.
+
+    If `clip_cache_size` is specified, clips are opened through a `ClipCache` whose codec is shared
+    by all of the clips. Only one clip at a time can have a running flow in that case, but
+    switching back to a recently used clip doesn't have to open it again.
+    """
+    def __init__(self, max_open_clips: int, processing_device='cpu', clip_cache_size: Optional[int] = None):
+        if max_open_clips < 1:
+            raise ValueError('max_open_clips must be at least 1')
+        if clip_cache_size is not None and max_open_clips != 1:
+            raise ValueError('max_open_clips must be 1 when using a clip cache')
+        self.max_open_clips = max_open_clips
+        self.processing_device = processing_device
+        self.clip_cache_size = clip_cache_size
+        self.clip_cache = None
+        self._pid = os.getpid()
+        self._clips = OrderedDict()
+
+    def _abandon_if_forked(self):
+        if self._pid != os.getpid():
+            _abandoned_clips.extend(self._clips.values())
+            if self.clip_cache is not None:
+                _abandoned_clips.append(self.clip_cache)
+            self._clips = OrderedDict()
+            self.clip_cache = None
+            self._pid = os.getpid()
+
+    def get(self, clip_path, open_clip: Callable[..., _OpenClip]) -> _OpenClip:
+        self._abandon_if_forked()
+        if clip_path in self._clips:
+            self._clips.move_to_end(clip_path)
+            return self._clips[clip_path]
+        while len(self._clips) >= self.max_open_clips:
+            _, evicted = self._clips.popitem(last=False)
+            evicted.close()
+        clip = open_clip(clip_path, self._get_clip_cache())
+        self._clips[clip_path] = clip
+        return clip
+
+    def _get_clip_cache(self) -> Optional[ClipCache]:
+        if self.clip_cache_size is None:
+            return None
+        if self.clip_cache is None:
+            self.clip_cache = ClipCache(self.clip_cache_size, self.processing_device)
+        return self.clip_cache
+
+    def close(self):
+        self._abandon_if_forked()
+        for clip in self._clips.values():
+            clip.close()
+        self._clips.clear()
+        self.clip_cache = None
+
+    def copy_empty(self) -> '_ClipPool':
+        """Create a pool with the same settings, but without any open clips."""
+        return _ClipPool(self.max_open_clips, self.processing_device, self.clip_cache_size)
+
+
+class _ClipDatasetBase:
+    def __init__(
+        self,
+        clip_paths: Sequence[str],
+        pixel_format: PixelFormat = PixelFormat.RGB_F32_Planar,
+        resolution_scale: ResolutionScale = ResolutionScale.Full,
+        processing_device='cpu',
+        max_running_tasks: int = 3,
+        frame_counts: Optional[Sequence[int]] = None,
+        transform: Optional[Callable] = None,
+        max_open_clips: int = 1,
+        clip_cache_size: Optional[int] = None,
+        frame_cache_dir: Optional[str] = None,
+        **postprocess_kwargs,
+    ):
+        self.clip_paths = [os.fspath(clip_path) for clip_path in clip_paths]
+        if frame_counts is None:
+            frame_counts = count_frames(self.clip_paths)
+        if len(frame_counts) != len(self.clip_paths):
+            raise ValueError('There must be exactly one frame count for each clip')
+        self.frame_counts = list(frame_counts)
+        self._clip_offsets = [0, *accumulate(self.frame_counts)]
+        self.pixel_format = pixel_format
+        self.resolution_scale = resolution_scale
+        self.processing_device = processing_device
+        self.max_running_tasks = max_running_tasks
+        self.transform = transform
+        self.postprocess_kwargs = postprocess_kwargs
+        self.frame_cache = None if frame_cache_dir is None else DiskFrameCache(frame_cache_dir)
+        self._clip_pool = _ClipPool(max_open_clips, processing_device, clip_cache_size)
+
+    def __getstate__(self):
+        # Open clips are specific to a process, so workers start with an empty pool.
+        state = self.__dict__.copy()
+        state['_clip_pool'] = self._clip_pool.copy_empty()
+        return state
+
+    def __len__(self):
+        return self._clip_offsets[-1]
+
+    def locate(self, index: int):
+        """Find the clip index and frame index of a sample."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Sample index out of range')
+        clip_index = bisect_right(self._clip_offsets, index) - 1
+        return clip_index, index - self._clip_offsets[clip_index]
+
+    def _open_clip(self, clip_path, clip_cache) -> _OpenClip:
+        return _OpenClip(clip_path, self.processing_device, self.pixel_format, self.max_running_tasks, clip_cache,
+                         self.frame_cache)
+
+    def _get_task_manager(self, clip_index):
+        return self._clip_pool.get(self.clip_paths[clip_index], self._open_clip).task_manager
+
+    def _enqueue(self, task_manager, frame_index):
+        return task_manager.enqueue_task(frame_index, resolution_scale=self.resolution_scale,
+                                         **self.postprocess_kwargs)
+
+    def _finish(self, image_tensor):
+        if self.transform is not None:
+            return self.transform(image_tensor)
+        return image_tensor
+
+    def close(self):
+        """Close all clips which were opened by this process."""
+        self._clip_pool.close()
+
+
+class ClipFrameDataset(_ClipDatasetBase, Dataset):
+    """A map-style dataset of the frames in a list of clips.
+
+    Every data loader worker lazily opens its own factory, codec, and decoding flow for the clips
+    that it reads from, so the dataset can be used with any multiprocessing start method.
+
+    Each sample is decoded when it is asked for, so a worker only has one frame in flight at a
+    time and `max_running_tasks` has little effect. For sequential reads with the decoder kept
+    busy, use `IterableClipFrameDataset`. With shuffled sampling, consecutive samples rarely come
+    from the same clip, so a clip is reopened for most samples unless `max_open_clips` covers the
+    clips being read or `clip_cache_size` is given.
+
+    Args:
+        clip_paths: Paths to the `.braw` clips.
+        pixel_format: The pixel format of the output images.
+        resolution_scale: The scale at which to decode frames.
+        processing_device: The device to use for decoding and processing frames.
+        max_running_tasks: The maximum number of frames in flight for each open clip.
+        frame_counts: The number of frames in each clip. If not specified, each clip will be
+            opened briefly to count its frames.
+        transform: A function which is applied to each frame image tensor.
+        max_open_clips: The maximum number of clips that each worker keeps open.
+        clip_cache_size: If specified, each worker opens clips through a `ClipCache` of this
+            size, which shares one codec between all clips. This makes switching between many
+            clips much faster, but requires `max_open_clips` to be 1.
+        frame_cache_dir: If specified, processed frames are cached in this directory with a
+            `DiskFrameCache`, so that later epochs read them from disk instead of decoding them.
+        **postprocess_kwargs: Keyword arguments which will be passed to
+            `BufferManager.postprocess`.
+    """
+    def __getitem__(self, index):
+        clip_index, frame_index = self.locate(index)
+        task_manager = self._get_task_manager(clip_index)
+        return self._finish(self._enqueue(task_manager, frame_index).consume())
+
+
+class IterableClipFrameDataset(_ClipDatasetBase, IterableDataset):
+    """An iterable dataset of the frames in a list of clips.
+
+    The frames are split into contiguous shards, one for each data loader worker. Each worker
+    lazily opens its own factory, codec, and decoding flow, and keeps the decoder busy by
+    enqueuing up to `prefetch` frames ahead of the frame being returned.
+
+    See `ClipFrameDataset` for a description of the other arguments.
+
+    Args:
+        prefetch: The number of frames to enqueue ahead. Defaults to twice `max_running_tasks`.
+    """
+    def __init__(self, clip_paths: Sequence[str], *args, prefetch: Optional[int] = None, **kwargs):
+        super().__init__(clip_paths, *args, **kwargs)
+        if prefetch is None:
+            prefetch = 2 * self.max_running_tasks
+        if prefetch < 1:
+            raise ValueError('prefetch must be at least 1')
+        self.prefetch = prefetch
+
+    def _shard(self):
+        worker_info = get_worker_info()
+        if worker_info is None:
+            return 0, len(self)
+        start = len(self) * worker_info.id // worker_info.num_workers
+        end = len(self) * (worker_info.id + 1) // worker_info.num_workers
+        return start, end
+
+    def __iter__(self):
+        start, end = self._shard()
+        index = start
+        while index < end:
+            clip_index, first_frame = self.locate(index)
+            last_frame = min(self.frame_counts[clip_index], first_frame + end - index)
+            task_manager = self._get_task_manager(clip_index)
+            tasks = deque()
+            try:
+                for frame_index in range(first_frame, last_frame):
+                    tasks.append(self._enqueue(task_manager, frame_index))
+                    if len(tasks) >= self.prefetch:
+                        yield self._finish(tasks.popleft().consume())
+                while len(tasks) > 0:
+                    yield self._finish(tasks.popleft().consume())
+            finally:
+                # Tasks hold on to their buffers until they are consumed, so make sure that an
+                # abandoned iterator doesn't leave the clip unusable. Frames which haven't started
+                # yet are dropped rather than decoded for nothing.
+                for task in tasks:
+                    if task_manager.cancel_queued(task):
+                        continue
+                    try:
+                        task.consume()
+                    except Exception:
+                        pass
+            index += last_frame - first_frame
@@ -0,0 +1,276 @@
+import fcntl
+import hashlib
+import json
+import os
+import uuid
+from threading import Lock
+from typing import Hashable, Optional
+
+import numpy as np
+import torch
+
+from pybraw import _pybraw, verify, PixelFormat, ResolutionScale
+from pybraw.torch.frame_cache import clip_file_identity, processing_attributes_hash
+
+
+_FORMAT_VERSION = 2
+
+
+def _read_json(path) -> Optional[dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class _ClipFrames:
+    """The cached frames of one clip at one resolution scale and pixel format.
+
+    The frames are stored in fixed-size slots of a data file, where the slot of a frame is its
+    frame index. The header records what the frames were decoded from, and the index is an
+    append-only list of the frames which have been written.
+
+    Each version of the data and index files has a unique generation in its file names, and the
+    header names the current generation. New files are created while holding a lock file, and are
+    only published by atomically replacing the header. Files are never truncated, so other
+    processes which are still reading an older generation are not disturbed.
+    """
+    def __init__(self, base_path: str, header: dict):
+        self.base_path = base_path
+        self.header_path = base_path + '.json'
+        self.lock_path = base_path + '.lock'
+        # The part of the header which identifies what the frames were decoded from.
+        self._identity = dict(header)
+        self.header = dict(header)
+        self._reset()
+        self.refresh()
+
+    def _reset(self):
+        self.frames = set()
+        self._index_pos = 0
+
+    def _generation_path(self, generation: str, suffix: str) -> str:
+        return f'{self.base_path}.{generation}{suffix}'
+
+    @property
+    def data_path(self) -> str:
+        return self._generation_path(self.header['generation'], '.frames')
+
+    @property
+    def index_path(self) -> str:
+        return self._generation_path(self.header['generation'], '.idx')
+
+    @property
+    def frame_nbytes(self) -> int:
+        return int(np.prod(self.header['shape'])) * np.dtype(self.header['dtype']).itemsize
+
+    def _load_header(self):
+        header = _read_json(self.header_path)
+        if header is None or {k: header.get(k) for k in self._identity} != self._identity:
+            # Nothing has been cached yet, or the clip, its sidecar, or its processing attributes
+            # have changed since the frames were cached.
+            return
+        if header.get('generation') != self.header.get('generation'):
+            self.header = header
+            self._reset()
+
+    def _forget_generation(self):
+        self.header = dict(self._identity)
+        self._reset()
+
+    def refresh(self):
+        """Pick up frames which have been written since the index was last read."""
+        if 'generation' not in self.header:
+            # Another process may have created the files since we last looked.
+            self._load_header()
+            if 'generation' not in self.header:
+                return
+        try:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_pos)
+                data = f.read()
+        except FileNotFoundError:
+            # The files have been replaced by a newer generation.
+            self._forget_generation()
+            return
+        # Only complete lines are used, because another process may be in the middle of a write.
+        end = data.rfind(b'\n') + 1
+        self._index_pos += end
+        self.frames.update(int(line) for line in data[:end].split())
+
+    def _create(self, shape, dtype: np.dtype):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have created the files while we were waiting for the lock.
+            self._load_header()
+            if 'generation' in self.header:
+                return
+            old_header = _read_json(self.header_path)
+            header = dict(self._identity, shape=list(shape), dtype=dtype.name, generation=uuid.uuid4().hex)
+            with open(self._generation_path(header['generation'], '.idx'), 'x'):
+                pass
+            # The data file is sparse, so slots which haven't been written don't take up disk space.
+            with open(self._generation_path(header['generation'], '.frames'), 'xb') as f:
+                f.truncate(header['frame_count'] * int(np.prod(shape)) * dtype.itemsize)
+            # The header is written last, because other processes only use the files once it names
+            # them.
+            tmp_path = f'{self.header_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(header, f)
+            os.replace(tmp_path, self.header_path)
+            self.header = header
+            self._reset()
+            # Files of an earlier version of the clip can be removed, since removing a file doesn't
+            # affect processes which still have it open or mapped.
+            if old_header is not None and 'generation' in old_header:
+                for suffix in ['.idx', '.frames']:
+                    try:
+                        os.remove(self._generation_path(old_header['generation'], suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def read(self, frame_index: int) -> torch.Tensor:
+        # Copy-on-write mappings are writable, so the tensor can be used like any other. Changes to
+        # it are never written back to the file.
+        array = np.memmap(self.data_path, dtype=self.header['dtype'], mode='c',
+                          offset=frame_index * self.frame_nbytes, shape=tuple(self.header['shape']))
+        return torch.from_numpy(array)
+
+    def write(self, frame_index: int, image_tensor: torch.Tensor):
+        array = image_tensor.detach().cpu().contiguous().numpy()
+        if 'generation' not in self.header:
+            self.refresh()
+        if 'generation' not in self.header:
+            self._create(array.shape, array.dtype)
+        if list(array.shape) != self.header['shape'] or array.dtype.name != self.header['dtype']:
+            raise ValueError('All frames of a clip must have the same shape and data type')
+        try:
+            fd = os.open(self.data_path, os.O_WRONLY)
+        except FileNotFoundError:
+            # The files have been replaced by a newer generation, so the frame is not cached.
+            self._forget_generation()
+            return
+        try:
+            os.pwrite(fd, array.tobytes(), frame_index * self.frame_nbytes)
+        finally:
+            os.close(fd)
+        # The frame is only added to the index once its data is in the file. The index is not
+        # created if it is missing, because that means that a newer generation has replaced it.
+        try:
+            fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            self._forget_generation()
+            return
+        try:
+            os.write(fd, f'{frame_index}\n'.encode())
+        finally:
+            os.close(fd)
+        self.frames.add(frame_index)
+
+
+class DiskFrameCache:
+    """A persistent cache of processed full frames, stored in memory-mapped files.
+
+    Each clip has a data file for every resolution scale and pixel format that it is read at. The
+    slot for a frame in that file is its frame index. Reading a frame from the cache maps its slot
+    of the file into memory without copying it. The cached frames of a clip are discarded when the
+    clip, its sidecar, or its clip processing attributes change.
+
+    A disk frame cache can be used anywhere a `FrameCache` can, for example
+    `reader.run_flow(..., frame_cache=DiskFrameCache(cache_dir))`. Frames read from a disk frame
+    cache are on the CPU.
+
+    Args:
+        cache_dir: The directory to store the cache files in. It is created if necessary.
+    """
+    # Every `get` maps the frame anew, so the returned tensors aren't shared with anyone else.
+    shares_frames = False
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.fspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = Lock()
+        self._clips = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # Only the location of the cache is sent to other processes, which read the files anew.
+        return {'cache_dir': self.cache_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['cache_dir'])
+
+    @staticmethod
+    def clip_key(clip_path, clip: _pybraw.IBlackmagicRawClip) -> Hashable:
+        """Create the part of a cache key which identifies a clip and how it is processed."""
+        return clip_file_identity(clip_path), processing_attributes_hash(clip), verify(clip.GetFrameCount())
+
+    def _get_clip_frames(self, clip_key, resolution_scale, pixel_format) -> _ClipFrames:
+        clip_frames = self._clips.get((clip_key, resolution_scale, pixel_format))
+        if clip_frames is not None:
+            return clip_frames
+        (clip_path, clip_mtime_ns, sidecar_mtime_ns), attributes_hash, frame_count = clip_key
+        header = {
+            'version': _FORMAT_VERSION,
+            'clip_path': clip_path,
+            'clip_mtime_ns': clip_mtime_ns,
+            'sidecar_mtime_ns': sidecar_mtime_ns,
+            'processing_attributes_hash': attributes_hash,
+            'frame_count': frame_count,
+            'resolution_scale': ResolutionScale(resolution_scale).name,
+            'pixel_format': PixelFormat(pixel_format).name,
+        }
+        # Different versions of the same clip share files, so stale frames are replaced rather
+        # than left behind.
+        name = hashlib.sha1(f'{clip_path}|{header["resolution_scale"]}|{header["pixel_format"]}'.encode()).hexdigest()
+        base_path = os.path.join(self.cache_dir, f'{os.path.basename(clip_path)}-{name[:16]}')
+        clip_frames = _ClipFrames(base_path, header)
+        self._clips[(clip_key, resolution_scale, pixel_format)] = clip_frames
+        return clip_frames
+
+    def get(self, key) -> Optional[torch.Tensor]:
+        """Get a cached frame, or `None` if it is not in the cache."""
+        clip_key, frame_index, resolution_scale, pixel_format = key
+        with self._lock:
+            clip_frames = self._get_clip_frames(clip_key, resolution_scale, pixel_format)
+            if frame_index not in clip_frames.frames:
+                # The frame may have been cached by another process.
+                clip_frames.refresh()
+            if frame_index not in clip_frames.frames:
+                self.misses += 1
+                return None
+            try:
+                image_tensor = clip_frames.read(frame_index)
+            except FileNotFoundError:
+                # The files have been replaced by a newer generation, so the frame is not cached.
+                clip_frames._forget_generation()
+                self.misses += 1
+                return None
+            self.hits += 1
+            return image_tensor
+
+    def put(self, key, image_tensor: torch.Tensor):
+        """Write a frame to the cache."""
+        clip_key, frame_index, resolution_scale, pixel_format = key
+        with self._lock:
+            clip_frames = self._get_clip_frames(clip_key, resolution_scale, pixel_format)
+            if not 0 <= frame_index < clip_frames.header['frame_count']:
+                raise IndexError('Frame index out of range')
+            if frame_index not in clip_frames.frames:
+                clip_frames.write(frame_index, image_tensor)
+
+    @property
+    def nbytes(self) -> int:
+        """The total size of the frames which this process knows to be cached."""
+        with self._lock:
+            return sum(len(clip_frames.frames) * clip_frames.frame_nbytes
+                       for clip_frames in self._clips.values() if 'generation' in clip_frames.header)
+
+    def hit_rate(self) -> float:
+        """The fraction of `get` calls which found the frame in the cache."""
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
@@ -1,25 +1,217 @@
+from contextlib import nullcontext
+from math import ceil
 from dataclasses import dataclass
-from typing import List
+from threading import Lock
+from typing import Callable, Hashable, List, Optional, Sequence
+
+import numpy as np
+import torch
 
 from pybraw import _pybraw, verify, ResultCode, ResolutionScale, PixelFormat
 from pybraw.logger import log
 from pybraw.task_manager import Task, TaskManager
-from pybraw.torch.buffer_manager import BufferManager
+from pybraw.torch.buffer_manager import BufferManager, OutputBufferRing, processed_image_to_tensor, transform_image
+from pybraw.torch.bit_stream_cache import BitStreamCache, CachedBitStream
+from pybraw.torch.frame_cache import FrameCache
+
+
+def select_resolution_scale(
+    clip_resolutions: _pybraw.IBlackmagicRawClipResolutions,
+    crop: Optional[Sequence[int]] = None,
+    out_size: Optional[Sequence[int]] = None,
+    flipped: bool = False,
+) -> ResolutionScale:
+    """Choose the smallest resolution scale which still decodes enough pixels for the output.
+
+    Args:
+        clip_resolutions: The resolutions that the clip can be decoded at.
+        crop: The region of the full frame which will be cropped (x, y, width, height).
+        out_size: The output image size (width, height). If not specified, the crop region (or
+            the whole frame) is output at full resolution.
+        flipped: Whether to choose one of the flipped resolution scales.
+    """
+    resolution_count = verify(clip_resolutions.GetResolutionCount())
+    full_width, full_height = max(verify(clip_resolutions.GetResolution(i)) for i in range(resolution_count))
+    in_width, in_height = (full_width, full_height) if crop is None else crop[2:]
+    out_width, out_height = (in_width, in_height) if out_size is None else out_size
+    # The size that the whole frame must be decoded at for the crop region to cover the output.
+    needed_width = min(ceil(full_width * out_width / in_width), full_width)
+    needed_height = min(ceil(full_height * out_height / in_height), full_height)
+    resolution_scale = ResolutionScale(verify(clip_resolutions.GetClosestScaleForResolution(
+        needed_width, needed_height, flipped)))
+    # The closest scale can be smaller than the size asked for, in which case we step back up.
+    factor = resolution_scale.factor()
+    while factor > 1 and (full_width / factor < needed_width or full_height / factor < needed_height):
+        factor //= 2
+    return ResolutionScale.from_factor(factor, flipped)
 
 
 class ReadTask(Task):
-    def __init__(self, task_manager, frame_index: int, pixel_format: PixelFormat, resolution_scale: ResolutionScale, postprocess_kwargs: dict):
-        super().__init__(task_manager)
+    def __init__(self, task_manager, frame_index: int, pixel_format: PixelFormat, resolution_scale: ResolutionScale, postprocess_kwargs: dict,
+                 priority=0, deadline=None):
+        super().__init__(task_manager, priority=priority, deadline=deadline)
         self.frame_index = frame_index
         self.pixel_format = pixel_format
         self.resolution_scale = resolution_scale
         self.postprocess_kwargs = postprocess_kwargs
+        # The frame cache key, if the processed full frame should be added to a frame cache.
+        self.cache_key = None
+        # The bit stream cache key, if the bit stream should be added to a bit stream cache.
+        self.bit_stream_key = None
+
+    def _output_target(self) -> Optional[torch.Tensor]:
+        """Get a tensor which the frame should be processed straight into, if any."""
+        return None
+
+    def _finish_processed(self, buffer_manager: BufferManager, processed_image: _pybraw.IBlackmagicRawProcessedImage):
+        """Complete the task with an image which was processed into a buffer manager."""
+        if self.cache_key is not None:
+            self._finish_full_frame(buffer_manager.postprocess(processed_image, self.resolution_scale))
+            return
+        self.resolve(buffer_manager.postprocess(processed_image, self.resolution_scale, **self.postprocess_kwargs))
+
+    def _finish_full_frame(self, image_tensor: torch.Tensor):
+        """Complete the task with a processed full frame which it owns, adding it to the frame cache."""
+        self.task_manager.frame_cache.put(self.cache_key, image_tensor)
+        self.resolve(_postprocess_cached(image_tensor, self.pixel_format, self.resolution_scale, self.postprocess_kwargs,
+                                         self.task_manager.frame_cache.shares_frames))
+
+    def _finish_image(self, image_tensor: torch.Tensor, borrowed: bool):
+        """Complete the task with a post-processed image.
+
+        Args:
+            image_tensor: The post-processed image.
+            borrowed: Whether the image views memory which will be reused for other frames.
+        """
+        if borrowed:
+            image_tensor = image_tensor.clone()
+        self.resolve(image_tensor)
+
+
+def _postprocess_cached(image_tensor: torch.Tensor, pixel_format, resolution_scale, postprocess_kwargs, shared=True):
+    result = transform_image(image_tensor, pixel_format, resolution_scale, **postprocess_kwargs)
+    # Shared cached frames must not be modified, so the caller must not get a view of one.
+    if shared and result.storage().data_ptr() == image_tensor.storage().data_ptr():
+        result = result.clone()
+    return result
+
+
+class BatchReadTask(Task):
+    """A task which reads several frames into a single stacked tensor.
+
+    The result is a tensor of shape `(N, C, H, W)` for planar pixel formats or `(N, H, W, C)` for
+    packed pixel formats, where `N` is the number of frames in the batch. Each frame is written
+    into its slice of the result as soon as it has been processed, so the frames never need to be
+    stacked.
+    """
+    def __init__(
+        self,
+        task_manager,
+        frame_indices: Sequence[int],
+        pixel_format: PixelFormat,
+        resolution_scale: ResolutionScale,
+        out_device: Optional[torch.device],
+        postprocess_kwargs: dict,
+        priority=0,
+        deadline=None,
+    ):
+        super().__init__(task_manager, priority=priority, deadline=deadline)
+        self.frame_indices = list(frame_indices)
+        self.pixel_format = pixel_format
+        self.resolution_scale = resolution_scale
+        self.out_device = out_device
+        self.postprocess_kwargs = {k: v for k, v in postprocess_kwargs.items() if v is not None}
+        self._lock = Lock()
+        self._output = None
+        self._remaining = len(self.frame_indices)
+        self._failed = False
+        self._frame_tasks = []
+
+    def _direct_output(self, batch_index: int) -> Optional[torch.Tensor]:
+        # Frames can only be processed straight into the result when no post-processing is needed.
+        # The result is allocated when the first frame arrives, so earlier frames are copied.
+        if self._output is None or self.postprocess_kwargs:
+            return None
+        return self._output[batch_index]
+
+    def _store(self, batch_index: int, image_tensor: Optional[torch.Tensor]):
+        """Record that a frame has been written into the result.
+
+        Args:
+            batch_index: The position of the frame within the batch.
+            image_tensor: The post-processed frame image, which will be copied into the result. If
+                `None`, the frame has already been processed straight into the result.
+        """
+        with self._lock:
+            if self._failed:
+                return
+            if image_tensor is not None:
+                if self._output is None:
+                    device = self.out_device if self.out_device is not None else image_tensor.device
+                    self._output = torch.empty((len(self.frame_indices), *image_tensor.shape),
+                                               dtype=image_tensor.dtype, device=device)
+                self._output[batch_index].copy_(image_tensor)
+            self._remaining -= 1
+            if self._remaining > 0:
+                return
+            output = self._output
+        self.resolve(output)
+
+    def _on_frame_done(self, frame_task: '_BatchFrameTask', is_success: bool):
+        if not is_success:
+            with self._lock:
+                fail = not self._failed and self._remaining > 0
+                self._failed = True
+            if fail:
+                if frame_task.is_cancelled():
+                    self.cancel()
+                else:
+                    self.reject(frame_task._future.exception())
+                # The other frames of a failed batch are not needed, so don't start any more of them.
+                for other_task in list(self._frame_tasks):
+                    if other_task is not frame_task and not other_task.is_done():
+                        self.task_manager.cancel_queued(other_task)
+        # Frame tasks are internal, so we consume them here to free up their buffers.
+        try:
+            frame_task.consume()
+        except Exception:
+            pass
+
+
+class _BatchFrameTask(ReadTask):
+    internal = True
+
+    def __init__(self, batch: BatchReadTask, batch_index: int, frame_index: int):
+        super().__init__(batch.task_manager, frame_index, batch.pixel_format, batch.resolution_scale,
+                         batch.postprocess_kwargs, priority=batch.priority, deadline=batch.deadline)
+        self.batch = batch
+        self.batch_index = batch_index
+        self._target = None
+
+    def _output_target(self):
+        self._target = self.batch._direct_output(self.batch_index)
+        return self._target
+
+    def _finish_processed(self, buffer_manager, processed_image):
+        target = self._target
+        self._target = None
+        if target is not None and target.data_ptr() == int(verify(processed_image.GetResource())):
+            self.batch._store(self.batch_index, None)
+        else:
+            self.batch._store(self.batch_index, buffer_manager.view_output(processed_image, self.resolution_scale, **self.postprocess_kwargs))
+        self.resolve(None)
+
+    def _finish_image(self, image_tensor, borrowed):
+        self.batch._store(self.batch_index, image_tensor)
+        self.resolve(None)
 
 
 @dataclass(frozen=True)
 class UserData:
     buffer_manager: BufferManager
     task: ReadTask
+    # The path of the clip that the job reads from, for flows which read from several clips.
+    clip_path: Optional[str] = None
 
 
 class ReadTaskManager(TaskManager):
@@ -28,9 +220,37 @@ class ReadTaskManager(TaskManager):
         buffer_manager_pool: List[BufferManager],
         clip_ex: _pybraw.IBlackmagicRawClipEx,
         pixel_format: PixelFormat,
+        output_ring: Optional[OutputBufferRing] = None,
+        frame_cache: Optional[FrameCache] = None,
+        clip_key_fn: Optional[Callable[[], Hashable]] = None,
+        bit_stream_cache: Optional[BitStreamCache] = None,
+        bit_stream_clip_key=None,
+        clip_processing_attributes: Optional[_pybraw.IBlackmagicRawClipProcessingAttributes] = None,
+        bit_stream_sizes: Optional[np.ndarray] = None,
+        clip_resolutions: Optional[_pybraw.IBlackmagicRawClipResolutions] = None,
     ):
         super().__init__(len(buffer_manager_pool))
+        if frame_cache is not None and clip_key_fn is None:
+            raise ValueError('clip_key_fn is required when using a frame cache')
+        if bit_stream_cache is not None and bit_stream_clip_key is None:
+            raise ValueError('bit_stream_clip_key is required when using a bit stream cache')
         self.pixel_format = pixel_format
+        self.output_ring = output_ring
+        self.frame_cache = frame_cache
+        # The clip part of a frame cache key depends on the clip processing attributes, which may
+        # change during the flow, so it is worked out anew for every task.
+        self.clip_key_fn = clip_key_fn
+        self.bit_stream_cache = bit_stream_cache
+        self.bit_stream_clip_key = bit_stream_clip_key
+        # Frames from the bit stream cache were read before any later changes to the clip
+        # processing attributes, so these are passed along to pick up the current attributes.
+        self.clip_processing_attributes = clip_processing_attributes
+        # The bit stream size of every frame, so that they don't have to be looked up one by one.
+        self.bit_stream_sizes = bit_stream_sizes
+        # The resolutions of the clip, for choosing resolution scales automatically.
+        self.clip_resolutions = clip_resolutions
+        # Tasks which were served from the frame cache, so never held a buffer manager.
+        self._cache_hits = set()
         self._clip_ex = clip_ex
         self._available_buffer_managers = list(buffer_manager_pool)
         self._unavailable_buffer_managers = {}
@@ -38,7 +258,23 @@ class ReadTaskManager(TaskManager):
     def _on_task_started(self, task):
         buffer_manager = self._available_buffer_managers.pop()
         self._unavailable_buffer_managers[task] = buffer_manager
-        read_job = buffer_manager.create_read_job(self._clip_ex, task.frame_index)
+        self._submit_task(buffer_manager, task)
+
+    def _submit_task(self, buffer_manager, task):
+        if self.bit_stream_cache is not None:
+            task.bit_stream_key = (self.bit_stream_clip_key, task.frame_index)
+            cached = self.bit_stream_cache.get(task.bit_stream_key)
+            if cached is not None:
+                # Skip the read job, and go straight to decoding the cached bit stream.
+                task.bit_stream_key = None
+                buffer_manager.use_bit_stream(cached.bit_stream)
+                _submit_decode_job(UserData(buffer_manager, task), cached.frame, cached.lock,
+                                   self.clip_processing_attributes)
+                return
+        bit_stream_size_bytes = None
+        if self.bit_stream_sizes is not None:
+            bit_stream_size_bytes = int(self.bit_stream_sizes[task.frame_index])
+        read_job = buffer_manager.create_read_job(self._clip_ex, task.frame_index, bit_stream_size_bytes)
         verify(read_job.SetUserData(UserData(buffer_manager, task)))
         verify(read_job.Submit())
         read_job.Release()
@@ -50,22 +286,143 @@ class ReadTaskManager(TaskManager):
         self._cur_running_tasks -= 1
         self._try_start_task()
 
-    def enqueue_task(self, frame_index, *, resolution_scale=ResolutionScale.Full, **postprocess_kwargs) -> ReadTask:
+    def _end_task(self, task):
+        if isinstance(task, BatchReadTask):
+            # Batch tasks do not hold buffers themselves, their frame tasks do.
+            with self._lock:
+                self._running_tasks.pop(task, None)
+            return
+        with self._lock:
+            if task in self._cache_hits:
+                self._cache_hits.remove(task)
+                del self._running_tasks[task]
+                return
+        super()._end_task(task)
+
+    def cancel_queued(self, task) -> bool:
+        if isinstance(task, BatchReadTask):
+            # A batch is cancelled as soon as any of its frames is.
+            cancel_frame = super().cancel_queued
+            with self._lock:
+                return any([cancel_frame(frame_task) for frame_task in task._frame_tasks])
+        return super().cancel_queued(task)
+
+    def _resolve_resolution_scale(self, resolution_scale, postprocess_kwargs, clip_resolutions=None) -> ResolutionScale:
+        if resolution_scale != 'auto':
+            return ResolutionScale(resolution_scale)
+        if clip_resolutions is None:
+            clip_resolutions = self.clip_resolutions
+        if clip_resolutions is None:
+            raise ValueError('Automatic resolution scales need the resolutions of the clip')
+        return select_resolution_scale(clip_resolutions, postprocess_kwargs.get('crop'),
+                                       postprocess_kwargs.get('out_size'))
+
+    def enqueue_task(self, frame_index, *, resolution_scale=ResolutionScale.Full, priority=0, deadline=None,
+                     **postprocess_kwargs) -> ReadTask:
         """Add a new task to the processing queue.
 
         Args:
             frame_index: The index of the frame to read, decode, and process.
-            resolution_scale: The scale at which to decode the frame.
+            resolution_scale: The scale at which to decode the frame. If `'auto'`, the smallest
+                scale which still covers the `crop` region at `out_size` is used.
+            priority: Queued tasks with a higher priority are started first.
+            deadline: A `time.monotonic()` timestamp after which the task is cancelled if it still
+                hasn't been started.
             **postprocess_kwargs: Keyword arguments which will be passed to
                 `BufferManager.postprocess`.
 
         Returns:
             The newly created and enqueued task.
         """
-        task = ReadTask(self, frame_index, self.pixel_format, resolution_scale, postprocess_kwargs)
+        resolution_scale = self._resolve_resolution_scale(resolution_scale, postprocess_kwargs)
+        task = ReadTask(self, frame_index, self.pixel_format, resolution_scale, postprocess_kwargs,
+                        priority=priority, deadline=deadline)
+        if self.frame_cache is not None:
+            task.cache_key = (self.clip_key_fn(), frame_index, resolution_scale, self.pixel_format)
+            image_tensor = self.frame_cache.get(task.cache_key)
+            if image_tensor is not None:
+                self._resolve_cache_hit(task, image_tensor)
+                return task
         super().enqueue(task)
         return task
 
+    def _resolve_cache_hit(self, task: ReadTask, image_tensor: torch.Tensor):
+        # The task never enters the queue, but it is tracked like a running task until it is
+        # consumed.
+        with self._lock:
+            self._running_tasks[task] = None
+            self._cache_hits.add(task)
+            self._completed_task_iterator._register_task(task)
+        try:
+            image_tensor = _postprocess_cached(image_tensor, task.pixel_format, task.resolution_scale,
+                                               task.postprocess_kwargs, self.frame_cache.shares_frames)
+        except Exception as e:
+            task.reject(e)
+            return
+        task.resolve(image_tensor)
+
+    def enqueue_batch(self, frame_indices, *, resolution_scale=ResolutionScale.Full, out_device=None, priority=0,
+                      deadline=None, **postprocess_kwargs) -> BatchReadTask:
+        """Add a batch of frames to the processing queue.
+
+        All frames in the batch must produce images of the same shape. The result of the returned
+        task is a single tensor containing every frame in the order given by `frame_indices`.
+
+        Args:
+            frame_indices: The indices of the frames to read, decode, and process.
+            resolution_scale: The scale at which to decode the frames, or `'auto'` (see
+                `enqueue_task`).
+            out_device: The result will be stored in this device's memory. If not specified, the
+                result will be kept on the processing device.
+            priority: The priority of every frame in the batch.
+            deadline: A `time.monotonic()` timestamp. If any frame of the batch still hasn't been
+                started at this time, the batch is cancelled.
+            **postprocess_kwargs: Keyword arguments which will be passed to
+                `BufferManager.postprocess`.
+
+        Returns:
+            The newly created and enqueued batch task.
+        """
+        if len(frame_indices) == 0:
+            raise ValueError('frame_indices must not be empty')
+        resolution_scale = self._resolve_resolution_scale(resolution_scale, postprocess_kwargs)
+        batch = BatchReadTask(self, frame_indices, self.pixel_format, resolution_scale, out_device, postprocess_kwargs,
+                              priority=priority, deadline=deadline)
+        self._enqueue_batch(batch)
+        return batch
+
+    def _create_batch_frame_task(self, batch: BatchReadTask, batch_index: int, frame_index: int) -> '_BatchFrameTask':
+        return _BatchFrameTask(batch, batch_index, frame_index)
+
+    def _enqueue_batch(self, batch: BatchReadTask):
+        with self._lock:
+            self._running_tasks[batch] = None
+            self._completed_task_iterator._register_task(batch)
+            for batch_index, frame_index in enumerate(batch.frame_indices):
+                if batch._failed:
+                    # An earlier frame failed as soon as it was enqueued.
+                    break
+                frame_task = self._create_batch_frame_task(batch, batch_index, frame_index)
+                frame_task.on_done(batch._on_frame_done)
+                batch._frame_tasks.append(frame_task)
+                super().enqueue(frame_task)
+
+
+def _submit_decode_job(user_data: UserData, frame: _pybraw.IBlackmagicRawFrame, frame_lock: Optional[Lock] = None,
+                       clip_processing_attributes=None):
+    """Submit a job which decodes the bit stream in the buffer manager of a task."""
+    task = user_data.task
+    buffer_manager = user_data.buffer_manager
+    with frame_lock or nullcontext():
+        verify(frame.SetResolutionScale(task.resolution_scale))
+        verify(frame.SetResourceFormat(task.pixel_format))
+        buffer_manager.populate_frame_state_buffer(frame, clip_processing_attributes)
+
+    decode_job = buffer_manager.create_decode_job()
+    verify(decode_job.SetUserData(user_data))
+    verify(decode_job.Submit())
+    decode_job.Release()
+
 
 class ManualFlowCallback(_pybraw.BlackmagicRawCallback):
     """Callbacks for the PyTorch manual decoding flows.
@@ -94,15 +451,13 @@ class ManualFlowCallback(_pybraw.BlackmagicRawCallback):
             task.reject(RuntimeError(f'Failed to read frame ({self._format_result(result)})'))
             return
 
-        verify(frame.SetResolutionScale(task.resolution_scale))
-        verify(frame.SetResourceFormat(task.pixel_format))
-        buffer_manager = user_data.buffer_manager
-        buffer_manager.populate_frame_state_buffer(frame)
+        frame_lock = None
+        if task.bit_stream_key is not None:
+            cached = CachedBitStream(frame, user_data.buffer_manager.copy_bit_stream())
+            task.task_manager.bit_stream_cache.put(task.bit_stream_key, cached)
+            frame_lock = cached.lock
 
-        decode_job = buffer_manager.create_decode_job()
-        verify(decode_job.SetUserData(user_data))
-        verify(decode_job.Submit())
-        decode_job.Release()
+        _submit_decode_job(user_data, frame, frame_lock)
 
     def DecodeComplete(self, decode_job, result):
         user_data: UserData = verify(decode_job.PopUserData())
@@ -119,7 +474,7 @@ class ManualFlowCallback(_pybraw.BlackmagicRawCallback):
             return
 
         buffer_manager = user_data.buffer_manager
-        process_job = buffer_manager.create_process_job()
+        process_job = buffer_manager.create_process_job(task._output_target())
         verify(process_job.SetUserData(user_data))
         verify(process_job.Submit())
         process_job.Release()
@@ -136,5 +491,55 @@ class ManualFlowCallback(_pybraw.BlackmagicRawCallback):
             log.debug(f'Processed frame index {task.frame_index}')
         else:
             task.reject(RuntimeError(f'Failed to process frame ({self._format_result(result)})'))
+            return
+
+        task._finish_processed(user_data.buffer_manager, processed_image)
+
+
+class NativeReadTaskManager(ReadTaskManager):
+    """A task manager which drives a native manual decoder flow 1 pipeline.
+
+    Instead of a pool of buffer managers, the tasks share the slots of the native pipeline. Reading,
+    decoding, and processing all happen inside the SDK's callback threads, and Python is only
+    entered once per frame to post-process the processed image.
+    """
+    def __init__(
+        self,
+        pipeline: _pybraw.ManualDecoderFlow1Pipeline,
+        clip_ex: _pybraw.IBlackmagicRawClipEx,
+        pixel_format: PixelFormat,
+        frame_cache: Optional[FrameCache] = None,
+        clip_key_fn: Optional[Callable[[], Hashable]] = None,
+        clip_resolutions: Optional[_pybraw.IBlackmagicRawClipResolutions] = None,
+    ):
+        super().__init__(list(range(pipeline.GetSlotCount())), clip_ex, pixel_format,
+                         frame_cache=frame_cache, clip_key_fn=clip_key_fn, clip_resolutions=clip_resolutions)
+        self._pipeline = pipeline
+
+    def _submit_task(self, slot_index, task):
+        verify(self._pipeline.Submit(slot_index, task.frame_index, task.resolution_scale, task.pixel_format, task))
+
+
+def native_flow_complete(task: ReadTask, result, processed_image):
+    """Completion handler for `NativeReadTaskManager` pipelines."""
+    if result == ResultCode.E_ABORT:
+        task.cancel()
+        return
+
+    if ResultCode.is_success(result):
+        log.debug(f'Processed frame index {task.frame_index}')
+    else:
+        task.reject(RuntimeError(f'Failed to process frame ({ResultCode.to_hex(result)} "{ResultCode.to_string(result)}")'))
+        return
 
-        task.resolve(user_data.buffer_manager.postprocess(processed_image, task.resolution_scale, **task.postprocess_kwargs))
+    image_tensor = processed_image_to_tensor(processed_image)
+    if task.cache_key is not None:
+        # The pipeline slot will be reused, so the cache needs its own copy of the frame.
+        task._finish_full_frame(image_tensor.clone())
+        return
+    buffer_ptr = image_tensor.data_ptr()
+    pixel_format = PixelFormat(verify(processed_image.GetResourceFormat()))
+    image_tensor = transform_image(image_tensor, pixel_format, task.resolution_scale, **task.postprocess_kwargs)
+    # The pipeline slot will be reused for another frame, so the task must not keep a view of its
+    # memory.
+    task._finish_image(image_tensor, image_tensor.storage().data_ptr() == buffer_ptr)
@@ -0,0 +1,169 @@
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+import torch
+
+from pybraw import _pybraw, verify, ResultCode
+
+
+def sidecar_path(clip_path) -> str:
+    """Get the path of the sidecar file which belongs to a clip."""
+    return os.path.splitext(os.fspath(clip_path))[0] + '.sidecar'
+
+
+def clip_file_identity(clip_path) -> Tuple[str, int, Optional[int]]:
+    """Identify the version of a clip on disk.
+
+    Returns:
+        The absolute path of the clip, and the modification times of the clip and of its sidecar
+        file (`None` if there is no sidecar file).
+    """
+    clip_path = os.path.abspath(os.fspath(clip_path))
+    try:
+        sidecar_mtime_ns = os.stat(sidecar_path(clip_path)).st_mtime_ns
+    except FileNotFoundError:
+        sidecar_mtime_ns = None
+    return clip_path, os.stat(clip_path).st_mtime_ns, sidecar_mtime_ns
+
+
+def processing_attributes_hash(clip: _pybraw.IBlackmagicRawClip) -> str:
+    """Hash the clip processing attributes which are currently set on a clip.
+
+    Attributes which can't be read for the clip are skipped. Frame processing attributes are not
+    included, because they come from the clip and sidecar files which `clip_file_identity` covers.
+    """
+    attributes = verify(clip.as_IBlackmagicRawClipProcessingAttributes())
+    digest = hashlib.sha1()
+    for attribute in _pybraw._BlackmagicRawClipProcessingAttribute.__members__.values():
+        result, value = attributes.GetClipAttribute(attribute)
+        if not ResultCode.is_success(result):
+            continue
+        try:
+            value = value.to_py()
+        except ValueError:
+            continue
+        if isinstance(value, np.ndarray):
+            value = value.tobytes()
+        else:
+            value = repr(value).encode()
+        digest.update(int(attribute).to_bytes(4, 'little'))
+        digest.update(len(value).to_bytes(8, 'little'))
+        digest.update(value)
+    return digest.hexdigest()
+
+
+class _SizeBoundedCache:
+    """A thread-safe least recently used cache, bounded by the total size of its values in bytes.
+
+    Subclasses define how the size of a value is measured.
+
+    Args:
+        max_bytes: The maximum total size of the cached values.
+    """
+    def __init__(self, max_bytes: int):
+        if max_bytes < 1:
+            raise ValueError('max_bytes must be at least 1')
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _nbytes(value) -> int:
+        raise NotImplementedError
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Get a cached value, or `None` if it is not in the cache."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Add a value to the cache, evicting least recently used values to make room for it.
+
+        Values which are bigger than the whole cache are not added.
+        """
+        size = self._nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old_value = self._entries.pop(key, None)
+            if old_value is not None:
+                self.nbytes -= self._nbytes(old_value)
+            self._entries[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= self._nbytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all values from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def hit_rate(self) -> float:
+        """The fraction of `get` calls which found the value in the cache."""
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+class FrameCache(_SizeBoundedCache):
+    """A least recently used cache of processed full frames, bounded by its size in bytes.
+
+    Entries are keyed by `(clip_key, frame_index, resolution_scale, pixel_format)`, where
+    `clip_key` identifies the clip file and its processing attributes (see `FrameCache.clip_key`).
+    Frames are stored before cropping and resizing, so a cached frame can serve requests for any
+    crop of it. The cache can be shared between readers and flows.
+
+    Args:
+        max_bytes: The maximum total size of the cached frames.
+    """
+    # Frames returned by `get` are shared by everyone who reads them from the cache.
+    shares_frames = True
+
+    @staticmethod
+    def clip_key(clip_path, clip: _pybraw.IBlackmagicRawClip) -> Hashable:
+        """Create the part of a cache key which identifies a clip and how it is processed."""
+        return clip_file_identity(clip_path), processing_attributes_hash(clip)
+
+    @staticmethod
+    def _nbytes(value) -> int:
+        return value.element_size() * value.nelement()
+
+    def get(self, key) -> Optional[torch.Tensor]:
+        """Get a cached frame, or `None` if it is not in the cache.
+
+        The returned tensor is shared by everyone who reads the frame, so it must not be modified.
+        """
+        return super().get(key)
+
+    def put(self, key, image_tensor: torch.Tensor):
+        """Add a frame to the cache, evicting least recently used frames to make room for it.
+
+        Frames which are bigger than the whole cache are not added.
+        """
+        super().put(key, image_tensor)
@@ -0,0 +1,102 @@
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+from pybraw.torch.flow import ReadTaskManager
+
+
+class ReadAhead:
+    """Read frames in order, keeping an adaptive number of frames enqueued ahead of the consumer.
+
+    The read-ahead window starts at `min_window`. It grows by one frame whenever the consumer has
+    to wait for the next frame. It shrinks by one frame when every frame in the window is already
+    finished by the time the consumer asks for the next one, because that means frames are
+    sitting unconsumed and holding on to buffers.
+
+    Iterating yields `(frame_index, image)` pairs. Frames which are still enqueued when the
+    iterator is closed are consumed and discarded.
+
+    Args:
+        task_manager: The task manager to enqueue frame reads on.
+        frame_indices: The indices of the frames to read, in the order that they will be returned.
+        min_window: The minimum number of frames to keep enqueued.
+        max_window: The maximum number of frames to keep enqueued. Defaults to twice the maximum
+            number of running tasks of the task manager.
+        task_kwargs: A function which returns keyword arguments for `enqueue_task` for a given
+            frame index, for reads which differ from frame to frame.
+        **enqueue_kwargs: Keyword arguments which will be passed to `enqueue_task` for every frame.
+    """
+    def __init__(
+        self,
+        task_manager: ReadTaskManager,
+        frame_indices: Iterable[int],
+        min_window: int = 1,
+        max_window: Optional[int] = None,
+        task_kwargs: Optional[Callable[[int], dict]] = None,
+        **enqueue_kwargs,
+    ):
+        if max_window is None:
+            max_window = 2 * task_manager.max_running_tasks
+        if min_window < 1:
+            raise ValueError('min_window must be at least 1')
+        if max_window < min_window:
+            raise ValueError('max_window must not be less than min_window')
+        self.task_manager = task_manager
+        self.min_window = min_window
+        self.max_window = max_window
+        self.window = min_window
+        # The number of times that the consumer had to wait for a frame.
+        self.wait_count = 0
+        self._frame_indices = iter(frame_indices)
+        self._task_kwargs = task_kwargs
+        self._enqueue_kwargs = enqueue_kwargs
+        self._pending = deque()
+        self._exhausted = False
+
+    def _fill(self):
+        while not self._exhausted and len(self._pending) < self.window:
+            frame_index = next(self._frame_indices, None)
+            if frame_index is None:
+                self._exhausted = True
+                break
+            kwargs = dict(self._enqueue_kwargs)
+            if self._task_kwargs is not None:
+                kwargs.update(self._task_kwargs(frame_index))
+            self._pending.append(self.task_manager.enqueue_task(frame_index, **kwargs))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._fill()
+        if len(self._pending) == 0:
+            raise StopIteration
+        task = self._pending.popleft()
+        if not task.is_done():
+            self.wait_count += 1
+            self.window = min(self.window + 1, self.max_window)
+        elif len(self._pending) > 0 and all(pending_task.is_done() for pending_task in self._pending):
+            self.window = max(self.window - 1, self.min_window)
+        image = task.consume()
+        # Top up the window straight away so that the decoder is busy while the caller works.
+        self._fill()
+        return task.frame_index, image
+
+    def close(self):
+        """Stop reading ahead, discarding any frames which have not been returned."""
+        self._exhausted = True
+        while len(self._pending) > 0:
+            task = self._pending.popleft()
+            # Frames which haven't started yet are dropped, the others have to be consumed to
+            # release their buffers.
+            if self.task_manager.cancel_queued(task):
+                continue
+            try:
+                task.consume()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,18 +1,22 @@
 import ctypes
 import os
 from contextlib import contextmanager
+from functools import partial
+from typing import Optional
 
+import numpy as np
 import torch
 
 from pybraw import _pybraw, verify
-from pybraw.torch.buffer_manager import BufferManagerFlow1, BufferManagerFlow2
+from pybraw.torch.buffer_manager import BufferManagerFlow1, BufferManagerFlow2, OutputBufferRing
 from pybraw.torch.cuda import get_current_cuda_context
-from pybraw.torch.flow import ReadTaskManager, ManualFlowCallback
+from pybraw.torch.flow import ReadTaskManager, ManualFlowCallback, NativeReadTaskManager, native_flow_complete
+from pybraw.torch.prefetch import ReadAhead
 
 
-class FrameImageReader:
-    def __init__(self, video_path, processing_device='cpu'):
-        self.video_path = os.fspath(video_path)
+class CodecPipeline:
+    """A codec which is configured to decode and process frames on a particular device."""
+    def __init__(self, processing_device='cpu'):
         self.processing_device = torch.device(processing_device)
 
         self.factory = _pybraw.CreateBlackmagicRawFactoryInstance()
@@ -42,11 +46,112 @@ class FrameImageReader:
             self.manual_decoder = verify(self.codec.as_IBlackmagicRawManualDecoderFlow2())
         else:
             self.context = None
+            self.stream = None
             self.command_queue = None
             self.manual_decoder = verify(self.codec.as_IBlackmagicRawManualDecoderFlow1())
 
         verify(configuration.SetPipeline(pipeline, self.context, self.command_queue))
-        self.clip = verify(self.codec.OpenClip(self.video_path))
+
+
+def load_post_3d_lut(clip: _pybraw.IBlackmagicRawClip, device) -> Optional[torch.ByteStorage]:
+    """Copy the post 3D LUT of a clip into a storage on the given device.
+
+    Returns:
+        The post 3D LUT data, or `None` if the clip does not have a post 3D LUT.
+    """
+    clip_processing_attributes = verify(clip.as_IBlackmagicRawClipProcessingAttributes())
+    clip_post_3d_lut = verify(clip_processing_attributes.GetPost3DLUT())
+    if clip_post_3d_lut is None:
+        return None
+    post_3d_lut_resource = verify(clip_post_3d_lut.GetResourceCPU())
+    lut_size_bytes = verify(clip_post_3d_lut.GetResourceSizeBytes())
+    post_3d_lut_buffer = torch.as_tensor(post_3d_lut_resource.to_py_nocopy(lut_size_bytes), dtype=torch.uint8).storage()
+    return post_3d_lut_buffer.to(device)
+
+
+def read_bit_stream_sizes(clip: _pybraw.IBlackmagicRawClip) -> np.ndarray:
+    """Get the size in bytes of the bit stream of every frame of a clip.
+
+    Returns:
+        A `uint32` array which is indexed by frame index.
+    """
+    clip_ex = verify(clip.as_IBlackmagicRawClipEx())
+    return verify(clip_ex.GetBitStreamSizesBytes(0, verify(clip.GetFrameCount())))
+
+
+def create_buffer_manager_pool(
+    codec_pipeline: CodecPipeline,
+    post_3d_lut_buffer: Optional[torch.ByteStorage],
+    pixel_format,
+    pool_size: int,
+    output_ring: Optional[OutputBufferRing] = None,
+    bit_stream_size_bytes: int = 0,
+):
+    """Create buffer managers for the manual decoder flow of a codec pipeline.
+
+    If `bit_stream_size_bytes` is specified, the bit stream buffers are allocated up front to hold
+    bit streams of that size.
+    """
+    device = codec_pipeline.processing_device
+    if device.type == 'cuda':
+        buffer_manager_pool = [
+            BufferManagerFlow2(codec_pipeline.manual_decoder, post_3d_lut_buffer, pixel_format,
+                               codec_pipeline.context, codec_pipeline.command_queue, codec_pipeline.stream,
+                               output_ring)
+            for _ in range(pool_size)
+        ]
+    elif device.type == 'cpu':
+        buffer_manager_pool = [
+            BufferManagerFlow1(codec_pipeline.manual_decoder, post_3d_lut_buffer, pixel_format, output_ring)
+            for _ in range(pool_size)
+        ]
+    else:
+        raise NotImplementedError(f'Unsupported processing device: {device}')
+    for buffer_manager in buffer_manager_pool:
+        buffer_manager.reserve_bit_stream(bit_stream_size_bytes)
+    return buffer_manager_pool
+
+
+class FrameImageReader:
+    def __init__(self, video_path, processing_device='cpu', clip_cache=None):
+        """Create a reader for the frames of a clip.
+
+        Args:
+            video_path: The path to the clip.
+            processing_device: The device to use for decoding and processing frames.
+            clip_cache: A `ClipCache` to take the codec and opened clip from. Readers which share
+                a clip cache share its codec, so only one of them can run a flow at a time.
+        """
+        self.video_path = os.fspath(video_path)
+        self.processing_device = torch.device(processing_device)
+
+        if clip_cache is None:
+            codec_pipeline = CodecPipeline(self.processing_device)
+        else:
+            codec_pipeline = clip_cache.codec_pipeline
+            if codec_pipeline.processing_device != self.processing_device:
+                raise ValueError('The clip cache uses a different processing device')
+
+        self.codec_pipeline = codec_pipeline
+        self.factory = codec_pipeline.factory
+        self.codec = codec_pipeline.codec
+        self.context = codec_pipeline.context
+        self.command_queue = codec_pipeline.command_queue
+        self.manual_decoder = codec_pipeline.manual_decoder
+        self.stream = codec_pipeline.stream
+
+        if clip_cache is None:
+            self.clip = verify(self.codec.OpenClip(self.video_path))
+            self._cached_clip = None
+            self._clip_ex = None
+            self._post_3d_lut_buffer = None
+        else:
+            cached_clip = clip_cache.get(self.video_path)
+            self.clip = cached_clip.clip
+            self._cached_clip = cached_clip
+            self._clip_ex = cached_clip.clip_ex
+            self._post_3d_lut_buffer = cached_clip.post_3d_lut_buffer
+        self._bit_stream_sizes = None
 
     def frame_count(self):
         return verify(self.clip.GetFrameCount())
@@ -60,46 +165,191 @@ class FrameImageReader:
     def frame_rate(self):
         return verify(self.clip.GetFrameRate())
 
+    def bit_stream_sizes(self) -> np.ndarray:
+        """Get the size in bytes of the bit stream of every frame.
+
+        The sizes are read with a single call into the SDK the first time they are needed, and
+        kept with the reader (or with the clip cache entry, if the reader uses a clip cache).
+
+        Returns:
+            A `uint32` array which is indexed by frame index.
+        """
+        if self._cached_clip is not None:
+            return self._cached_clip.bit_stream_sizes()
+        if self._bit_stream_sizes is None:
+            self._bit_stream_sizes = read_bit_stream_sizes(self.clip)
+        return self._bit_stream_sizes
+
+    def _known_bit_stream_sizes(self) -> Optional[np.ndarray]:
+        """Get the bit stream sizes if they have already been read, without reading them."""
+        if self._cached_clip is not None:
+            return self._cached_clip._bit_stream_sizes
+        return self._bit_stream_sizes
+
+    def read_bit_streams(self, frame_index: int, frame_count: int, out=None):
+        """Read the bit streams of consecutive frames into a single buffer.
+
+        All of the read jobs are created, submitted, and waited on inside the extension, without
+        holding the GIL. The codec callback is replaced while reading, so this must not be called
+        while a flow is running.
+
+        Args:
+            frame_index: The index of the first frame to read.
+            frame_count: The number of frames to read.
+            out: A writable, contiguous buffer to read the bit streams into. If not specified, a
+                `uint8` NumPy array of exactly the right size is allocated.
+
+        Returns:
+            The buffer, and a `uint64` array of `frame_count + 1` byte offsets into it. The bit
+            stream of frame `frame_index + i` is `buffer[offsets[i]:offsets[i + 1]]`.
+        """
+        if frame_index < 0 or frame_count < 0 or frame_index + frame_count > self.frame_count():
+            raise IndexError('Frame range out of range')
+        if out is None:
+            sizes = self.bit_stream_sizes()[frame_index:frame_index + frame_count]
+            out = np.empty(int(sizes.sum(dtype=np.uint64)), dtype=np.uint8)
+        clip_ex = self._clip_ex
+        if clip_ex is None:
+            clip_ex = verify(self.clip.as_IBlackmagicRawClipEx())
+        bulk_reader = _pybraw.BitStreamBulkReader()
+        verify(self.codec.SetCallback(bulk_reader))
+        try:
+            offsets = verify(bulk_reader.ReadFrames(clip_ex, frame_index, frame_count, out))
+        finally:
+            verify(self.codec.SetCallback(None))
+        return out, offsets
+
     def _get_post_3d_lut_buffer(self):
-        clip_processing_attributes = verify(self.clip.as_IBlackmagicRawClipProcessingAttributes())
-        clip_post_3d_lut = verify(clip_processing_attributes.GetPost3DLUT())
-        if clip_post_3d_lut is None:
-            return None
-        post_3d_lut_resource = verify(clip_post_3d_lut.GetResourceCPU())
-        lut_size_bytes = verify(clip_post_3d_lut.GetResourceSizeBytes())
-        post_3d_lut_buffer = torch.as_tensor(post_3d_lut_resource.to_py_nocopy(lut_size_bytes), dtype=torch.uint8).storage()
-        return post_3d_lut_buffer.to(self.processing_device)
+        if self._post_3d_lut_buffer is not None:
+            return self._post_3d_lut_buffer
+        return load_post_3d_lut(self.clip, self.processing_device)
 
     @contextmanager
-    def run_flow(self, pixel_format, max_running_tasks=3):
+    def run_flow(self, pixel_format, max_running_tasks=3, engine='python', output_ring_size=None, frame_cache=None,
+                 bit_stream_cache=None):
+        """Prepare the reader for reading frames.
+
+        Args:
+            pixel_format: The pixel format of the output images.
+            max_running_tasks: The maximum number of frames which can be in flight at once.
+            engine: Either `'python'`, which chains the read, decode, and process jobs from Python
+                callbacks, or `'native'`, which chains them inside the extension and only calls into
+                Python once per finished frame. The native engine is only available for CPU
+                processing.
+            output_ring_size: If specified, output images are written into a ring of this many
+                reusable buffers instead of freshly allocated ones. A buffer stays leased until
+                the storage of the image tensor using it is freed, which includes any views of the
+                image (such as `image[0]`) held by the caller. This should therefore be at least
+                `max_running_tasks` plus the number of images held by the caller at once. Only
+                supported by the Python engine.
+            frame_cache: A `FrameCache` or `DiskFrameCache` of processed full frames. Frames which
+                are in the cache are only cropped and resized, instead of being read, decoded, and
+                processed again. Every frame that is processed for a task is added to the cache.
+                Cache keys include the clip processing attributes at the time that each task is
+                enqueued, so changing the attributes during the flow doesn't return stale frames.
+                Batches bypass the cache.
+            bit_stream_cache: A `BitStreamCache` of compressed frames. Frames which are in the
+                cache are decoded without reading them from the clip file again. Only supported by
+                the Python engine.
+
+        Returns:
+            A context manager which yields a task manager for enqueuing frame reads.
+        """
+        if engine not in {'python', 'native'}:
+            raise ValueError(f'Unsupported engine: {engine}')
+        if engine == 'native' and self.processing_device.type != 'cpu':
+            raise ValueError('The native engine only supports CPU processing')
+        if engine == 'native' and output_ring_size is not None:
+            raise ValueError('The native engine does not support output rings')
+        if engine == 'native' and bit_stream_cache is not None:
+            raise ValueError('The native engine does not support bit stream caches')
+
         post_3d_lut_buffer = self._get_post_3d_lut_buffer()
+        clip_ex = self._clip_ex
+        if clip_ex is None:
+            clip_ex = verify(self.clip.as_IBlackmagicRawClipEx())
+        clip_key_fn = None
+        if frame_cache is not None:
+            clip_key_fn = partial(frame_cache.clip_key, self.video_path, self.clip)
+        clip_resolutions = verify(self.clip.as_IBlackmagicRawClipResolutions())
 
-        if self.processing_device.type == 'cuda':
-            buffer_manager_pool = [
-                BufferManagerFlow2(self.manual_decoder, post_3d_lut_buffer, pixel_format, self.context, self.command_queue, self.stream)
-                for _ in range(max_running_tasks)
-            ]
-        elif self.processing_device.type == 'cpu':
-            buffer_manager_pool = [
-                BufferManagerFlow1(self.manual_decoder, post_3d_lut_buffer, pixel_format)
-                for _ in range(max_running_tasks)
-            ]
+        if engine == 'native':
+            if post_3d_lut_buffer is None:
+                post_3d_lut_resource = _pybraw.CreateResourceNone()
+            else:
+                post_3d_lut_resource = _pybraw.CreateResourceFromIntPointer(post_3d_lut_buffer.data_ptr())
+            configuration_ex = verify(self.codec.as_IBlackmagicRawConfigurationEx())
+            resource_manager = verify(configuration_ex.GetResourceManager())
+            callback = _pybraw.ManualDecoderFlow1Pipeline(self.manual_decoder, resource_manager, clip_ex,
+                                                          post_3d_lut_resource, max_running_tasks,
+                                                          native_flow_complete)
+            task_manager = NativeReadTaskManager(callback, clip_ex, pixel_format, frame_cache, clip_key_fn,
+                                                 clip_resolutions)
         else:
-            raise NotImplementedError(f'Unsupported processing device: {self.processing_device}')
+            output_ring = None
+            if output_ring_size is not None:
+                output_ring = OutputBufferRing(pixel_format, self.processing_device, output_ring_size)
+            # Known sizes let reads skip the size lookup for each frame, but a flow may only read a
+            # few frames, so they aren't read just for the flow.
+            bit_stream_sizes = self._known_bit_stream_sizes()
+            # Allocating bit stream buffers for the largest frame up front means that they never
+            # have to grow while reading.
+            max_bit_stream_size_bytes = verify(clip_ex.GetMaxBitStreamSizeBytes())
+            buffer_manager_pool = create_buffer_manager_pool(self.codec_pipeline, post_3d_lut_buffer, pixel_format,
+                                                             max_running_tasks, output_ring, max_bit_stream_size_bytes)
+            bit_stream_clip_key = None
+            clip_processing_attributes = None
+            if bit_stream_cache is not None:
+                bit_stream_clip_key = bit_stream_cache.clip_key(self.video_path, self.clip)
+                clip_processing_attributes = verify(self.clip.as_IBlackmagicRawClipProcessingAttributes())
+            task_manager = ReadTaskManager(buffer_manager_pool, clip_ex, pixel_format, output_ring, frame_cache, clip_key_fn,
+                                           bit_stream_cache, bit_stream_clip_key, clip_processing_attributes,
+                                           bit_stream_sizes, clip_resolutions)
+            callback = ManualFlowCallback()
 
-        clip_ex = verify(self.clip.as_IBlackmagicRawClipEx())
-        task_manager = ReadTaskManager(buffer_manager_pool, clip_ex, pixel_format)
-        callback = ManualFlowCallback()
         verify(self.codec.SetCallback(callback))
 
-        yield task_manager
+        try:
+            yield task_manager
+        finally:
+            # Cancel pending tasks.
+            task_manager.clear_queue()
+            # Cancel running tasks.
+            if engine == 'native':
+                callback.Cancel()
+            else:
+                callback.cancel()
+            # Consume completed tasks.
+            task_manager.consume_remaining()
+
+            self.codec.FlushJobs()
+            verify(self.codec.SetCallback(None))
+
+    def iter_frames(self, pixel_format, frame_indices=None, *, max_running_tasks=3, engine='python',
+                    min_window=1, max_window=None, task_kwargs=None, **enqueue_kwargs):
+        """Read frames in order, with an adaptive read-ahead window.
+
+        This runs a flow for the duration of the iteration. See `ReadAhead` for how the read-ahead
+        window adapts to the consumer.
 
-        # Cancel pending tasks.
-        task_manager.clear_queue()
-        # Cancel running tasks.
-        callback.cancel()
-        # Consume completed tasks.
-        task_manager.consume_remaining()
+        Args:
+            pixel_format: The pixel format of the output images.
+            frame_indices: The indices of the frames to read. Defaults to every frame in the clip.
+            max_running_tasks: The maximum number of frames which can be in flight at once.
+            engine: The engine to use, see `run_flow`.
+            min_window: The minimum number of frames to keep enqueued.
+            max_window: The maximum number of frames to keep enqueued.
+            task_kwargs: A function which returns keyword arguments for `enqueue_task` for a given
+                frame index.
+            **enqueue_kwargs: Keyword arguments which will be passed to `enqueue_task` for every
+                frame.
 
-        self.codec.FlushJobs()
-        verify(self.codec.SetCallback(None))
+        Returns:
+            A generator of `(frame_index, image)` pairs.
+        """
+        if frame_indices is None:
+            frame_indices = range(self.frame_count())
+        with self.run_flow(pixel_format, max_running_tasks=max_running_tasks, engine=engine) as task_manager:
+            with ReadAhead(task_manager, frame_indices, min_window=min_window, max_window=max_window,
+                           task_kwargs=task_kwargs, **enqueue_kwargs) as read_ahead:
+                yield from read_ahead
@@ -0,0 +1,219 @@
+import os
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+import torch
+
+from pybraw import verify, ResolutionScale, PixelFormat
+from pybraw.task_manager import TaskQueue
+from pybraw.torch.buffer_manager import BufferManager
+from pybraw.torch.clip_cache import CachedClip, ClipCache
+from pybraw.torch.flow import BatchReadTask, ReadTask, ReadTaskManager, ManualFlowCallback, UserData, _BatchFrameTask
+from pybraw.torch.reader import create_buffer_manager_pool
+
+
+class ClipReadTask(ReadTask):
+    def __init__(self, task_manager, clip_path: str, cached_clip: CachedClip, frame_index: int,
+                 pixel_format: PixelFormat, resolution_scale: ResolutionScale, postprocess_kwargs: dict,
+                 priority=0, deadline=None):
+        super().__init__(task_manager, frame_index, pixel_format, resolution_scale, postprocess_kwargs,
+                         priority=priority, deadline=deadline)
+        self.clip_path = clip_path
+        # Holding on to the cached clip keeps it open even if it is evicted from the cache.
+        self.cached_clip = cached_clip
+
+
+class ClipBatchReadTask(BatchReadTask):
+    def __init__(self, task_manager, clip_path: str, cached_clip: CachedClip, frame_indices, pixel_format: PixelFormat,
+                 resolution_scale: ResolutionScale, out_device, postprocess_kwargs: dict, priority=0, deadline=None):
+        super().__init__(task_manager, frame_indices, pixel_format, resolution_scale, out_device, postprocess_kwargs,
+                         priority=priority, deadline=deadline)
+        self.clip_path = clip_path
+        self.cached_clip = cached_clip
+
+
+class _ClipBatchFrameTask(_BatchFrameTask):
+    def __init__(self, batch: ClipBatchReadTask, batch_index: int, frame_index: int):
+        super().__init__(batch, batch_index, frame_index)
+        self.clip_path = batch.clip_path
+        self.cached_clip = batch.cached_clip
+
+
+class MultiClipTaskManager(ReadTaskManager):
+    """A task manager which reads frames from many clips through a single codec.
+
+    All clips share the buffer manager pool, so `max_running_tasks` is a global budget of frames
+    in flight. Queued tasks are started round-robin across clips so that one clip with many
+    queued frames can't starve the others.
+    """
+    def __init__(
+        self,
+        buffer_manager_pool: List[BufferManager],
+        clip_cache: ClipCache,
+        pixel_format: PixelFormat,
+        max_running_tasks_per_clip: Optional[int] = None,
+    ):
+        super().__init__(buffer_manager_pool, None, pixel_format)
+        if max_running_tasks_per_clip is not None and max_running_tasks_per_clip < 1:
+            raise ValueError('max_running_tasks_per_clip must be at least 1')
+        self.clip_cache = clip_cache
+        self.max_running_tasks_per_clip = max_running_tasks_per_clip
+        # Queued tasks for each clip. The order of the clips is the round-robin order.
+        self._clip_queues = OrderedDict()
+        self._running_tasks_per_clip = Counter()
+
+    def _push_queued_task(self, task: ClipReadTask, priority):
+        if task.clip_path not in self._clip_queues:
+            self._clip_queues[task.clip_path] = TaskQueue()
+        self._clip_queues[task.clip_path].push(task, priority)
+
+    def _pop_queued_task(self):
+        for clip_path in list(self._clip_queues):
+            if self.max_running_tasks_per_clip is not None \
+                    and self._running_tasks_per_clip[clip_path] >= self.max_running_tasks_per_clip:
+                continue
+            clip_queue = self._clip_queues.pop(clip_path)
+            task = clip_queue.pop()
+            # Move the clip to the back of the round-robin order.
+            if len(clip_queue) > 0:
+                self._clip_queues[clip_path] = clip_queue
+            return task
+        return None
+
+    def _take_queued_tasks(self):
+        tasks = [task for clip_queue in self._clip_queues.values() for task in clip_queue.take_all()]
+        self._clip_queues.clear()
+        return tasks
+
+    def _submit_task(self, buffer_manager, task: ClipReadTask):
+        cached_clip = task.cached_clip
+        buffer_manager.set_post_3d_lut(cached_clip.post_3d_lut_buffer)
+        read_job = buffer_manager.create_read_job(cached_clip.clip_ex, task.frame_index,
+                                                  cached_clip.bit_stream_size(task.frame_index))
+        verify(read_job.SetUserData(UserData(buffer_manager, task, task.clip_path)))
+        verify(read_job.Submit())
+        read_job.Release()
+
+    def _on_task_started(self, task: ClipReadTask):
+        self._running_tasks_per_clip[task.clip_path] += 1
+        super()._on_task_started(task)
+
+    def _on_task_ended(self, task: ClipReadTask):
+        self._running_tasks_per_clip[task.clip_path] -= 1
+        if self._running_tasks_per_clip[task.clip_path] <= 0:
+            del self._running_tasks_per_clip[task.clip_path]
+        super()._on_task_ended(task)
+
+    def enqueue_task(self, clip_path, frame_index, *, resolution_scale=ResolutionScale.Full, priority=0, deadline=None,
+                     **postprocess_kwargs) -> ClipReadTask:
+        """Add a new task to the processing queue.
+
+        Args:
+            clip_path: The path of the clip to read from. The clip is opened through the clip cache.
+            frame_index: The index of the frame to read, decode, and process.
+            resolution_scale: The scale at which to decode the frame, or `'auto'` to choose the
+                smallest scale which still covers the `crop` region at `out_size`.
+            priority: Queued tasks with a higher priority are started first.
+            deadline: A `time.monotonic()` timestamp after which the task is cancelled if it still
+                hasn't been started.
+            **postprocess_kwargs: Keyword arguments which will be passed to
+                `BufferManager.postprocess`.
+
+        Returns:
+            The newly created and enqueued task.
+        """
+        cached_clip = self.clip_cache.get(clip_path)
+        resolution_scale = self._resolve_clip_resolution_scale(cached_clip, resolution_scale, postprocess_kwargs)
+        task = ClipReadTask(self, os.fspath(clip_path), cached_clip, frame_index,
+                            self.pixel_format, resolution_scale, postprocess_kwargs,
+                            priority=priority, deadline=deadline)
+        self.enqueue(task)
+        return task
+
+    def enqueue_batch(self, clip_path, frame_indices, *, resolution_scale=ResolutionScale.Full, out_device=None,
+                      priority=0, deadline=None, **postprocess_kwargs) -> ClipBatchReadTask:
+        """Add a batch of frames from one clip to the processing queue.
+
+        See `ReadTaskManager.enqueue_batch`. The frames of the batch take turns with the frames of
+        other clips like any other task of the clip.
+
+        Args:
+            clip_path: The path of the clip to read from. The clip is opened through the clip cache.
+            frame_indices: The indices of the frames to read, decode, and process.
+
+        Returns:
+            The newly created and enqueued batch task.
+        """
+        if len(frame_indices) == 0:
+            raise ValueError('frame_indices must not be empty')
+        cached_clip = self.clip_cache.get(clip_path)
+        resolution_scale = self._resolve_clip_resolution_scale(cached_clip, resolution_scale, postprocess_kwargs)
+        batch = ClipBatchReadTask(self, os.fspath(clip_path), cached_clip, frame_indices, self.pixel_format,
+                                  resolution_scale, out_device, postprocess_kwargs,
+                                  priority=priority, deadline=deadline)
+        self._enqueue_batch(batch)
+        return batch
+
+    def _create_batch_frame_task(self, batch: ClipBatchReadTask, batch_index: int, frame_index: int):
+        return _ClipBatchFrameTask(batch, batch_index, frame_index)
+
+    def _resolve_clip_resolution_scale(self, cached_clip: CachedClip, resolution_scale, postprocess_kwargs):
+        clip_resolutions = None
+        if resolution_scale == 'auto':
+            clip_resolutions = verify(cached_clip.clip.as_IBlackmagicRawClipResolutions())
+        return self._resolve_resolution_scale(resolution_scale, postprocess_kwargs, clip_resolutions)
+
+
+class MultiClipReader:
+    """A reader for frames from many clips, which shares one codec between them.
+
+    Every clip read by a single codec shares its SDK thread pool, which avoids oversubscribing
+    the CPU when decoding many clips at once.
+
+    Args:
+        processing_device: The device to use for decoding and processing frames.
+        clip_cache: The cache that clips are opened through. If not specified, a new clip cache is
+            created.
+    """
+    def __init__(self, processing_device='cpu', clip_cache: Optional[ClipCache] = None):
+        if clip_cache is None:
+            clip_cache = ClipCache(processing_device=processing_device)
+        elif clip_cache.processing_device != torch.device(processing_device):
+            raise ValueError('The clip cache uses a different processing device')
+        self.clip_cache = clip_cache
+        self.codec_pipeline = clip_cache.codec_pipeline
+
+    @contextmanager
+    def run_flow(self, pixel_format, max_running_tasks=8, max_running_tasks_per_clip=None):
+        """Prepare the reader for reading frames.
+
+        Args:
+            pixel_format: The pixel format of the output images.
+            max_running_tasks: The maximum number of frames which can be in flight at once, across
+                all clips.
+            max_running_tasks_per_clip: The maximum number of frames from a single clip which can
+                be in flight at once. If not specified, clips are only limited by the global budget.
+
+        Returns:
+            A context manager which yields a `MultiClipTaskManager` for enqueuing frame reads.
+        """
+        buffer_manager_pool = create_buffer_manager_pool(self.codec_pipeline, None, pixel_format, max_running_tasks)
+        task_manager = MultiClipTaskManager(buffer_manager_pool, self.clip_cache, pixel_format,
+                                            max_running_tasks_per_clip)
+        callback = ManualFlowCallback()
+        codec = self.codec_pipeline.codec
+        verify(codec.SetCallback(callback))
+
+        try:
+            yield task_manager
+        finally:
+            # Cancel pending tasks.
+            task_manager.clear_queue()
+            # Cancel running tasks.
+            callback.cancel()
+            # Consume completed tasks.
+            task_manager.consume_remaining()
+
+            codec.FlushJobs()
+            verify(codec.SetCallback(None))
@@ -3,6 +3,23 @@ import os.path
 import pytest
 
 
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', help='run tests which are marked as slow')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: a slow test which only runs when --run-slow is given')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip_slow = pytest.mark.skip(reason='slow test, use --run-slow to run it')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
+
+
 @pytest.fixture
 def test_data_dir():
     return os.path.normpath(os.path.join(__file__, '..', 'data'))
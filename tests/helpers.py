@@ -0,0 +1,22 @@
+from pybraw.task_manager import TaskManager
+
+
+class ManualTaskManager(TaskManager):
+    """A task manager whose started tasks are resolved by the test."""
+    def __init__(self, max_running_tasks):
+        super().__init__(max_running_tasks)
+        self.started = []
+
+    def _on_task_started(self, task):
+        self.started.append(task)
+
+    def _on_task_ended(self, task):
+        self._cur_running_tasks -= 1
+        self._try_start_task()
+
+
+class ImmediateTaskManager(ManualTaskManager):
+    """A task manager whose tasks finish as soon as they are started."""
+    def _on_task_started(self, task):
+        super()._on_task_started(task)
+        task.resolve(None)
@@ -1,4 +1,10 @@
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+import pytest
 
 from pybraw import _pybraw, verify, ResultCode
 from .helpers import releases_last_reference
@@ -41,3 +47,84 @@ def test_PreparePipeline(codec):
 
     del callback
     assert sys.getrefcount(user_data) == 2
+
+
+def _read_whole_clip(factory, filename):
+    codec = verify(factory.CreateCodec())
+    clip = verify(codec.OpenClip(filename))
+    clip_ex = verify(clip.as_IBlackmagicRawClipEx())
+    max_bit_stream_size_bytes = verify(clip_ex.GetMaxBitStreamSizeBytes())
+    audio = verify(clip.as_IBlackmagicRawClipAudio())
+    sample_count = verify(audio.GetAudioSampleCount())
+    buffer = bytearray(2 ** 16)
+    total_bytes_read = 0
+    for sample_frame_index in range(0, sample_count, 4096):
+        _, bytes_read = verify(audio.GetAudioSamples(sample_frame_index, buffer, 4096))
+        total_bytes_read += bytes_read
+    return max_bit_stream_size_bytes, total_bytes_read
+
+
+def test_concurrent_readers(factory, sample_filename):
+    n_readers = 8
+    serial_results = [_read_whole_clip(factory, sample_filename) for _ in range(n_readers)]
+    with ThreadPoolExecutor(max_workers=n_readers) as executor:
+        futures = [executor.submit(_read_whole_clip, factory, sample_filename) for _ in range(n_readers)]
+        concurrent_results = [future.result() for future in futures]
+    assert concurrent_results == serial_results
+
+
+@pytest.mark.slow
+def test_concurrent_readers_throughput(factory, sample_filename):
+    n_readers = 8
+    if (os.cpu_count() or 1) < 4:
+        pytest.skip('not enough CPU cores to measure concurrent throughput')
+
+    start_time = perf_counter()
+    for _ in range(n_readers):
+        _read_whole_clip(factory, sample_filename)
+    serial_time = perf_counter() - start_time
+
+    start_time = perf_counter()
+    with ThreadPoolExecutor(max_workers=n_readers) as executor:
+        futures = [executor.submit(_read_whole_clip, factory, sample_filename) for _ in range(n_readers)]
+        for future in futures:
+            future.result()
+    concurrent_time = perf_counter() - start_time
+
+    # SDK calls release the GIL, so readers on separate threads should make progress in parallel.
+    assert concurrent_time < serial_time
+
+
+def test_blocking_call_releases_gil(clip):
+    audio = verify(clip.as_IBlackmagicRawClipAudio())
+    sample_count = verify(audio.GetAudioSampleCount())
+    buffer = bytearray(sample_count * verify(audio.GetAudioChannelCount()) * 4)
+    state = {'in_call': False, 'ticks': 0}
+    started = Event()
+    stop = Event()
+
+    def count_ticks():
+        started.set()
+        while not stop.is_set():
+            if state['in_call']:
+                state['ticks'] += 1
+            # Sleeping for real lets the main thread take the GIL back as soon as the call returns.
+            sleep(0.0001)
+
+    # With a very long switch interval, the main thread only lets go of the GIL when it blocks or
+    # when an extension function releases it. The other thread therefore can't run between the
+    # call returning and `in_call` being cleared, so it can only count ticks during the call.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1000)
+    thread = Thread(target=count_ticks)
+    thread.start()
+    try:
+        started.wait()
+        state['in_call'] = True
+        verify(audio.GetAudioSamples(0, buffer, sample_count))
+        state['in_call'] = False
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+    assert state['ticks'] > 0
@@ -53,6 +53,23 @@ def test_GetMetadataIterator(clip):
     assert_allclose(metadata['crop_origin'], np.array([16.0, 8.0]))
 
 
+def test_metadata_dict(clip):
+    metadata = verify(clip.metadata_dict())
+    assert metadata['firmware_version'] == '6.2'
+    assert_allclose(metadata['crop_origin'], np.array([16.0, 8.0]))
+
+
+def test_FrameMetadataScanner(codec, clip):
+    scanner = _pybraw.FrameMetadataScanner()
+    verify(codec.SetCallback(scanner))
+    metadata = verify(scanner.Scan(clip, [0, 1, 2], 2))
+    verify(codec.SetCallback(None))
+    assert metadata['frame_index'].tolist() == [0, 1, 2]
+    assert metadata['valid'].tolist() == [True, True, True]
+    assert metadata['white_balance_kelvin'].tolist() == [5600, 5600, 5600]
+    assert_allclose(metadata['sensor_rate'], np.array([[25, 1]] * 3))
+
+
 def test_GetMetadata(clip):
     day_night = verify(clip.GetMetadata('day_night'))
     assert day_night.to_py() == 'day'
@@ -1,3 +1,6 @@
+import numpy as np
+import pytest
+
 from pybraw import _pybraw, verify
 
 
@@ -33,3 +36,12 @@ def test_GetAudioSamples(audio):
     assert bytes_read == 4 * 2 * 3
     expected = bytearray(b"f&\x00\xb7%\x00X\xfa\xff&$\x00\x1a\xf4\xff\xf2-\x00c\xc8\xff\x80\'\x00")
     assert buffer[:bytes_read] == expected
+
+
+def test_ReadAudioSamples(audio):
+    out = np.zeros((6, 2), dtype=np.int32)
+    assert verify(audio.ReadAudioSamples(802560 - 4, out)) == 4
+    # 24-bit samples are sign-extended.
+    assert out[:4].tolist() == [[9830, 9655], [-1448, 9254], [-3046, 11762], [-14237, 10112]]
+    with pytest.raises(ValueError):
+        audio.ReadAudioSamples(0, np.zeros((4, 2), dtype=np.int16))
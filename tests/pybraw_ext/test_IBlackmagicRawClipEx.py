@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from pybraw import _pybraw, verify
+
+
+@pytest.fixture
+def clip_ex(clip):
+    return verify(clip.as_IBlackmagicRawClipEx())
+
+
+def test_GetBitStreamSizeBytes(clip_ex):
+    bit_stream_size_bytes = verify(clip_ex.GetBitStreamSizeBytes(0))
+    assert 0 < bit_stream_size_bytes <= verify(clip_ex.GetMaxBitStreamSizeBytes())
+
+
+def test_GetBitStreamSizesBytes(clip, clip_ex):
+    frame_count = verify(clip.GetFrameCount())
+    sizes = verify(clip_ex.GetBitStreamSizesBytes(0, frame_count))
+    assert sizes.dtype == np.uint32
+    assert sizes.shape == (frame_count,)
+    assert list(sizes[:4]) == [verify(clip_ex.GetBitStreamSizeBytes(i)) for i in range(4)]
+    assert sizes.max() <= verify(clip_ex.GetMaxBitStreamSizeBytes())
+
+
+def test_BitStreamBulkReader(codec, clip_ex):
+    sizes = verify(clip_ex.GetBitStreamSizesBytes(2, 3))
+    buffer = np.zeros(int(sizes.sum()) + 16, dtype=np.uint8)
+    bulk_reader = _pybraw.BitStreamBulkReader()
+    verify(codec.SetCallback(bulk_reader))
+    offsets = verify(bulk_reader.ReadFrames(clip_ex, 2, 3, buffer))
+    verify(codec.SetCallback(None))
+    assert offsets.dtype == np.uint64
+    assert list(offsets) == [0, *np.cumsum(sizes, dtype=np.uint64)]
+    assert buffer[:offsets[1]].any()
+    assert not buffer[offsets[-1]:].any()
+
+
+def test_BitStreamBulkReader_buffer_too_small(codec, clip_ex):
+    bulk_reader = _pybraw.BitStreamBulkReader()
+    verify(codec.SetCallback(bulk_reader))
+    result, _ = bulk_reader.ReadFrames(clip_ex, 0, 2, np.zeros(16, dtype=np.uint8))
+    verify(codec.SetCallback(None))
+    assert result == _pybraw.E_INVALIDARG
@@ -54,6 +54,28 @@ def test_SetResourceFormat(frame, codec, callback, format, max_val, is_planar, c
     assert_allclose(np_image[100, 200], expected, atol=1 / 255)
 
 
+def test_processed_image_buffer_protocol(frame, codec, callback):
+    verify(frame.SetResourceFormat(_pybraw.blackmagicRawResourceFormatRGBU16Planar))
+    process_job = verify(frame.CreateJobDecodeAndProcessFrame())
+    process_job.Submit()
+    process_job.Release()
+    codec.FlushJobs()
+
+    processed_image = callback.processed_image
+    del callback.processed_image
+    view = memoryview(processed_image)
+    assert view.format == 'H'
+    assert view.shape == (3, verify(processed_image.GetHeight()), verify(processed_image.GetWidth()))
+    np_image = np.asarray(processed_image)
+    assert np_image.ctypes.data == int(verify(processed_image.GetResource()))
+    assert_allclose(np_image, processed_image.to_py())
+    assert processed_image.__dlpack_device__() == (1, 0)
+    # The capsule holds a reference to the image, so it can outlive the Python object.
+    capsule = processed_image.__dlpack__()
+    del view, np_image, processed_image
+    del capsule
+
+
 def test_SetResolutionScale(frame, codec, callback):
     verify(frame.SetResolutionScale(_pybraw.blackmagicRawResolutionScaleQuarter))
     process_job = verify(frame.CreateJobDecodeAndProcessFrame())
@@ -93,6 +115,12 @@ def test_GetMetadataIterator(frame):
     assert_allclose(metadata['sensor_rate'], np.array([25, 1]))
 
 
+def test_metadata_dict(frame):
+    metadata = verify(frame.metadata_dict())
+    assert metadata['white_balance_kelvin'] == 5600
+    assert_allclose(metadata['sensor_rate'], np.array([25, 1]))
+
+
 def test_GetMetadata(frame):
     white_balance = verify(frame.GetMetadata('white_balance_kelvin'))
     assert white_balance.to_py() == 5600
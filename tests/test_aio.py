@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from pybraw import PixelFormat, ResolutionScale
+from pybraw.aio import AsyncFrameReader
+
+
+@pytest.fixture
+def reader_cpu(sample_filename):
+    torch_reader = pytest.importorskip('pybraw.torch.reader')
+    return torch_reader.FrameImageReader(sample_filename, processing_device='cpu')
+
+
+def test_read_frame(reader_cpu):
+    async def main():
+        async with AsyncFrameReader(reader_cpu, PixelFormat.RGB_F32_Planar) as async_reader:
+            return await asyncio.gather(*[
+                async_reader.read_frame(frame_index, resolution_scale=ResolutionScale.Eighth)
+                for frame_index in range(8)
+            ])
+
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+    images = asyncio.run(main())
+    assert [float(image.mean()) for image in images] == pytest.approx(expected, abs=1e-4)
+
+
+def test_iter_frames(reader_cpu):
+    async def main():
+        frame_indices = []
+        async with AsyncFrameReader(reader_cpu, PixelFormat.RGB_F32_Planar, max_running_tasks=2) as async_reader:
+            async for frame_index, image in async_reader.iter_frames(range(8), resolution_scale=ResolutionScale.Eighth):
+                assert image.shape[0] == 3
+                frame_indices.append(frame_index)
+        return frame_indices
+
+    assert sorted(asyncio.run(main())) == list(range(8))
+
+
+def test_iter_frames_early_exit(reader_cpu):
+    async def main():
+        async with AsyncFrameReader(reader_cpu, PixelFormat.RGB_F32_Planar) as async_reader:
+            frames = async_reader.iter_frames(range(100), resolution_scale=ResolutionScale.Eighth)
+            async for _ in frames:
+                break
+            await frames.aclose()
+            # Abandoned frames must not keep hold of the decoding slots.
+            return await async_reader.read_frame(0, resolution_scale=ResolutionScale.Eighth)
+
+    assert asyncio.run(main()).shape[0] == 3
@@ -0,0 +1,93 @@
+import wave
+
+import numpy as np
+import pytest
+
+from pybraw.audio import AudioReader, write_wav
+
+
+# The last four sample frames of the sample clip.
+LAST_SAMPLES = [[9830, 9655], [-1448, 9254], [-3046, 11762], [-14237, 10112]]
+
+
+@pytest.fixture
+def audio_reader(sample_filename):
+    return AudioReader.from_file(sample_filename)
+
+
+def test_read_audio(audio_reader):
+    assert audio_reader.dtype == np.int32
+    samples = audio_reader.read_audio(802560 - 4, 4)
+    assert samples.shape == (4, 2)
+    assert samples.tolist() == LAST_SAMPLES
+
+
+def test_read_audio_whole_clip(audio_reader):
+    # A small chunk size makes sure that reads which span several chunks line up.
+    samples = audio_reader.read_audio(chunk_sample_count=1000)
+    assert samples.shape == (802560, 2)
+    assert samples[-4:].tolist() == LAST_SAMPLES
+    assert samples.min() >= -2**23 and samples.max() < 2**23
+
+
+def test_read_audio_out(audio_reader):
+    out = audio_reader.empty(10)
+    samples = audio_reader.read_audio(802560 - 4, 10, out=out)
+    assert samples.shape == (4, 2)
+    assert np.shares_memory(samples, out)
+    # Without a count, the read stops when `out` is full.
+    samples = audio_reader.read_audio(802560 - 6, out=out[:4])
+    assert samples.shape == (4, 2)
+    assert samples[-2:].tolist() == LAST_SAMPLES[:2]
+
+
+def test_stream(audio_reader):
+    blocks = [block.copy() for block in audio_reader.stream(48000, start=802560 - 100000)]
+    assert [len(block) for block in blocks] == [48000, 48000, 4000]
+    assert np.concatenate(blocks)[-4:].tolist() == LAST_SAMPLES
+
+
+def test_stream_close(audio_reader):
+    with audio_reader.stream(1000) as blocks:
+        first = next(blocks).copy()
+    assert first.tolist() == audio_reader.read_audio(0, 1000).tolist()
+    with pytest.raises(StopIteration):
+        next(blocks)
+
+
+def test_write_wav(audio_reader, tmp_path):
+    path = tmp_path / 'audio.wav'
+    write_wav(audio_reader, path, block_duration=0.5)
+    with wave.open(str(path), 'rb') as f:
+        assert f.getnchannels() == 2
+        assert f.getsampwidth() == 3
+        assert f.getframerate() == 48000
+        assert f.getnframes() == 802560
+        f.setpos(802560 - 4)
+        data = f.readframes(4)
+    assert data == b"f&\x00\xb7%\x00X\xfa\xff&$\x00\x1a\xf4\xff\xf2-\x00c\xc8\xff\x80'\x00"
+
+
+def test_frame_windows(audio_reader):
+    windows = audio_reader.frame_windows()
+    assert len(windows) == 418
+    # The sample clip is 25 FPS with 48 kHz audio.
+    assert windows.window_size == 1920
+    audio = windows.read([417, 0, 1])
+    assert audio.shape == (3, 1920, 2)
+    assert audio[0, -4:].tolist() == LAST_SAMPLES
+    assert audio[1:].reshape(-1, 2).tolist() == audio_reader.read_audio(0, 2 * 1920).tolist()
+
+
+def test_frame_windows_max_span(audio_reader):
+    windows = audio_reader.frame_windows()
+    frame_indices = [417, 0, 1, 200, 0]
+    # A span which only fits one window reads every window on its own.
+    assert windows.read(frame_indices, max_span=1).tolist() == windows.read(frame_indices).tolist()
+
+
+def test_frame_windows_past_end(audio_reader):
+    windows = audio_reader.frame_windows(window_size=2000)
+    audio = windows.read([417])
+    assert audio[0, 1916:1920].tolist() == LAST_SAMPLES
+    assert not audio[0, 1920:].any()
@@ -19,3 +19,7 @@ class TestResolutionScale:
     def test_factor(self):
         assert ResolutionScale.Full.factor() == 1
         assert ResolutionScale.Eighth_Flipped.factor() == 8
+
+    def test_from_factor(self):
+        assert ResolutionScale.from_factor(1) == ResolutionScale.Full
+        assert ResolutionScale.from_factor(4, flipped=True) == ResolutionScale.Quarter_Flipped
@@ -0,0 +1,24 @@
+import numpy as np
+from numpy.testing import assert_allclose
+
+from pybraw.metadata import read_frame_metadata
+
+
+def test_read_frame_metadata(sample_filename):
+    metadata = read_frame_metadata(sample_filename)
+    assert metadata['frame_index'].tolist() == list(range(418))
+    assert metadata['valid'].dtype == np.bool_
+    assert metadata['valid'].all()
+    assert metadata['timecode'][0] == '14:39:00:23'
+    assert metadata['white_balance_kelvin'].dtype == np.int64
+    assert (metadata['white_balance_kelvin'] == 5600).all()
+    assert metadata['sensor_rate'].shape == (418, 2)
+    assert_allclose(metadata['sensor_rate'][-1], np.array([25, 1]))
+
+
+def test_read_frame_metadata_subset(sample_filename):
+    # A single job in flight makes sure that scanning can't get ahead of itself.
+    metadata = read_frame_metadata(sample_filename, [417, 0, 5], max_jobs_in_flight=1)
+    assert metadata['frame_index'].tolist() == [417, 0, 5]
+    assert metadata['timecode'][1] == '14:39:00:23'
+    assert len(metadata['white_balance_kelvin']) == 3
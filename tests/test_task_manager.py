@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from pybraw.task_manager import Task, TaskQueue
+from .helpers import ImmediateTaskManager, ManualTaskManager
+
+
+def test_task_queue_priority_order():
+    queue = TaskQueue()
+    for name, priority in [('a', 0), ('b', 1), ('c', 0), ('d', 2), ('e', 1)]:
+        queue.push(name, priority)
+    assert len(queue) == 5
+    assert [queue.pop() for _ in range(5)] == ['d', 'b', 'e', 'a', 'c']
+    assert queue.pop() is None
+
+
+def test_task_queue_take_all():
+    queue = TaskQueue()
+    for name, priority in [('a', 0), ('b', 1), ('c', 0)]:
+        queue.push(name, priority)
+    assert queue.take_all() == ['b', 'a', 'c']
+    assert len(queue) == 0
+
+
+def test_enqueue_priority():
+    task_manager = ManualTaskManager(1)
+    tasks = [Task(task_manager) for _ in range(4)]
+    task_manager.enqueue(tasks[0])
+    task_manager.enqueue(tasks[1], priority=0)
+    task_manager.enqueue(tasks[2], priority=5)
+    task_manager.enqueue(tasks[3], priority=1)
+    order = []
+    while len(task_manager.started) > len(order):
+        task = task_manager.started[len(order)]
+        order.append(task)
+        task.resolve(None)
+        task.consume()
+    assert order == [tasks[0], tasks[2], tasks[3], tasks[1]]
+
+
+def test_as_completed_drains_all_tasks():
+    task_manager = ImmediateTaskManager(3)
+    tasks = [Task(task_manager) for _ in range(100)]
+    for task in tasks:
+        task_manager.enqueue(task)
+    completed = []
+    for task in task_manager.as_completed():
+        task.consume()
+        completed.append(task)
+    assert completed == tasks
+
+
+def test_clear_queue():
+    task_manager = ManualTaskManager(1)
+    tasks = [Task(task_manager) for _ in range(3)]
+    for task in tasks:
+        task_manager.enqueue(task)
+    task_manager.clear_queue()
+    assert not tasks[0].is_cancelled()
+    assert tasks[1].is_cancelled() and tasks[2].is_cancelled()
+
+
+def test_cancel_queued():
+    task_manager = ManualTaskManager(1)
+    tasks = [Task(task_manager) for _ in range(3)]
+    for task in tasks:
+        task_manager.enqueue(task)
+    assert not task_manager.cancel_queued(tasks[0])
+    assert task_manager.cancel_queued(tasks[1])
+    assert tasks[1].is_cancelled()
+    tasks[0].resolve(None)
+    tasks[0].consume()
+    # The cancelled task is skipped without being started.
+    assert task_manager.started == [tasks[0], tasks[2]]
+
+
+def test_expired_tasks_are_dropped():
+    task_manager = ManualTaskManager(1)
+    running = Task(task_manager)
+    expired = Task(task_manager, deadline=time.monotonic() - 1)
+    urgent = Task(task_manager, priority=1, deadline=time.monotonic() + 3600)
+    for task in [running, expired, urgent]:
+        task_manager.enqueue(task)
+    running.resolve(None)
+    running.consume()
+    assert task_manager.started == [running, urgent]
+    urgent.resolve(None)
+    urgent.consume()
+    assert expired.is_cancelled()
+    assert task_manager.started == [running, urgent]
+
+
+def test_consume_cancelled_queued_task():
+    task_manager = ManualTaskManager(1)
+    tasks = [Task(task_manager) for _ in range(2)]
+    for task in tasks:
+        task_manager.enqueue(task)
+    assert task_manager.cancel_queued(tasks[1])
+    with pytest.raises(CancelledError):
+        tasks[1].consume()
+    tasks[0].resolve(None)
+    tasks[0].consume()
+    assert task_manager.started == [tasks[0]]
+
+
+def test_consume_expired_task():
+    task_manager = ManualTaskManager(1)
+    running = Task(task_manager)
+    expired = Task(task_manager, deadline=time.monotonic() - 1)
+    for task in [running, expired]:
+        task_manager.enqueue(task)
+    running.resolve(None)
+    running.consume()
+    with pytest.raises(CancelledError):
+        expired.consume()
+    assert task_manager.started == [running]
@@ -1,9 +1,23 @@
+import numpy as np
 import pytest
 import torch
 from pytest_lazyfixture import lazy_fixture
 
-from pybraw import PixelFormat, ResolutionScale
+from torch.utils.data import DataLoader
+
+from pybraw import _pybraw, verify, PixelFormat, ResolutionScale
+from pybraw.task_manager import Task
+from pybraw.torch.bit_stream_cache import BitStreamCache
+from pybraw.torch.buffer_manager import transform_image
+from pybraw.torch.clip_cache import ClipCache
+from pybraw.torch.dataset import ClipFrameDataset, IterableClipFrameDataset
+from pybraw.torch.disk_cache import DiskFrameCache, _ClipFrames
+from pybraw.torch.flow import select_resolution_scale
+from pybraw.torch.frame_cache import FrameCache
+from pybraw.torch.prefetch import ReadAhead
 from pybraw.torch.reader import FrameImageReader
+from pybraw.torch.scheduler import MultiClipReader
+from .helpers import ManualTaskManager
 
 
 @pytest.fixture
@@ -49,8 +63,158 @@ def test_read_frames(sample_filename, processing_device):
             assert float(image_tensor.mean()) == pytest.approx(expected[i], abs=1e-4)
 
 
-def test_automatic_cancellation(reader_cpu):
-    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3) as task_manager:
+def test_bit_stream_sizes(reader_cpu, sample_filename):
+    sizes = reader_cpu.bit_stream_sizes()
+    assert len(sizes) == reader_cpu.frame_count()
+    assert reader_cpu.bit_stream_sizes() is sizes
+    cached_reader = FrameImageReader(sample_filename, clip_cache=ClipCache())
+    assert list(cached_reader.bit_stream_sizes()) == list(sizes)
+
+
+def test_read_bit_streams(reader_cpu):
+    buffer, offsets = reader_cpu.read_bit_streams(1, 4)
+    sizes = reader_cpu.bit_stream_sizes()[1:5]
+    assert len(buffer) == int(sizes.sum())
+    assert list(np.diff(offsets)) == list(sizes)
+    with pytest.raises(IndexError):
+        reader_cpu.read_bit_streams(reader_cpu.frame_count() - 1, 2)
+
+
+def test_read_frames_native_engine(reader_cpu):
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, engine='native') as task_manager:
+        tasks = [task_manager.enqueue_task(frame_index, resolution_scale=ResolutionScale.Eighth)
+                 for frame_index in range(8)]
+        for i, task in enumerate(tasks):
+            image_tensor = task.consume()
+            assert float(image_tensor.mean()) == pytest.approx(expected[i], abs=1e-4)
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_iter_frames(reader_cpu, engine):
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+
+    frames = reader_cpu.iter_frames(PixelFormat.RGB_F32_Planar, range(8), engine=engine,
+                                    resolution_scale=ResolutionScale.Eighth)
+    for i, (frame_index, image_tensor) in enumerate(frames):
+        assert frame_index == i
+        assert float(image_tensor.mean()) == pytest.approx(expected[i], abs=1e-4)
+    assert i == 7
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_iter_frames_break(reader_cpu, engine):
+    frames = reader_cpu.iter_frames(PixelFormat.RGB_F32_Planar, range(8), engine=engine,
+                                    resolution_scale=ResolutionScale.Eighth)
+    for frame_index, image_tensor in frames:
+        if frame_index == 2:
+            break
+    # Closing the generator must tear down the flow so that the reader can be used again.
+    frames.close()
+
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, engine=engine) as task_manager:
+        task = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth)
+        image_tensor = task.consume()
+    assert float(image_tensor.mean()) == pytest.approx(0.516379, abs=1e-4)
+
+
+class _FrameTask(Task):
+    def __init__(self, task_manager, frame_index):
+        super().__init__(task_manager)
+        self.frame_index = frame_index
+
+    def consume(self):
+        # Consuming a frame which isn't ready yet stands in for waiting for it to be decoded.
+        if not self.is_done():
+            self.resolve(self.frame_index)
+        return super().consume()
+
+
+class _FrameTaskManager(ManualTaskManager):
+    def enqueue_task(self, frame_index):
+        task = _FrameTask(self, frame_index)
+        self.enqueue(task)
+        return task
+
+
+def test_read_ahead_window():
+    task_manager = _FrameTaskManager(8)
+    read_ahead = ReadAhead(task_manager, range(100), min_window=1, max_window=3)
+
+    def resolve_started():
+        for task in task_manager.started:
+            if not task.is_consumed() and not task.is_done():
+                task.resolve(task.frame_index)
+
+    # The first frame isn't ready, so the window grows.
+    assert next(read_ahead) == (0, 0)
+    assert (read_ahead.window, read_ahead.wait_count) == (2, 1)
+    # Every pending frame is already done, so the window shrinks.
+    resolve_started()
+    assert next(read_ahead) == (1, 1)
+    assert (read_ahead.window, read_ahead.wait_count) == (1, 1)
+    assert next(read_ahead) == (2, 2)
+    assert (read_ahead.window, read_ahead.wait_count) == (1, 1)
+    # Waiting for every frame grows the window up to its maximum.
+    for frame_index in range(3, 7):
+        assert next(read_ahead) == (frame_index, frame_index)
+    assert (read_ahead.window, read_ahead.wait_count) == (3, 5)
+    read_ahead.close()
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_read_batch(reader_cpu, engine):
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, engine=engine) as task_manager:
+        task = task_manager.enqueue_batch(list(range(8)), resolution_scale=ResolutionScale.Eighth)
+        batch_tensor = task.consume()
+    assert batch_tensor.shape[:2] == (8, 3)
+    for i in range(8):
+        assert float(batch_tensor[i].mean()) == pytest.approx(expected[i], abs=1e-4)
+
+
+def test_read_batch_as_completed(reader_cpu):
+    with reader_cpu.run_flow(PixelFormat.RGBA_U8_Packed, max_running_tasks=3) as task_manager:
+        batches = [task_manager.enqueue_batch([2 * i, 2 * i + 1], crop=(0, 0, 800, 400),
+                                              resolution_scale=ResolutionScale.Quarter)
+                   for i in range(3)]
+        completed = list(task_manager.as_completed())
+        assert set(completed) == set(batches)
+        for task in completed:
+            assert task.consume().shape == (2, 100, 200, 4)
+
+
+def test_read_frames_output_ring(reader_cpu):
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, output_ring_size=5) as task_manager:
+        data_ptrs = set()
+        for frame_index in range(16):
+            task = task_manager.enqueue_task(frame_index, resolution_scale=ResolutionScale.Eighth)
+            image_tensor = task.consume()
+            data_ptrs.add(image_tensor.data_ptr())
+            del image_tensor
+        # Buffers should be reused once the images viewing them have been freed.
+        assert task_manager.output_ring.grow_count == 0
+        assert len(data_ptrs) <= task_manager.output_ring.capacity
+
+
+def test_read_frames_output_ring_keeps_views(reader_cpu):
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=1, output_ring_size=1) as task_manager:
+        image_tensor = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth).consume()
+        # A view of the image keeps its buffer leased after the image itself is gone.
+        red = image_tensor[0]
+        expected = red.clone()
+        del image_tensor
+        for frame_index in range(100, 104):
+            task_manager.enqueue_task(frame_index, resolution_scale=ResolutionScale.Eighth).consume()
+        assert torch.equal(red, expected)
+        assert task_manager.output_ring.grow_count > 0
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_automatic_cancellation(reader_cpu, engine):
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, engine=engine) as task_manager:
         tasks = [task_manager.enqueue_task(frame_index) for frame_index in range(100)]
 
     # We expect for all tasks to be either consumed or cancelled after the run_flow context manager
@@ -70,6 +234,66 @@ def test_postprocessing_crop(reader_cpu):
     assert image_tensor.shape == (100, 200, 4)
 
 
+@pytest.mark.parametrize('crop,out_size,expected', [
+    (None, None, ResolutionScale.Full),
+    (None, (2048, 1080), ResolutionScale.Half),
+    (None, (2049, 1080), ResolutionScale.Full),
+    ((0, 0, 800, 400), (100, 50), ResolutionScale.Eighth),
+    ((0, 0, 800, 400), (101, 50), ResolutionScale.Quarter),
+])
+def test_select_resolution_scale(reader_cpu, crop, out_size, expected):
+    clip_resolutions = verify(reader_cpu.clip.as_IBlackmagicRawClipResolutions())
+    assert select_resolution_scale(clip_resolutions, crop, out_size) == expected
+
+
+def test_auto_resolution_scale(reader_cpu):
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=1) as task_manager:
+        task = task_manager.enqueue_task(0, resolution_scale='auto', crop=(0, 0, 800, 400), out_size=(100, 50))
+        image_tensor = task.consume()
+    assert task.resolution_scale == ResolutionScale.Eighth
+    assert image_tensor.shape == (3, 50, 100)
+
+
+def test_postprocessing_flipped(reader_cpu):
+    crop = (800, 400, 1600, 800)
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=1) as task_manager:
+        upright = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter, crop=crop).consume()
+        flipped = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter_Flipped, crop=crop).consume()
+    assert flipped.shape == (3, 200, 400)
+    torch.testing.assert_allclose(flipped, upright.flip(1, 2), atol=1e-3, rtol=0)
+
+
+def test_postprocessing_convert(reader_cpu):
+    with reader_cpu.run_flow(PixelFormat.BGRA_U8_Packed, max_running_tasks=1) as task_manager:
+        task = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter)
+        bgra = task.consume()
+        task = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter, channels='RGB', planar=True,
+                                         normalize=True)
+        rgb = task.consume()
+        task = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter, out_size=(256, 128))
+        resized = task.consume()
+    assert rgb.shape == (3, 540, 1024)
+    assert rgb.dtype == torch.float32
+    torch.testing.assert_allclose(rgb, bgra[..., [2, 1, 0]].permute(2, 0, 1).float() / 255)
+    assert resized.shape == (128, 256, 4)
+    assert resized.dtype == torch.uint8
+    assert resized.is_contiguous()
+
+
+def test_transform_image_unsigned_16_bit():
+    # 16-bit images are stored as int16, so 65535 is stored as -1.
+    image = torch.tensor([[[-1, 0, 32767]]], dtype=torch.int16)
+    converted = transform_image(image, PixelFormat.RGB_U16_Packed, ResolutionScale.Full, channels='BGR', planar=True,
+                                normalize=True)
+    assert converted.flatten().tolist() == pytest.approx([32767 / 65535, 0, 1])
+    resized = transform_image(image, PixelFormat.RGB_U16_Packed, ResolutionScale.Full, out_size=(2, 1))
+    assert resized.dtype == torch.int16
+    assert resized[0, 0].tolist() == [-1, 0, 32767]
+    # Narrowing to 8 bits would silently wrap the values around.
+    with pytest.raises(ValueError):
+        transform_image(image, PixelFormat.RGB_U16_Packed, ResolutionScale.Full, dtype=torch.uint8)
+
+
 @pytest.mark.parametrize('out_device', [
     lazy_fixture('device_cpu'),
     lazy_fixture('device_cuda0'),
@@ -83,3 +307,182 @@ def test_postprocessing_out_device(reader_cpu, out_device):
         )
         image_tensor = task.consume()
     assert image_tensor.device == out_device
+
+
+def test_clip_frame_dataset(sample_filename):
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+    dataset = ClipFrameDataset([sample_filename, sample_filename], resolution_scale=ResolutionScale.Eighth)
+    assert len(dataset) == 2 * 418
+    assert dataset.locate(420) == (1, 2)
+    assert float(dataset[420].mean()) == pytest.approx(expected[2], abs=1e-4)
+    dataset.close()
+
+
+def test_iterable_clip_frame_dataset_workers(sample_filename):
+    expected = [0.516379, 0.515850, 0.515255, 0.514853, 0.514609, 0.514260, 0.514031, 0.514378]
+    dataset = IterableClipFrameDataset([sample_filename], resolution_scale=ResolutionScale.Eighth,
+                                       frame_counts=[8])
+    data_loader = DataLoader(dataset, batch_size=None, num_workers=2)
+    # Each worker reads a contiguous shard, and the default sampler-free loader interleaves them.
+    means = sorted(float(image.mean()) for image in data_loader)
+    assert means == pytest.approx(sorted(expected), abs=1e-4)
+
+
+def test_clip_cache(sample_filename, bw_filename):
+    clip_cache = ClipCache(capacity=1)
+    first = clip_cache.get(sample_filename)
+    assert clip_cache.get(sample_filename) is first
+    clip_cache.get(bw_filename)
+    assert sample_filename not in clip_cache
+    assert (clip_cache.hits, clip_cache.misses, clip_cache.evictions) == (1, 2, 1)
+
+
+def test_read_frames_clip_cache(sample_filename):
+    clip_cache = ClipCache()
+    for _ in range(2):
+        reader = FrameImageReader(sample_filename, clip_cache=clip_cache)
+        with reader.run_flow(PixelFormat.RGB_F32_Planar) as task_manager:
+            image_tensor = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth).consume()
+        assert float(image_tensor.mean()) == pytest.approx(0.516379, abs=1e-4)
+    assert clip_cache.hits == 1
+
+
+def test_frame_cache_eviction():
+    frame_cache = FrameCache(max_bytes=2 * 4 * 16)
+    for frame_index in range(3):
+        frame_cache.put(('clip', frame_index), torch.zeros(16))
+    assert len(frame_cache) == 2
+    assert frame_cache.nbytes == 2 * 4 * 16
+    assert frame_cache.get(('clip', 0)) is None
+    assert frame_cache.get(('clip', 2)) is not None
+    assert (frame_cache.hits, frame_cache.misses, frame_cache.evictions) == (1, 1, 1)
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_read_frames_frame_cache(reader_cpu, engine):
+    frame_cache = FrameCache(max_bytes=2 ** 26)
+    crops = [None, (0, 0, 800, 400), (800, 400, 800, 400)]
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, engine=engine) as task_manager:
+        full = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter).consume()
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, engine=engine, frame_cache=frame_cache) as task_manager:
+        images = [task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter, crop=crop).consume()
+                  for crop in crops]
+    assert (frame_cache.hits, frame_cache.misses) == (2, 1)
+    assert torch.equal(images[0], full)
+    assert torch.equal(images[1], full[:, 0:100, 0:200])
+    assert torch.equal(images[2], full[:, 100:200, 200:400])
+    # Modifying a returned image must not modify the cached frame.
+    images[0].zero_()
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, engine=engine, frame_cache=frame_cache) as task_manager:
+        image = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Quarter).consume()
+    assert torch.equal(image, full)
+
+
+@pytest.mark.parametrize('engine', ['python', 'native'])
+def test_read_frames_frame_cache_attributes_changed(reader_cpu, engine):
+    frame_cache = FrameCache(max_bytes=2 ** 26)
+    attributes = verify(reader_cpu.clip.as_IBlackmagicRawClipProcessingAttributes())
+    with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, engine=engine, frame_cache=frame_cache) as task_manager:
+        before = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth).consume()
+        # Changing the processing attributes part way through a flow invalidates the cached frame.
+        verify(attributes.SetClipAttribute(_pybraw.blackmagicRawClipProcessingAttributeToneCurveBlackLevel,
+                                           _pybraw.VariantCreateFloat32(0.25)))
+        after = task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth).consume()
+    assert (frame_cache.hits, frame_cache.misses) == (0, 2)
+    assert not torch.equal(before, after)
+
+
+def test_read_frames_disk_frame_cache(reader_cpu, tmp_path):
+    def read_frames(disk_cache):
+        with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, frame_cache=disk_cache) as task_manager:
+            return [task_manager.enqueue_task(frame_index, resolution_scale=ResolutionScale.Eighth).consume()
+                    for frame_index in range(3)]
+
+    first = read_frames(DiskFrameCache(tmp_path))
+    # A new cache object reads the frames which were written by the first one.
+    disk_cache = DiskFrameCache(tmp_path)
+    second = read_frames(disk_cache)
+    assert disk_cache.hits == 3
+    for expected, actual in zip(first, second):
+        assert torch.equal(expected, actual)
+    # Changing the processing attributes of the clip invalidates the cached frames.
+    attributes = verify(reader_cpu.clip.as_IBlackmagicRawClipProcessingAttributes())
+    verify(attributes.SetClipAttribute(_pybraw.blackmagicRawClipProcessingAttributeToneCurveBlackLevel,
+                                       _pybraw.VariantCreateFloat32(0.25)))
+    disk_cache = DiskFrameCache(tmp_path)
+    read_frames(disk_cache)
+    assert disk_cache.misses == 3
+
+
+def test_disk_frame_cache_concurrent_create(tmp_path):
+    header = {'version': 1, 'clip_path': 'clip.braw', 'frame_count': 4}
+    base_path = str(tmp_path / 'clip')
+    # Two workers which both find that nothing has been cached yet.
+    first = _ClipFrames(base_path, header)
+    second = _ClipFrames(base_path, header)
+    first.write(1, torch.full((2, 3), 1.0))
+    second.write(2, torch.full((2, 3), 2.0))
+    # The second worker adds to the files of the first rather than replacing them.
+    assert second.header['generation'] == first.header['generation']
+    first.refresh()
+    assert first.frames == {1, 2}
+    assert torch.equal(first.read(1), torch.full((2, 3), 1.0))
+    assert torch.equal(first.read(2), torch.full((2, 3), 2.0))
+
+
+def test_disk_frame_cache_replaced_files(tmp_path):
+    disk_cache = DiskFrameCache(tmp_path)
+    clip_key = (('clip.braw', 1, None), 'attributes', 4)
+    key = (clip_key, 1, ResolutionScale.Full, PixelFormat.RGB_F32_Planar)
+    disk_cache.put(key, torch.full((2, 3), 1.0))
+    assert torch.equal(disk_cache.get(key), torch.full((2, 3), 1.0))
+    # Another process replaces the files with a new generation, which doesn't have the frame.
+    for path in tmp_path.glob('*.frames'):
+        path.unlink()
+    assert disk_cache.get(key) is None
+    assert disk_cache.hits == 1
+    assert disk_cache.misses == 1
+
+
+def test_read_frames_bit_stream_cache(reader_cpu):
+    bit_stream_cache = BitStreamCache(max_bytes=2 ** 26)
+
+    def read_frame(bit_stream_cache=None):
+        with reader_cpu.run_flow(PixelFormat.RGB_F32_Planar, bit_stream_cache=bit_stream_cache) as task_manager:
+            return task_manager.enqueue_task(0, resolution_scale=ResolutionScale.Eighth).consume()
+
+    assert float(read_frame(bit_stream_cache).mean()) == pytest.approx(0.516379, abs=1e-4)
+    assert (bit_stream_cache.hits, bit_stream_cache.misses) == (0, 1)
+    # Frames decoded from the cache use the current processing attributes of the clip.
+    attributes = verify(reader_cpu.clip.as_IBlackmagicRawClipProcessingAttributes())
+    verify(attributes.SetClipAttribute(_pybraw.blackmagicRawClipProcessingAttributeToneCurveBlackLevel,
+                                       _pybraw.VariantCreateFloat32(0.25)))
+    image_tensor = read_frame(bit_stream_cache)
+    assert bit_stream_cache.hits == 1
+    assert torch.equal(image_tensor, read_frame())
+
+
+def test_multi_clip_reader(sample_filename, bw_filename):
+    reader = MultiClipReader()
+    with reader.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, max_running_tasks_per_clip=2) as task_manager:
+        tasks = [task_manager.enqueue_task(clip_path, frame_index, resolution_scale=ResolutionScale.Eighth)
+                 for clip_path in [sample_filename, bw_filename]
+                 for frame_index in range(4)]
+        images = [task.consume() for task in tasks]
+    assert float(images[0].mean()) == pytest.approx(0.516379, abs=1e-4)
+    # The second clip has a black and white post 3D LUT, which makes all of its channels equal.
+    assert torch.allclose(images[4][0], images[4][1], atol=1e-3)
+    assert not torch.allclose(images[0][0], images[0][1], atol=1e-3)
+    assert len(reader.clip_cache) == 2
+
+
+def test_multi_clip_reader_batch(sample_filename, bw_filename):
+    reader = MultiClipReader()
+    with reader.run_flow(PixelFormat.RGB_F32_Planar, max_running_tasks=3, max_running_tasks_per_clip=2) as task_manager:
+        batches = [task_manager.enqueue_batch(clip_path, [0, 1, 2, 3], resolution_scale=ResolutionScale.Eighth)
+                   for clip_path in [sample_filename, bw_filename]]
+        images = [batch.consume() for batch in batches]
+        single = task_manager.enqueue_task(sample_filename, 2, resolution_scale=ResolutionScale.Eighth).consume()
+    assert images[0].shape[:2] == (4, 3)
+    assert torch.equal(images[0][2], single)
+    assert torch.allclose(images[1][:, 0], images[1][:, 1], atol=1e-3)